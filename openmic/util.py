@@ -5,6 +5,7 @@
 import hashlib
 import numpy as np
 import os
+import uuid
 
 
 def filebase(fname):
@@ -16,8 +17,31 @@ def safe_makedirs(dpath):
         os.makedirs(dpath)
 
 
-def md5_file(fname):
-    hsh = hashlib.md5(open(fname, 'rb').read())
+def open_temporary(fname, suffix='.tmp'):
+    '''Open a new, uniquely named file next to `fname`, for writing.
+
+    The file can be renamed onto `fname` once it is complete. Unlike those
+    of `tempfile.mkstemp`, its permissions follow the umask.
+
+    Returns
+    -------
+    fobj : file object
+        The file, opened in binary mode.
+
+    tmpname : str
+        Its path.
+    '''
+    tmpname = '{}.{}{}'.format(fname, uuid.uuid4().hex, suffix)
+    return open(tmpname, 'xb'), tmpname
+
+
+def md5_file(fname, chunk_size=2 ** 20):
+    '''Compute the md5 checksum of a file, reading `chunk_size` bytes at a
+    time.'''
+    hsh = hashlib.md5()
+    with open(fname, 'rb') as fdesc:
+        for chunk in iter(lambda: fdesc.read(chunk_size), b''):
+            hsh.update(chunk)
     return hsh.hexdigest()
 
 
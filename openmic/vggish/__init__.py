@@ -7,25 +7,72 @@ Inputs
 ------
  * waveform_to_examples: tf.Examples from an ndarray
  * soundfile_to_examples: tf.Examples from a sound file
+ * waveform_to_example_batches: Batches of tf.Examples from an ndarray
+ * ExampleStream: tf.Examples from a stream of audio blocks
 
 Transforms
 ----------
  * transform: Times and VGGish features (ndarray) from tf.Examples
+ * waveform_to_features: Times and VGGish features from an ndarray
+ * stream_features: Times and VGGish features from a stream of audio blocks
+ * VGGishExtractor: A persistent model for transforming many inputs
+ * tf2.FunctionExtractor: Same as above, using a tf.function implementation
+ * numpy_model.NumpyExtractor: Same as above, without tensorflow
+ * quantize.QuantizedExtractor: Same as above, using an int8 model
+ * get_extractor: Any of the above, by name
+ * CoalescingExtractor: A thread-safe extractor which batches requests
+ * get_shared_extractor: A process-wide CoalescingExtractor
+ * aio.AsyncExtractor: Features from asyncio coroutines
+ * cache.FeatureCache: An on-disk cache of features, keyed by content
+ * store.FeatureStore: Features for many clips, in a few large files
+ * profiling: Opt-in timing and memory records of each stage
+ * SessionTracer: Op-level timelines of the model, for VGGishExtractor
+ * session_config: Thread settings for tensorflow sessions
  * postprocess: PCA'ed embeddings from VGGish features
 
+Model files
+-----------
+ * verify_model: Check the model files against their checksums
+ * params_hash: Hash of the parameters which determine the features
+
+Export
+------
+ * export_saved_model: Save VGGish in a format which is fast to load
+ * load_saved_model: Load a model written by `export_saved_model`
+
 '''
 
+import numpy as np
+
 from .params import *
 
 from .inputs import waveform_to_examples, soundfile_to_examples
-from .model import transform
+from .inputs import waveform_to_example_batches, ExampleStream
+from .model import transform, VGGishExtractor, get_extractor
+from .model import session_config, SessionTracer
+from .model import CoalescingExtractor, get_shared_extractor
+from .model import close_shared_extractors
+from .model import export_saved_model, load_saved_model
 from .postprocessor import Postprocessor
 
-__pproc__ = Postprocessor(PCA_PARAMS)
-postprocess = __pproc__.postprocess
+__pproc__ = None
+
+
+def postprocess(embeddings_batch):
+    '''PCA, clip and quantize VGGish embeddings.
+
+    See `Postprocessor.postprocess`. The PCA parameters are verified and
+    loaded on first use.
+    '''
+    global __pproc__
+    if __pproc__ is None:
+        verify_model([PCA_PARAMS])
+        __pproc__ = Postprocessor(PCA_PARAMS)
+    return __pproc__.postprocess(embeddings_batch)
 
 
-def waveform_to_features(data, sample_rate, compress=True):
+def waveform_to_features(data, sample_rate, compress=True, backend='session',
+                         max_batch=None, **kwargs):
     '''Converts an audio waveform to VGGish features, with or without
     PCA compression.
 
@@ -40,6 +87,25 @@ def waveform_to_features(data, sample_rate, compress=True):
         If True, PCA and quantization are applied to the features.
         If False, the features are taken directly from the model output
 
+    backend : str
+        Which implementation of the model to use.
+        See `get_extractor` for details.
+
+    max_batch : int > 0 or None
+        If given, the log-mel spectrogram and features are computed for at
+        most this many examples at a time. Memory use then no longer grows
+        with the duration of the audio, beyond that of `data` itself.
+
+    kwargs
+        Additional keyword arguments passed to the extractor, e.g.,
+        `intra_op_threads`, `inter_op_threads` or (tensorflow session)
+        `config`.
+
+        The model is loaded by the first call for each backend and set of
+        keyword arguments, and shared by all later calls, from any thread.
+        Concurrent calls are batched together.
+        See `get_shared_extractor`.
+
     Returns
     -------
     time_points : np.ndarray, len=n
@@ -49,15 +115,82 @@ def waveform_to_features(data, sample_rate, compress=True):
         The output features, with or without PCA compression and quantization.
     '''
 
-    import tensorflow as tf
+    extractor = get_shared_extractor(backend, **kwargs)
+    # The shared extractor returns the raw, then the postprocessed features
+    index = 2 if compress else 1
+
+    if max_batch is None:
+        examples = waveform_to_examples(data, sample_rate)
+        features = extractor.extract(examples)[index]
+    else:
+        features = np.concatenate([
+            extractor.extract(examples)[index] for examples in
+            waveform_to_example_batches(data, sample_rate, max_batch)])
+
+    time_points = np.arange(len(features)) * EXAMPLE_HOP_SECONDS
+    return time_points, features
 
-    examples = waveform_to_examples(data, sample_rate)
 
-    with tf.Graph().as_default(), tf.compat.v1.Session() as sess:
-        time_points, features = transform(examples, sess)
+def stream_features(chunks, sample_rate, compress=True, extractor=None,
+                    backend='session', **kwargs):
+    '''Computes VGGish features incrementally from a stream of audio blocks.
 
-        if compress:
-            features_z = postprocess(features)
-            return time_points, features_z
+    Each feature is produced as soon as the audio for its example has been
+    consumed, so neither the audio nor its features need to fit in memory.
 
-        return time_points, features
+    Note that, unlike `soundfile_to_examples`, the audio is not normalized,
+    as its peak amplitude is not known in advance.
+
+    Parameters
+    ----------
+    chunks : iterable of np.ndarray
+        Blocks of audio, of any length, with one dimension (mono) or two
+        dimensions (multi-channel).
+
+    sample_rate : number
+        Sample rate of the audio data
+
+    compress : bool
+        If True, PCA and quantization are applied to the features.
+        If False, the features are taken directly from the model output
+
+    extractor : BaseExtractor or None
+        An open extractor to use. Otherwise, the shared extractor from
+        `get_shared_extractor(backend, **kwargs)` is used.
+
+    backend, kwargs
+        See `waveform_to_features`.
+
+    Yields
+    ------
+    time_point : float
+        Time in seconds of the feature
+
+    feature : np.ndarray, shape=(128,)
+        The output feature, with or without PCA compression and quantization.
+    '''
+    if extractor is None:
+        extractor = get_shared_extractor(backend, **kwargs)
+
+    if compress and not extractor.postprocess:
+        raise ValueError('Compressed features require an extractor '
+                         'with postprocess=True')
+
+    stream = ExampleStream(sample_rate)
+    num_features = 0
+
+    def extract(examples):
+        if not len(examples):
+            return []
+        results = extractor.extract(examples)
+        # If compressing, the postprocessed features come last
+        return results[-1] if compress else results[1]
+
+    for chunk in chunks:
+        for feature in extract(stream.push(chunk)):
+            yield num_features * EXAMPLE_HOP_SECONDS, feature
+            num_features += 1
+
+    for feature in extract(stream.flush()):
+        yield num_features * EXAMPLE_HOP_SECONDS, feature
+        num_features += 1
@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+# coding: utf8
+'''asyncio interface to VGGish feature extraction.
+
+Decoding and resampling audio run in a pool of processes, and the model
+runs in the worker thread of a `CoalescingExtractor`, so the event loop is
+never blocked. Files in flight are plain coroutines: they only hold a
+process while being decoded, and are batched together for the model.
+
+Example
+-------
+>>> async with AsyncExtractor(max_pending=64) as extractor:
+...     results = await asyncio.gather(*[
+...         extractor.soundfile_to_features(fname) for fname in filenames])
+'''
+
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+from . import inputs
+from .model import CoalescingExtractor, get_extractor
+
+
+class AsyncExtractor(object):
+    '''Compute VGGish features from coroutines.
+
+    Parameters
+    ----------
+    extractor : BaseExtractor or None
+        An extractor created with `postprocess=True`, which is then owned by
+        this object. If None, one is created by `get_extractor(backend,
+        **kwargs)`.
+
+    backend : str
+        Which implementation of the model to use, if `extractor` is None.
+        See `get_extractor`.
+
+    processes : int > 0 or None
+        Number of processes used to decode and resample audio.
+        By default, one per CPU.
+
+    max_pending : int > 0 or None
+        Maximum number of inputs being processed at once. Further calls wait
+        (asynchronously) for one of these to finish, which bounds the memory
+        used by decoded audio and examples. If None, there is no limit.
+
+    max_batch, max_latency
+        Batching of examples for the model; see `CoalescingExtractor`.
+
+    kwargs
+        Additional keyword arguments passed to `get_extractor`.
+    '''
+
+    def __init__(self, extractor=None, backend='session', processes=None,
+                 max_pending=64, max_batch=256, max_latency=0, **kwargs):
+        if extractor is None:
+            extractor = get_extractor(backend, postprocess=True, **kwargs)
+
+        self.extractor = CoalescingExtractor(extractor, max_batch=max_batch,
+                                             max_latency=max_latency)
+        # Workers must not inherit a running tensorflow runtime
+        self.pool = ProcessPoolExecutor(
+            processes, mp_context=multiprocessing.get_context('spawn'))
+        self.max_pending = max_pending
+        self._semaphore = None
+
+    async def soundfile_to_examples(self, filename):
+        '''Asynchronous `inputs.soundfile_to_examples`.'''
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.pool, inputs.soundfile_to_examples, filename)
+
+    async def waveform_to_examples(self, data, sample_rate):
+        '''Asynchronous `inputs.waveform_to_examples`.'''
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.pool, inputs.waveform_to_examples, data, sample_rate)
+
+    async def extract(self, examples):
+        '''Asynchronous `BaseExtractor.extract`.
+
+        Returns
+        -------
+        time_points, features, features_z
+            See `BaseExtractor.extract`.
+        '''
+        return await asyncio.wrap_future(self.extractor.submit(examples))
+
+    async def soundfile_to_features(self, filename, compress=True):
+        '''Compute VGGish features for an audio file.
+
+        Parameters
+        ----------
+        filename : str
+            Path to an audio file, see `inputs.soundfile_to_examples`.
+
+        compress : bool
+            If True, PCA and quantization are applied to the features.
+
+        Returns
+        -------
+        time_points : np.ndarray, len=n
+            Time points in seconds of the features
+
+        features : np.ndarray, shape=(n, 128)
+            The output features
+        '''
+        async with self._pending():
+            examples = await self.soundfile_to_examples(filename)
+            return _select(await self.extract(examples), compress)
+
+    async def waveform_to_features(self, data, sample_rate, compress=True):
+        '''Asynchronous `openmic.vggish.waveform_to_features`.
+
+        See `soundfile_to_features` for the return values.
+        '''
+        async with self._pending():
+            examples = await self.waveform_to_examples(data, sample_rate)
+            return _select(await self.extract(examples), compress)
+
+    def _pending(self):
+        # Created on first use, so that it belongs to the running loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_pending or 2 ** 31)
+        return self._semaphore
+
+    def close(self):
+        '''Shut down the process pool and the extractor.'''
+        self.pool.shutdown()
+        self.extractor.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.close)
+
+
+def _select(results, compress):
+    time_points, features, features_z = results
+    return time_points, (features_z if compress else features)
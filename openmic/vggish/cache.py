@@ -0,0 +1,235 @@
+#!/usr/bin/env python
+# coding: utf8
+'''A content-addressed, on-disk cache of VGGish features.
+
+Features are stored under a key derived from the content of the audio and
+the hash of the parameters which determine the features (see
+`params.params_hash`), so a file which is renamed, copied or processed by
+another job is still found, while a change of model or parameters misses.
+
+Example
+-------
+>>> cache = FeatureCache('~/.cache/openmic/features', max_size=10 * 2 ** 30)
+>>> with get_extractor(postprocess=True) as extractor:
+...     for fname in filenames:
+...         time_points, features, features_z = cache.soundfile_to_features(
+...             fname, extractor)
+>>> cache.stats()
+'''
+
+import hashlib
+import numpy as np
+import os
+import threading
+
+from . import params
+from .inputs import soundfile_to_examples, waveform_to_examples
+from ..util import md5_file, open_temporary
+
+
+class FeatureCache(object):
+    '''A content-addressed, on-disk cache of VGGish features.
+
+    Each entry holds the `time_points`, `features` and `features_z` of one
+    input, in NPZ format. When the cache grows beyond `max_size` bytes, the
+    least recently used entries are removed, down to `low_water` times
+    `max_size`, so that the cost of scanning the entries is spread over
+    many writes.
+
+    Several processes may share a cache directory. Writes are atomic, and
+    eviction considers all entries on disk.
+
+    Parameters
+    ----------
+    cache_dir : str
+        Directory to store the cache in. It is created if needed.
+
+    max_size : int > 0 or None
+        Maximum total size of the cache, in bytes. If None, the cache is
+        never evicted.
+
+    low_water : float in (0, 1]
+        Fraction of `max_size` to evict down to.
+
+    settings
+        Other settings which determine the features, e.g., `backend`.
+        These are included in the parameter hash.
+    '''
+
+    def __init__(self, cache_dir, max_size=None, low_water=0.9,
+                 **settings):
+        self.cache_dir = os.path.abspath(os.path.expanduser(cache_dir))
+        self.max_size = max_size
+        self.low_water = low_water
+        self.settings = settings
+        self.params = params.params_hash(**settings)
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if not os.path.exists(self.cache_dir):
+            os.makedirs(self.cache_dir, exist_ok=True)
+        self._size = sum(size for _, size, _ in self._entries())
+        self._lock = threading.Lock()
+
+    def file_key(self, filename):
+        '''The cache key of an audio file.'''
+        return self._key(md5_file(filename))
+
+    def waveform_key(self, data, sample_rate):
+        '''The cache key of a waveform.'''
+        data = np.ascontiguousarray(data)
+        hsh = hashlib.md5(data.view(np.uint8))
+        hsh.update(str((data.dtype.str, data.shape, sample_rate)).encode())
+        return self._key(hsh.hexdigest())
+
+    def get(self, key):
+        '''Look up an entry.
+
+        Returns
+        -------
+        results : tuple of (time_points, features, features_z), or None
+            The cached features, or None if there are none.
+        '''
+        path = self._path(key)
+        try:
+            with np.load(path) as data:
+                results = data['time'], data['features'], data['features_z']
+            # Mark the entry as recently used
+            os.utime(path)
+        except (IOError, OSError, ValueError, KeyError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return results
+
+    def put(self, key, results):
+        '''Store an entry.
+
+        Parameters
+        ----------
+        key : str
+            The cache key, from `file_key` or `waveform_key`.
+
+        results : tuple of (time_points, features, features_z)
+            The features to store, as returned by `BaseExtractor.extract`
+            with `postprocess=True`.
+        '''
+        time_points, features, features_z = results
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Permissions follow the umask, so that a group can share the cache
+        fobj, tmpname = open_temporary(path)
+        try:
+            with fobj:
+                np.savez(fobj, time=time_points, features=features,
+                         features_z=features_z)
+            size = os.path.getsize(tmpname)
+            try:
+                # An existing entry is replaced
+                size -= os.path.getsize(path)
+            except OSError:
+                pass
+            os.replace(tmpname, path)
+        except BaseException:
+            os.remove(tmpname)
+            raise
+
+        with self._lock:
+            self._size += size
+            evict = self.max_size is not None and self._size > self.max_size
+        if evict:
+            self.evict()
+
+    def evict(self):
+        '''Remove the least recently used entries until the cache fits in
+        `low_water` times `max_size`.'''
+        entries = sorted(self._entries())
+        size = sum(entry_size for _, entry_size, _ in entries)
+        evictions = 0
+        for _, entry_size, path in entries:
+            if (self.max_size is None or
+                    size <= self.low_water * self.max_size):
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                # Already removed, e.g., by another process
+                pass
+            size -= entry_size
+            evictions += 1
+
+        with self._lock:
+            self._size = size
+            self.evictions += evictions
+
+    def soundfile_to_features(self, filename, extractor):
+        '''Compute, or look up, the VGGish features of an audio file.
+
+        Parameters
+        ----------
+        filename : str
+            Path to an audio file; see `inputs.soundfile_to_examples`.
+
+        extractor : BaseExtractor
+            An extractor created with `postprocess=True`, used on a miss.
+
+        Returns
+        -------
+        time_points, features, features_z
+            See `BaseExtractor.extract`.
+        '''
+        key = self.file_key(filename)
+        results = self.get(key)
+        if results is None:
+            results = extractor.extract(soundfile_to_examples(filename))
+            self.put(key, results)
+        return results
+
+    def waveform_to_features(self, data, sample_rate, extractor):
+        '''Compute, or look up, the VGGish features of a waveform.
+
+        See `soundfile_to_features`, and `inputs.waveform_to_examples` for
+        the parameters.
+        '''
+        key = self.waveform_key(data, sample_rate)
+        results = self.get(key)
+        if results is None:
+            results = extractor.extract(waveform_to_examples(data,
+                                                             sample_rate))
+            self.put(key, results)
+        return results
+
+    def stats(self):
+        '''Hit and miss statistics, and the size of the cache.'''
+        with self._lock:
+            lookups = self.hits + self.misses
+            return dict(hits=self.hits, misses=self.misses,
+                        hit_rate=self.hits / lookups if lookups else 0.0,
+                        evictions=self.evictions, size=self._size,
+                        max_size=self.max_size)
+
+    def _key(self, content_hash):
+        return hashlib.md5('{}:{}'.format(content_hash, self.params)
+                           .encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + '.npz')
+
+    def _entries(self):
+        '''Generate (last use, size, path) for each entry on disk.'''
+        for dirpath, _, filenames in os.walk(self.cache_dir):
+            for fname in filenames:
+                if not fname.endswith('.npz'):
+                    continue
+                path = os.path.join(dirpath, fname)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                yield stat.st_mtime, stat.st_size, path
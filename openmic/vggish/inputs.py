@@ -15,14 +15,14 @@
 
 """Compute input examples for VGGish from audio waveform."""
 
+import math
 import numpy as np
-import resampy
-from scipy.io import wavfile
 import soundfile as sf
 import warnings
 
 from . import mel_features
 from . import params
+from . import profiling
 from ..util import normalize
 
 
@@ -43,30 +43,94 @@ def waveform_to_examples(data, sample_rate):
         mel frequency bands, where the frame length is
         params.STFT_HOP_LENGTH_SECONDS.
     """
+    return _log_mel_examples(_resample(data, sample_rate))
+
+
+def waveform_to_example_batches(data, sample_rate, max_batch):
+    """Converts audio waveform into batches of examples for VGGish.
+
+    This produces the same examples as waveform_to_examples(), but the log
+    mel spectrogram is only computed for one batch of examples at a time,
+    so memory use beyond the (resampled) waveform itself is bounded by
+    `max_batch`, rather than by the duration of the audio.
+
+    Args:
+        data: np.array of either one dimension (mono) or two dimensions
+        (multi-channel, with the outer dimension representing channels).
+        sample_rate: Sample rate of data.
+        max_batch: Maximum number of examples per batch.
+
+    Yields:
+        3-D np.arrays of shape [num_examples, num_frames, num_bands], with
+        num_examples <= max_batch, which taken together are the examples
+        returned by waveform_to_examples().
+    """
+    data = _resample(data, sample_rate)
+
+    window_length = int(round(params.SAMPLE_RATE *
+                              params.STFT_WINDOW_LENGTH_SECONDS))
+    hop_length = int(round(params.SAMPLE_RATE *
+                           params.STFT_HOP_LENGTH_SECONDS))
+    example_window_length, example_hop_length = _example_lengths()
+
+    num_frames = 1 + (len(data) - window_length) // hop_length
+    num_examples = 1 + (num_frames - example_window_length) // \
+        example_hop_length
+
+    if num_examples <= max_batch:
+        yield _log_mel_examples(data)
+        return
+
+    for start in range(0, num_examples, max_batch):
+        stop = min(start + max_batch, num_examples)
+        # The range of STFT frames, and then samples, covering these examples
+        first_frame = start * example_hop_length
+        last_frame = (stop - 1) * example_hop_length + example_window_length
+        yield _log_mel_examples(
+            data[first_frame * hop_length:
+                 (last_frame - 1) * hop_length + window_length])
+
+
+def _resample(data, sample_rate):
+    """Convert to mono, at the rate assumed by VGGish."""
     # Convert to mono.
     if len(data.shape) > 1:
         data = np.mean(data, axis=1)
     # Resample to the rate assumed by VGGish.
     if sample_rate != params.SAMPLE_RATE:
-        data = resampy.resample(data, sample_rate, params.SAMPLE_RATE)
+        import resampy
+        with profiling.stage('resample'):
+            data = resampy.resample(data, sample_rate, params.SAMPLE_RATE)
+    return data
 
-    # Compute log mel spectrogram features.
-    log_mel = mel_features.log_mel_spectrogram(
-        data,
-        audio_sample_rate=params.SAMPLE_RATE,
-        log_offset=params.LOG_OFFSET,
-        window_length_secs=params.STFT_WINDOW_LENGTH_SECONDS,
-        hop_length_secs=params.STFT_HOP_LENGTH_SECONDS,
-        num_mel_bins=params.NUM_MEL_BINS,
-        lower_edge_hertz=params.MEL_MIN_HZ,
-        upper_edge_hertz=params.MEL_MAX_HZ)
 
-    # Frame features into examples.
+def _example_lengths():
+    """Window and hop lengths of each example, in STFT frames."""
     features_sample_rate = 1.0 / params.STFT_HOP_LENGTH_SECONDS
     example_window_length = int(round(
         params.EXAMPLE_WINDOW_SECONDS * features_sample_rate))
     example_hop_length = int(round(
         params.EXAMPLE_HOP_SECONDS * features_sample_rate))
+    return example_window_length, example_hop_length
+
+
+def _log_mel_examples(data):
+    """Frame the log mel spectrogram of mono, resampled audio into
+    examples."""
+    # Compute log mel spectrogram features.
+    with profiling.stage('mel'):
+        log_mel = mel_features.log_mel_spectrogram(
+            data,
+            audio_sample_rate=params.SAMPLE_RATE,
+            log_offset=params.LOG_OFFSET,
+            window_length_secs=params.STFT_WINDOW_LENGTH_SECONDS,
+            hop_length_secs=params.STFT_HOP_LENGTH_SECONDS,
+            num_mel_bins=params.NUM_MEL_BINS,
+            lower_edge_hertz=params.MEL_MIN_HZ,
+            upper_edge_hertz=params.MEL_MAX_HZ)
+
+    # Frame features into examples.
+    example_window_length, example_hop_length = _example_lengths()
     log_mel_examples = mel_features.frame(
         log_mel,
         window_length=example_window_length,
@@ -74,6 +138,175 @@ def waveform_to_examples(data, sample_rate):
     return log_mel_examples
 
 
+class ExampleStream(object):
+    """Converts a stream of audio blocks into examples for VGGish.
+
+    Resampling, STFT and framing state is kept between blocks, so that each
+    example is produced as soon as the audio covering it has been pushed.
+    Taken together, the examples are those which waveform_to_examples()
+    produces for the concatenated blocks.
+
+    Example:
+        stream = ExampleStream(sample_rate)
+        for block in blocks:
+            for example in stream.push(block):
+                ...
+        for example in stream.flush():
+            ...
+
+    Args:
+        sample_rate: Sample rate of the audio blocks.
+    """
+
+    def __init__(self, sample_rate):
+        if sample_rate != params.SAMPLE_RATE:
+            self._resampler = _StreamResampler(sample_rate,
+                                               params.SAMPLE_RATE)
+        else:
+            self._resampler = None
+
+        self._window_length = int(round(params.SAMPLE_RATE *
+                                        params.STFT_WINDOW_LENGTH_SECONDS))
+        self._hop_length = int(round(params.SAMPLE_RATE *
+                                     params.STFT_HOP_LENGTH_SECONDS))
+        self._example_window_length, self._example_hop_length = \
+            _example_lengths()
+
+        # Resampled audio which is not yet covered by a complete STFT frame
+        self._samples = np.zeros(0)
+        # Log mel frames which are not yet covered by a complete example
+        self._log_mel = np.zeros((0, params.NUM_MEL_BINS))
+
+    def push(self, data):
+        """Add a block of audio to the stream.
+
+        Args:
+            data: np.array of either one dimension (mono) or two dimensions
+            (multi-channel, with the outer dimension representing channels).
+
+        Returns:
+            3-D np.array of shape [num_examples, num_frames, num_bands] of the
+            examples completed by this block, possibly with num_examples = 0.
+        """
+        # Convert to mono.
+        if len(data.shape) > 1:
+            data = np.mean(data, axis=1)
+        if self._resampler is not None:
+            data = self._resampler.push(data)
+        return self._examples(data)
+
+    def flush(self):
+        """Signal the end of the stream.
+
+        Returns:
+            The remaining examples, as for push().
+        """
+        data = np.zeros(0)
+        if self._resampler is not None:
+            data = self._resampler.flush()
+        return self._examples(data)
+
+    def _examples(self, data):
+        samples = np.concatenate([self._samples, data])
+        num_frames = 0
+        if len(samples) >= self._window_length:
+            num_frames = 1 + ((len(samples) - self._window_length) //
+                              self._hop_length)
+
+        if num_frames:
+            log_mel = mel_features.log_mel_spectrogram(
+                samples[:(num_frames - 1) * self._hop_length +
+                        self._window_length],
+                audio_sample_rate=params.SAMPLE_RATE,
+                log_offset=params.LOG_OFFSET,
+                window_length_secs=params.STFT_WINDOW_LENGTH_SECONDS,
+                hop_length_secs=params.STFT_HOP_LENGTH_SECONDS,
+                num_mel_bins=params.NUM_MEL_BINS,
+                lower_edge_hertz=params.MEL_MIN_HZ,
+                upper_edge_hertz=params.MEL_MAX_HZ)
+            self._log_mel = np.concatenate([self._log_mel, log_mel])
+        self._samples = samples[num_frames * self._hop_length:]
+
+        num_examples = 0
+        if len(self._log_mel) >= self._example_window_length:
+            num_examples = 1 + ((len(self._log_mel) -
+                                 self._example_window_length) //
+                                self._example_hop_length)
+            examples = mel_features.frame(
+                self._log_mel,
+                window_length=self._example_window_length,
+                hop_length=self._example_hop_length)
+        else:
+            examples = np.zeros((0, self._example_window_length,
+                                 params.NUM_MEL_BINS))
+        self._log_mel = self._log_mel[num_examples *
+                                      self._example_hop_length:]
+        return examples
+
+
+class _StreamResampler(object):
+    """Resample a stream of mono audio blocks.
+
+    Each block is resampled together with enough of the preceding audio to
+    cover the interpolation filter, and only outputs whose filter support
+    has been seen are returned, so the result matches resampling all of the
+    audio at once.
+    """
+
+    def __init__(self, sr_orig, sr_new, filter='kaiser_best'):
+        import resampy.filters
+
+        self.sr_orig = sr_orig
+        self.sr_new = sr_new
+        self.filter = filter
+
+        interp_win, precision, _ = resampy.filters.get_filter(filter)
+        scale = min(1.0, float(sr_new) / sr_orig)
+        # Half-width of the filter, in input samples
+        self._margin = int(math.ceil(len(interp_win) / precision / scale)) + 1
+        # Input offsets at which the output grid lines up with the input
+        self._step = sr_orig // math.gcd(sr_orig, sr_new)
+
+        self._buffer = np.zeros(0)
+        self._offset = 0
+        self._num_in = 0
+        self._num_out = 0
+
+    def push(self, data):
+        self._buffer = np.concatenate([self._buffer, data])
+        self._num_in += len(data)
+        return self._resample(
+            ((self._num_in - self._margin) * self.sr_new) // self.sr_orig)
+
+    def flush(self):
+        return self._resample((self._num_in * self.sr_new) // self.sr_orig)
+
+    def _resample(self, stop):
+        """Produce outputs up to `stop`, and drop input which is no longer
+        needed."""
+        if stop <= self._num_out:
+            return np.zeros(0)
+
+        import resampy
+
+        first = (self._offset * self.sr_new) // self.sr_orig
+        y = resampy.resample(self._buffer, self.sr_orig, self.sr_new,
+                             filter=self.filter)
+        # Outputs past the end of the buffer are computed as if the stream
+        # had ended, which is only correct after flush()
+        y = np.pad(y, (0, max(0, stop - first - len(y))))
+        y = y[self._num_out - first:stop - first]
+        self._num_out = stop
+
+        # Keep the input needed for the next output, starting on the grid
+        offset = max(0, (self._num_out * self.sr_orig) // self.sr_new -
+                     self._margin)
+        offset -= offset % self._step
+        self._buffer = self._buffer[offset - self._offset:]
+        self._offset = offset
+        return y
+
+
 def wavfile_to_examples(wav_file):
     """Convenience wrapper around waveform_to_examples() for a common WAV
     format.
@@ -85,6 +318,8 @@ def wavfile_to_examples(wav_file):
     Returns:
         See waveform_to_examples.
     """
+    from scipy.io import wavfile
+
     sr, wav_data = wavfile.read(wav_file)
     if wav_data.dtype != np.int16:
         raise ValueError('Bad sample type: %r' % wav_data.dtype)
@@ -107,7 +342,8 @@ def soundfile_to_examples(filename):
         Audio examples
     """
     examples = None
-    y, sr = sf.read(filename, always_2d=True)
+    with profiling.stage('read'):
+        y, sr = sf.read(filename, always_2d=True)
     # Mono only, `waveform_to_examples` will take care of samplerate
     try:
         y = y.mean(axis=-1)
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# coding: utf8
+'''Low-rank factorization of the VGGish fully-connected layers.
+
+The two 4096-wide `fc1` layers hold the large majority of VGGish's
+parameters. Each weight matrix `W` (of shape `(n_in, n_out)`) can be
+replaced by a truncated singular value decomposition `W ~= U V`, with `U`
+of shape `(n_in, rank)` and `V` of shape `(rank, n_out)`, which costs
+`rank * (n_in + n_out)` rather than `n_in * n_out` multiplications.
+
+Factorized weights are stored as `vggish/<scope>/weights_u` and
+`vggish/<scope>/weights_v` in place of `vggish/<scope>/weights`, and are
+understood by both `tf2.VGGish` and `numpy_model.vggish`.
+'''
+
+import numpy as np
+from sklearn.utils.extmath import randomized_svd
+
+# Variable scopes of the layers which are factorized by default.
+LAYERS = ('fc1/fc1_1', 'fc1/fc1_2')
+
+
+def factorize_weights(weights, rank, layers=LAYERS, n_iter=4,
+                      random_state=20180903):
+    '''Replace fully-connected weight matrices by rank-`rank` factors.
+
+    Parameters
+    ----------
+    weights : dict of np.ndarray
+        Model weights, e.g., as returned by `tf2.load_checkpoint_weights`
+        or `numpy_model.load_weights`.
+
+    rank : int > 0
+        Rank of the factorization.
+
+    layers : iterable of str
+        Variable scopes of the layers to factorize.
+
+    n_iter : int >= 0
+        Number of power iterations used by the (randomized) SVD.
+
+    random_state : int or np.random.RandomState
+        Random seed for the SVD.
+
+    Returns
+    -------
+    factorized : dict of np.ndarray
+        A copy of `weights`, with `<scope>/weights` replaced by
+        `<scope>/weights_u` and `<scope>/weights_v` for each of `layers`.
+    '''
+    factorized = dict(weights)
+
+    for scope in layers:
+        prefix = 'vggish/{}/'.format(scope)
+        layer_w = factorized.pop(prefix + 'weights')
+
+        u, s, vt = randomized_svd(layer_w, rank, n_iter=n_iter,
+                                  random_state=random_state)
+
+        factorized[prefix + 'weights_u'] = (u * s).astype(layer_w.dtype)
+        factorized[prefix + 'weights_v'] = vt.astype(layer_w.dtype)
+
+    return factorized
+
+
+def num_parameters(weights):
+    '''Count the parameters in a dictionary of weights.'''
+    return sum(value.size for value in weights.values())
@@ -2,16 +2,707 @@
 # coding: utf8
 '''VGGish transform definitions.'''
 
+from concurrent.futures import Future
+import itertools
 import numpy as np
+import os
+import queue
+import threading
+import time
 
 from . import params
+from . import profiling
+from .postprocessor import Postprocessor
+from ..util import tiny
 
-from .slim import load_vggish_slim_checkpoint, define_vggish_slim
 
+class BaseExtractor(object):
+    '''Common interface for VGGish feature extractors.
 
-def transform(examples, sess):
+    Sub-classes need only implement `_embed`, which maps a batch of examples
+    to an array of embeddings. If `postprocess` is True, the postprocessed
+    (PCA'ed and quantized) embeddings are returned as well; sub-classes
+    which can compute both at once may override `_run` to do so.
+    '''
+
+    postprocess = False
+    _postprocessor = None
+
+    def extract(self, examples, max_batch=None):
+        '''Compute VGGish features for an array of examples.
+
+        Note that the number of returned arrays depends on `postprocess`:
+        `time_points, features` if False (the default), or `time_points,
+        features, features_z` if True.
+
+        Parameters
+        ----------
+        examples : np.ndarray, shape=(n, 96, 64)
+            Examples to process by the model.
+            See openmic.vggish.inputs.{soundfile_to_examples,
+            waveform_to_examples}
+
+        max_batch : int > 0 or None
+            If given, the examples are processed in chunks of at most this
+            many, so that the memory used by the model does not grow with
+            the number of examples.
+
+        Returns
+        -------
+        time_points : np.ndarray, len=n
+            Time points in seconds of the feature vector.
+
+        features : np.ndarray, shape=(n, 128), dtype=np.float32
+            VGGish feature array.
+
+        features_z : np.ndarray, shape=(n, 128), dtype=np.uint8
+            The postprocessed VGGish features.
+            Only returned if the extractor was created with `postprocess`.
+        '''
+        if max_batch is None or len(examples) <= max_batch:
+            outputs = self._run(examples)
+        else:
+            outputs = _run_chunked(self._run, examples, max_batch)
+
+        time_points = np.arange(len(outputs[0])) * params.EXAMPLE_HOP_SECONDS
+
+        return (time_points,) + tuple(outputs)
+
+    def extract_many(self, examples_list, batch_size=None):
+        '''Compute VGGish features for a collection of example arrays.
+
+        The examples are stacked together and pushed through the model in
+        batches of (at most) `batch_size` patches, regardless of which input
+        they came from. The resulting features are then split back apart
+        according to the offsets of each input.
+
+        Parameters
+        ----------
+        examples_list : list of np.ndarray, shape=(n_i, 96, 64)
+            Example arrays to process by the model, e.g., one per audio file.
+
+        batch_size : int > 0 or None
+            Number of patches to process per forward pass of the model.
+            If None, all examples are processed at once.
+
+        Returns
+        -------
+        results : list of tuples
+            Time points and features for each element of `examples_list`,
+            as returned by `extract`.
+        '''
+        lengths = [len(examples) for examples in examples_list]
+        offsets = np.cumsum([0] + lengths)
+
+        stacked = np.empty((offsets[-1], params.NUM_FRAMES, params.NUM_BANDS),
+                           dtype=np.float32)
+        for start, examples in zip(offsets, examples_list):
+            stacked[start:start + len(examples)] = examples
+
+        if not batch_size:
+            batch_size = max(len(stacked), 1)
+
+        outputs = [np.empty((len(stacked), params.EMBEDDING_SIZE),
+                            dtype=np.float32)]
+        if self.postprocess:
+            outputs.append(np.empty((len(stacked), params.EMBEDDING_SIZE),
+                                    dtype=np.uint8))
+
+        for start in range(0, len(stacked), batch_size):
+            results = self._run(stacked[start:start + batch_size])
+            for output, result in zip(outputs, results):
+                output[start:start + batch_size] = result
+
+        return [(np.arange(n) * params.EXAMPLE_HOP_SECONDS,) +
+                tuple(output[start:start + n] for output in outputs)
+                for start, n in zip(offsets, lengths)]
+
+    def _run(self, examples):
+        with profiling.stage('embed'):
+            features = self._embed(examples)
+        if not self.postprocess:
+            return (features,)
+
+        if self._postprocessor is None:
+            params.verify_model([params.PCA_PARAMS])
+            self._postprocessor = Postprocessor(params.PCA_PARAMS)
+
+        with profiling.stage('postprocess'):
+            return features, self._postprocessor.postprocess(features)
+
+    def _embed(self, examples):
+        raise NotImplementedError
+
+    def close(self):
+        '''Release any resources held by the extractor.'''
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class VGGishExtractor(BaseExtractor):
+    '''A long-lived VGGish feature extractor.
+
+    The extractor owns its own graph and session. The model is defined and
+    the checkpoint restored exactly once, at construction time; afterwards,
+    the graph is finalized and each call to `extract` only costs a single
+    `sess.run`.
+
+    Parameters
+    ----------
+    checkpoint : str
+        Path to a VGGish model checkpoint.
+
+    saved_model : str or None
+        Path to an exported VGGish model, as produced by `export_saved_model`.
+        If given, the model is imported directly from this directory and
+        `checkpoint` is ignored, which is considerably faster to start.
+
+    postprocess : bool
+        If True, the PCA, clipping and quantization of `Postprocessor` are
+        appended to the graph (see `slim.define_vggish_postprocess`), and
+        `extract` returns both the raw and postprocessed features from a
+        single `sess.run`. The latter are identical to those computed by
+        `Postprocessor.postprocess`.
+
+    intra_op_threads, inter_op_threads : int > 0 or None
+        Number of threads used within and across tensorflow ops.
+        See `session_config`.
+
+    config : tf.compat.v1.ConfigProto or None
+        Session configuration. Thread counts, if given, take precedence
+        over those in `config`.
+
+    trace_dir : str or None
+        If given, the first `trace_batches` calls to `sess.run` are traced,
+        and the op-level timeline of each is saved in this directory, in
+        the Chrome trace format (see `SessionTracer`).
+
+    trace_batches : int >= 0
+        Number of batches to trace.
+
+    Examples
+    --------
+    >>> with VGGishExtractor() as extractor:
+    ...     for fname in filenames:
+    ...         examples = soundfile_to_examples(fname)
+    ...         time_points, features = extractor.extract(examples)
+    '''
+
+    def __init__(self, checkpoint=params.MODEL_PARAMS, saved_model=None,
+                 postprocess=False, intra_op_threads=None,
+                 inter_op_threads=None, config=None, trace_dir=None,
+                 trace_batches=1):
+        import tensorflow as tf
+        from .slim import load_vggish_slim_checkpoint, define_vggish_slim
+        from .slim import define_vggish_postprocess
+
+        config = session_config(intra_op_threads=intra_op_threads,
+                                inter_op_threads=inter_op_threads,
+                                config=config)
+
+        self.graph = tf.Graph()
+        self.session = tf.compat.v1.Session(graph=self.graph, config=config)
+        with self.graph.as_default():
+            if saved_model is None:
+                define_vggish_slim(training=False)
+                load_vggish_slim_checkpoint(self.session, checkpoint)
+            else:
+                load_saved_model(self.session, saved_model)
+
+        self.features_tensor = self.graph.get_tensor_by_name(
+            params.INPUT_TENSOR_NAME)
+        self.embedding_tensor = self.graph.get_tensor_by_name(
+            params.OUTPUT_TENSOR_NAME)
+        self.fetches = [self.embedding_tensor]
+
+        self.postprocess = postprocess
+        if postprocess:
+            try:
+                # Exported models may already include the postprocessing
+                postprocess_tensor = self.graph.get_tensor_by_name(
+                    params.POSTPROCESS_TENSOR_NAME)
+            except KeyError:
+                with self.graph.as_default():
+                    postprocess_tensor = define_vggish_postprocess(
+                        self.embedding_tensor, params.PCA_PARAMS)
+            self.fetches.append(postprocess_tensor)
+
+        self.tracer = None
+        if trace_dir is not None:
+            self.tracer = SessionTracer(trace_dir, trace_batches)
+
+        # Guard against anything adding ops to the graph after this point.
+        self.graph.finalize()
+
+    def _run(self, examples):
+        with profiling.stage('session_run'):
+            return _session_run(self.session, self.fetches,
+                                {self.features_tensor: examples}, self.tracer)
+
+    def close(self):
+        '''Release the underlying tensorflow session.'''
+        self.session.close()
+
+
+def session_config(intra_op_threads=None, inter_op_threads=None,
+                   config=None):
+    '''Build a tensorflow session configuration.
+
+    By default, tensorflow sizes its thread pools to the number of cores on
+    the machine, which oversubscribes the CPU when several extraction
+    processes run side by side. As VGGish is a simple chain of large ops,
+    throughput is generally best with `inter_op_threads=1`, and
+    `intra_op_threads` set to the number of cores available to each process.
+
+    Parameters
+    ----------
+    intra_op_threads : int > 0 or None
+        Number of threads used to parallelize the work within an op.
+
+    inter_op_threads : int > 0 or None
+        Number of threads used to run independent ops concurrently.
+
+    config : tf.compat.v1.ConfigProto or None
+        A configuration to start from. It is not modified.
+
+    Returns
+    -------
+    config : tf.compat.v1.ConfigProto
+    '''
+    import tensorflow as tf
+
+    new_config = tf.compat.v1.ConfigProto()
+    if config is not None:
+        new_config.CopyFrom(config)
+
+    if intra_op_threads is not None:
+        new_config.intra_op_parallelism_threads = intra_op_threads
+    if inter_op_threads is not None:
+        new_config.inter_op_parallelism_threads = inter_op_threads
+
+    return new_config
+
+
+class SessionTracer(object):
+    '''Capture op-level traces of the first few calls to `sess.run`.
+
+    Each traced call is run with full tracing `RunOptions`, and the step
+    stats of its `RunMetadata` are saved as a Chrome trace, which can be
+    opened at chrome://tracing or in Perfetto, to see the time spent in
+    each op of the model.
+
+    Parameters
+    ----------
+    trace_dir : str
+        Directory to save the traces in, which is created if needed. Files
+        are named `timeline-<pid>-<tracer>-<batch>.json`, where `tracer`
+        numbers the tracers of a process, so several processes and tracers
+        may share a directory.
+
+    max_batches : int >= 0
+        Number of calls to trace. Later calls are not traced.
+    '''
+
+    _ids = itertools.count()
+
+    def __init__(self, trace_dir, max_batches=1):
+        self.id = next(SessionTracer._ids)
+        self.trace_dir = trace_dir
+        self.max_batches = max_batches
+        self.num_batches = 0
+        self._lock = threading.Lock()
+        os.makedirs(trace_dir, exist_ok=True)
+
+    def claim(self):
+        '''Return the number of the next batch to trace, or None if enough
+        batches have been traced.'''
+        with self._lock:
+            if self.num_batches >= self.max_batches:
+                return None
+            self.num_batches += 1
+            return self.num_batches - 1
+
+    def run(self, sess, fetches, feed_dict, batch):
+        '''Run and trace `sess.run(fetches, feed_dict)`.'''
+        import tensorflow as tf
+        from tensorflow.python.client import timeline
+
+        options = tf.compat.v1.RunOptions(
+            trace_level=tf.compat.v1.RunOptions.FULL_TRACE)
+        metadata = tf.compat.v1.RunMetadata()
+        outputs = sess.run(fetches, feed_dict=feed_dict, options=options,
+                           run_metadata=metadata)
+
+        trace = timeline.Timeline(metadata.step_stats)
+        fname = os.path.join(
+            self.trace_dir, 'timeline-{}-{:05d}-{:05d}.json'.format(
+                os.getpid(), self.id, batch))
+        with open(fname, 'w') as fdesc:
+            fdesc.write(trace.generate_chrome_trace_format())
+        return outputs
+
+
+def _session_run(sess, fetches, feed_dict, tracer=None):
+    '''`sess.run`, traced by `tracer` while it has batches left.'''
+    batch = None if tracer is None else tracer.claim()
+    if batch is None:
+        return sess.run(fetches, feed_dict=feed_dict)
+    return tracer.run(sess, fetches, feed_dict, batch)
+
+
+BACKENDS = ('session', 'function', 'numpy', 'quantized')
+
+# Options which only some backends support
+BACKEND_OPTIONS = {
+    'inter_op_threads': ('session', 'function'),
+    'config': ('session',),
+    'saved_model': ('session',),
+}
+
+
+def extractor_options(backend, **kwargs):
+    '''Check options for an extractor against its backend.
+
+    Options which the backend does not support (see `BACKEND_OPTIONS`) are
+    dropped if they are None, and rejected otherwise.
+
+    Parameters
+    ----------
+    backend : str
+        One of `BACKENDS`.
+
+    kwargs
+        Keyword arguments for the extractor.
+
+    Returns
+    -------
+    options : dict
+        The options which `backend` supports.
+
+    Raises
+    ------
+    ValueError
+        If an option is given which `backend` does not support.
+    '''
+    if backend not in BACKENDS:
+        raise ValueError('Unknown backend: {}; expected one of {}'
+                         .format(backend, BACKENDS))
+
+    options = dict()
+    for key, value in kwargs.items():
+        if backend in BACKEND_OPTIONS.get(key, BACKENDS):
+            options[key] = value
+        elif value is not None:
+            raise ValueError('The {} backend does not support {}, only {} '
+                             'do'.format(backend, key,
+                                         ', '.join(BACKEND_OPTIONS[key])))
+    return options
+
+
+def get_extractor(backend='session', **kwargs):
+    '''Construct a VGGish feature extractor.
+
+    Parameters
+    ----------
+    backend : str
+        Which implementation of the model to use, one of:
+
+        - 'session': `VGGishExtractor`, a tensorflow graph and session
+        - 'function': `tf2.FunctionExtractor`, a tensorflow-2 `tf.function`
+        - 'numpy': `numpy_model.NumpyExtractor`, which does not depend on
+          tensorflow, but requires converted weights
+          (see `numpy_model.convert_checkpoint`).
+        - 'quantized': `quantize.QuantizedExtractor`, an int8 model which
+          must first be created by `quantize.quantize_model`.
+
+    kwargs
+        Additional keyword arguments passed to the extractor.
+        See `extractor_options`.
+
+    Returns
+    -------
+    extractor : BaseExtractor
+    '''
+    kwargs = extractor_options(backend, **kwargs)
+    if backend == 'session':
+        return VGGishExtractor(**kwargs)
+    elif backend == 'function':
+        from .tf2 import FunctionExtractor
+        return FunctionExtractor(**kwargs)
+    elif backend == 'numpy':
+        from .numpy_model import NumpyExtractor
+        return NumpyExtractor(**kwargs)
+    elif backend == 'quantized':
+        from .quantize import QuantizedExtractor
+        return QuantizedExtractor(**kwargs)
+
+
+class CoalescingExtractor(BaseExtractor):
+    '''A thread-safe extractor which pools concurrent requests into batches.
+
+    Requests from any number of threads are queued, and a single worker
+    thread runs the wrapped extractor on all of the examples queued so far,
+    as one call to `extract_many`. A request which arrives while the model
+    is busy therefore waits for at most the current batch, and is then
+    processed together with every other request which arrived meanwhile.
+
+    Parameters
+    ----------
+    extractor : BaseExtractor
+        The extractor to run. It is only ever used from the worker thread,
+        and is closed along with this extractor.
+
+    max_batch : int > 0
+        Maximum number of examples per batch. A single request with more
+        examples than this is split into several forward passes.
+        Requests may lower this for the batches which they are part of.
+
+    max_latency : float >= 0
+        Time, in seconds, to wait for further requests after the first
+        request of a batch has arrived. With the default of 0, only requests
+        which are already queued are batched together.
+
+    Examples
+    --------
+    >>> extractor = CoalescingExtractor(VGGishExtractor(postprocess=True))
+    >>> # In any thread
+    >>> future = extractor.submit(examples)
+    >>> time_points, features, features_z = future.result()
+    '''
+
+    def __init__(self, extractor, max_batch=256, max_latency=0):
+        self.extractor = extractor
+        self.max_batch = max_batch
+        self.max_latency = max_latency
+
+        self.num_batches = 0
+        self.num_examples = 0
+
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    @property
+    def postprocess(self):
+        return self.extractor.postprocess
+
+    def submit(self, examples, max_batch=None):
+        '''Queue a set of examples for the model.
+
+        Parameters
+        ----------
+        examples : np.ndarray, shape=(n, 96, 64)
+            Examples to process by the model.
+
+        max_batch : int > 0 or None
+            If given, the batch which includes these examples is processed
+            in forward passes of at most this many examples, if fewer than
+            the extractor's `max_batch`.
+
+        Returns
+        -------
+        future : concurrent.futures.Future
+            The future result of `extract(examples)`.
+        '''
+        future = Future()
+        self._queue.put((examples, future, max_batch))
+        return future
+
+    def extract(self, examples, max_batch=None):
+        return self.submit(examples, max_batch).result()
+
+    def extract_many(self, examples_list, batch_size=None):
+        futures = [self.submit(examples, batch_size)
+                   for examples in examples_list]
+        return [future.result() for future in futures]
+
+    def close(self):
+        '''Finish the queued requests, then stop the worker thread and
+        close the wrapped extractor.'''
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        self.extractor.close()
+
+    def _serve(self):
+        running = True
+        while running:
+            item = self._queue.get()
+            if item is None:
+                break
+
+            pending = [item[:2]]
+            size = len(item[0])
+            batch_size = min(self.max_batch, item[2] or self.max_batch)
+            deadline = time.monotonic() + self.max_latency
+            while size < batch_size:
+                try:
+                    item = self._queue.get(
+                        timeout=max(0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    running = False
+                    break
+                pending.append(item[:2])
+                size += len(item[0])
+                batch_size = min(batch_size, item[2] or batch_size)
+
+            self._run_pending(pending, batch_size)
+
+    def _run_pending(self, pending, batch_size):
+        pending = [(examples, future) for examples, future in pending
+                   if future.set_running_or_notify_cancel()]
+        if not pending:
+            return
+
+        try:
+            results = self.extractor.extract_many(
+                [examples for examples, _ in pending], batch_size)
+        except Exception as exc:
+            if len(pending) == 1:
+                pending[0][1].set_exception(exc)
+                return
+            # Retry the requests one at a time, so that the failure only
+            # reaches the request(s) which caused it
+            for examples, future in pending:
+                try:
+                    result, = self.extractor.extract_many([examples],
+                                                          batch_size)
+                except Exception as exc:
+                    future.set_exception(exc)
+                else:
+                    self.num_batches += 1
+                    self.num_examples += len(examples)
+                    future.set_result(result)
+            return
+
+        self.num_batches += 1
+        self.num_examples += sum(len(examples) for examples, _ in pending)
+        for (_, future), result in zip(pending, results):
+            future.set_result(result)
+
+
+__SHARED_EXTRACTORS__ = dict()
+__SHARED_LOCK__ = threading.Lock()
+
+
+def get_shared_extractor(backend='session', **kwargs):
+    '''Get the process-wide `CoalescingExtractor` for a configuration.
+
+    The first call for a given backend and set of keyword arguments loads
+    the model; later calls, from any thread, return the same extractor.
+    The extractor always postprocesses its features, so that it can serve
+    callers which want either.
+
+    Parameters
+    ----------
+    backend, kwargs
+        See `get_extractor`.
+
+    Returns
+    -------
+    extractor : CoalescingExtractor
+        The shared extractor. It should not be closed by the caller; see
+        `close_shared_extractors`.
+    '''
+    key = (backend,) + tuple(sorted((name, repr(value))
+                                    for name, value in kwargs.items()))
+    with __SHARED_LOCK__:
+        if key not in __SHARED_EXTRACTORS__:
+            __SHARED_EXTRACTORS__[key] = CoalescingExtractor(
+                get_extractor(backend, postprocess=True, **kwargs))
+        return __SHARED_EXTRACTORS__[key]
+
+
+def close_shared_extractors():
+    '''Close all extractors created by `get_shared_extractor`.'''
+    with __SHARED_LOCK__:
+        for extractor in __SHARED_EXTRACTORS__.values():
+            extractor.close()
+        __SHARED_EXTRACTORS__.clear()
+
+
+def accuracy_report(reference, candidate, examples_list, batch_size=None):
+    '''Compare the output of two extractors.
+
+    Parameters
+    ----------
+    reference : BaseExtractor
+        The extractor to compare against, typically a float32 model.
+
+    candidate : BaseExtractor
+        The extractor to evaluate, e.g., a quantized or low-rank model.
+
+    examples_list : list of np.ndarray, shape=(n_i, 96, 64)
+        Example arrays to evaluate on.
+
+    batch_size : int > 0 or None
+        Number of patches per batch; see `BaseExtractor.extract_many`.
+
+    Returns
+    -------
+    report : dict
+        - `cosine_mean`, `cosine_min`: cosine similarity between the raw
+          embeddings of each patch.
+        - `relative_error`: norm of the difference between all raw
+          embeddings, relative to the norm of the reference embeddings.
+        - `postprocess_equal`: fraction of the `Postprocessor` uint8 outputs
+          which are identical.
+        - `postprocess_mean_abs_diff`, `postprocess_max_abs_diff`: absolute
+          difference between the `Postprocessor` uint8 outputs.
+    '''
+    expected = np.concatenate([result[1] for result in
+                               reference.extract_many(examples_list,
+                                                      batch_size)])
+    actual = np.concatenate([result[1] for result in
+                             candidate.extract_many(examples_list,
+                                                    batch_size)])
+
+    norms = np.linalg.norm(expected, axis=1) * np.linalg.norm(actual, axis=1)
+    cosine = np.sum(expected * actual, axis=1) / np.maximum(norms,
+                                                            tiny(norms))
+
+    pproc = Postprocessor(params.PCA_PARAMS)
+    diff = np.abs(pproc.postprocess(expected).astype(np.int16) -
+                  pproc.postprocess(actual).astype(np.int16))
+
+    return dict(num_examples=len(expected),
+                cosine_mean=float(np.mean(cosine)),
+                cosine_min=float(np.min(cosine)),
+                relative_error=float(np.linalg.norm(actual - expected) /
+                                     np.linalg.norm(expected)),
+                postprocess_equal=float(np.mean(diff == 0)),
+                postprocess_mean_abs_diff=float(np.mean(diff)),
+                postprocess_max_abs_diff=int(np.max(diff)))
+
+
+def _run_chunked(run, examples, max_batch):
+    '''Apply `run` to chunks of `examples`, and concatenate the outputs.'''
+    outputs = None
+    for start in range(0, len(examples), max_batch):
+        results = run(examples[start:start + max_batch])
+        if outputs is None:
+            outputs = [np.empty((len(examples),) + result.shape[1:],
+                                dtype=result.dtype) for result in results]
+        for output, result in zip(outputs, results):
+            output[start:start + max_batch] = result
+
+    return outputs
+
+
+def transform(examples, sess, max_batch=None, trace_dir=None,
+              trace_batches=1):
     '''Compute VGGish features for an iterable of examples.
 
+    The VGGish model is only added to the session's graph (and the checkpoint
+    restored) the first time this is called with a given session; subsequent
+    calls reuse it.
+
     Parameters
     ----------
     examples : iterable of tf.Examples
@@ -21,6 +712,16 @@ def transform(examples, sess):
     sess : tf.Session
         Open tensorflow session.
 
+    max_batch : int > 0 or None
+        If given, the examples are processed in chunks of at most this many.
+
+    trace_dir : str or None
+        If given, the first `trace_batches` chunks are traced, and their
+        timelines saved in this directory. See `SessionTracer`.
+
+    trace_batches : int >= 0
+        Number of chunks to trace.
+
     Returns
     -------
     time_points : np.ndarray, len=n
@@ -29,15 +730,96 @@ def transform(examples, sess):
     features : np.ndarray, shape=(n, 128), dtype=np.uint8
         VGGish feature array.
     '''
-    define_vggish_slim(training=False)
-    load_vggish_slim_checkpoint(sess, params.MODEL_PARAMS)
+    from .slim import load_vggish_slim_checkpoint, define_vggish_slim
+
+    try:
+        sess.graph.get_operation_by_name(params.OUTPUT_OP_NAME)
+    except KeyError:
+        with sess.graph.as_default():
+            define_vggish_slim(training=False)
+            load_vggish_slim_checkpoint(sess, params.MODEL_PARAMS)
 
     features_tensor = sess.graph.get_tensor_by_name(params.INPUT_TENSOR_NAME)
     embedding_tensor = sess.graph.get_tensor_by_name(params.OUTPUT_TENSOR_NAME)
 
-    [features] = sess.run([embedding_tensor],
-                          feed_dict={features_tensor: examples})
+    tracer = None
+    if trace_dir is not None:
+        tracer = SessionTracer(trace_dir, trace_batches)
+
+    def run(batch):
+        with profiling.stage('session_run'):
+            return _session_run(sess, [embedding_tensor],
+                                {features_tensor: batch}, tracer)
+
+    if max_batch is None or len(examples) <= max_batch:
+        [features] = run(examples)
+    else:
+        [features] = _run_chunked(run, examples, max_batch)
 
     time_points = np.arange(len(features)) * params.EXAMPLE_HOP_SECONDS
 
     return time_points, features
+
+
+def export_saved_model(export_dir, checkpoint=params.MODEL_PARAMS,
+                       pca_params=None):
+    '''Export the VGGish inference graph and weights as a SavedModel.
+
+    The exported model can be imported without re-building the model in
+    Python, and its weights are stored in the V2 checkpoint format, which
+    restores several times faster than the original `vggish_model.ckpt`.
+    This only needs to be done once; see `load_saved_model`.
+
+    (A fully frozen GraphDef, with the weights folded into constants, is
+    considerably *slower* to import and to run for the first time, since
+    tensorflow then has to copy and constant-fold ~280MB of graph.)
+
+    Parameters
+    ----------
+    export_dir : str
+        Directory to write the model to. It must not already exist.
+
+    checkpoint : str
+        Path to the VGGish model checkpoint to export.
+
+    pca_params : str or None
+        If given, path to the PCA parameters (e.g., `params.PCA_PARAMS`).
+        The postprocessing (PCA, clipping and quantization) is then included
+        in the exported graph as `params.POSTPROCESS_TENSOR_NAME`.
+    '''
+    import tensorflow as tf
+    from .slim import load_vggish_slim_checkpoint, define_vggish_slim
+    from .slim import define_vggish_postprocess
+
+    with tf.Graph().as_default(), tf.compat.v1.Session() as sess:
+        embeddings = define_vggish_slim(training=False)
+        if pca_params is not None:
+            define_vggish_postprocess(embeddings, pca_params)
+
+        load_vggish_slim_checkpoint(sess, checkpoint)
+
+        builder = tf.compat.v1.saved_model.Builder(export_dir)
+        builder.add_meta_graph_and_variables(
+            sess, [tf.compat.v1.saved_model.tag_constants.SERVING],
+            strip_default_attrs=True)
+        builder.save()
+
+
+def load_saved_model(sess, export_dir):
+    '''Load an exported VGGish model into a session.
+
+    Parameters
+    ----------
+    sess : tf.Session
+        Open tensorflow session, whose graph does not yet contain VGGish.
+
+    export_dir : str
+        Path to a model, as written by `export_saved_model`.
+        The tensor names match those produced by `define_vggish_slim`.
+    '''
+    import tensorflow as tf
+
+    with sess.graph.as_default():
+        tf.compat.v1.saved_model.loader.load(
+            sess, [tf.compat.v1.saved_model.tag_constants.SERVING],
+            export_dir)
@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+# coding: utf8
+'''A pure-NumPy implementation of VGGish inference.
+
+This mirrors `slim.define_vggish_slim` layer for layer, but does not import
+tensorflow at all, which makes it cheap to start in worker processes that
+only need to compute embeddings. Convolutions are computed by unrolling
+each 3x3 neighborhood into a row (im2col), followed by a single matrix
+multiplication per layer.
+
+The weights are read from an `.npz` file, which can be produced once from
+the original checkpoint by `convert_checkpoint`.
+'''
+
+import numpy as np
+
+from . import params
+from .model import BaseExtractor
+
+
+def convert_checkpoint(npz_path, checkpoint=params.MODEL_PARAMS):
+    '''Convert a VGGish checkpoint to an `.npz` of weights.
+
+    This is the only function in this module which requires tensorflow.
+
+    Parameters
+    ----------
+    npz_path : str
+        Path to write the weights.
+
+    checkpoint : str
+        Path to a VGGish model checkpoint.
+    '''
+    from .tf2 import load_checkpoint_weights
+
+    np.savez(npz_path, **load_checkpoint_weights(checkpoint))
+
+
+def load_weights(npz_path=params.NUMPY_MODEL_PARAMS):
+    '''Load VGGish weights, as written by `convert_checkpoint`.
+
+    Returns
+    -------
+    weights : dict of np.ndarray, dtype=np.float32
+        The weights and biases of each layer, keyed by variable name,
+        e.g., `vggish/conv1/weights`.
+    '''
+    with np.load(npz_path) as data:
+        return {key: data[key].astype(np.float32) for key in data.files}
+
+
+def conv2d(data, weights, biases):
+    '''3x3, stride-1, SAME-padded convolution with ReLU activation.
+
+    Parameters
+    ----------
+    data : np.ndarray, shape=(n, height, width, channels_in)
+
+    weights : np.ndarray, shape=(3, 3, channels_in, channels_out)
+
+    biases : np.ndarray, shape=(channels_out,)
+
+    Returns
+    -------
+    output : np.ndarray, shape=(n, height, width, channels_out)
+    '''
+    n, height, width, channels = data.shape
+    k_h, k_w = weights.shape[:2]
+
+    padded = np.pad(data, [(0, 0), (k_h // 2, k_h // 2),
+                           (k_w // 2, k_w // 2), (0, 0)], mode='constant')
+
+    # A view of shape (n, height, width, k_h, k_w, channels), where
+    # [i, y, x] is the neighborhood of pixel (y, x) in image i.
+    strides = padded.strides
+    cols = np.lib.stride_tricks.as_strided(
+        padded, shape=(n, height, width, k_h, k_w, channels),
+        strides=strides[:3] + strides[1:3] + strides[3:], writeable=False)
+
+    output = np.dot(cols.reshape(n * height * width, -1),
+                    weights.reshape(-1, weights.shape[-1]))
+    output += biases
+    np.maximum(output, 0, out=output)
+    return output.reshape(n, height, width, -1)
+
+
+def max_pool2d(data):
+    '''2x2, stride-2 max-pooling.
+
+    Parameters
+    ----------
+    data : np.ndarray, shape=(n, height, width, channels)
+        `height` and `width` must be even, in which case SAME and VALID
+        padding coincide.
+
+    Returns
+    -------
+    output : np.ndarray, shape=(n, height // 2, width // 2, channels)
+    '''
+    n, height, width, channels = data.shape
+    return data.reshape(n, height // 2, 2, width // 2, 2,
+                        channels).max(axis=(2, 4))
+
+
+def fully_connected(data, weights, biases):
+    '''Fully-connected layer with ReLU activation.'''
+    output = np.dot(data, weights)
+    output += biases
+    np.maximum(output, 0, out=output)
+    return output
+
+
+def vggish(examples, weights):
+    '''Compute VGGish embeddings.
+
+    Parameters
+    ----------
+    examples : np.ndarray, shape=(n, 96, 64)
+        Log-mel spectrogram patches, as produced by `waveform_to_examples`.
+
+    weights : dict of np.ndarray
+        Model weights, as returned by `load_weights`.
+
+    Returns
+    -------
+    embeddings : np.ndarray, shape=(n, 128), dtype=np.float32
+    '''
+    net = np.asarray(examples, dtype=np.float32).reshape(
+        -1, params.NUM_FRAMES, params.NUM_BANDS, 1)
+
+    for kind, scope in params.LAYERS:
+        if kind == 'pool':
+            net = max_pool2d(net)
+            continue
+
+        prefix = 'vggish/{}/'.format(scope)
+        if kind == 'conv':
+            net = conv2d(net, weights[prefix + 'weights'],
+                         weights[prefix + 'biases'])
+            continue
+
+        # Flatten before entering fully-connected layers
+        net = net.reshape(len(net), -1)
+
+        if prefix + 'weights_u' in weights:
+            # A low-rank factorized layer; see `lowrank.factorize_weights`
+            net = np.dot(net, weights[prefix + 'weights_u'])
+            layer_w = weights[prefix + 'weights_v']
+        else:
+            layer_w = weights[prefix + 'weights']
+
+        net = fully_connected(net, layer_w, weights[prefix + 'biases'])
+
+    return net
+
+
+class NumpyExtractor(BaseExtractor):
+    '''A VGGish feature extractor which does not depend on tensorflow.
+
+    Parameters
+    ----------
+    weights : str
+        Path to the model weights, as written by `convert_checkpoint`.
+
+    rank : int > 0 or None
+        If given, the `fc1` layers are replaced by a low-rank factorization
+        of this rank. See `lowrank.factorize_weights`.
+
+    postprocess : bool
+        If True, `extract` also returns the postprocessed features.
+
+    intra_op_threads : int > 0 or None
+        Number of threads used by the BLAS library for matrix products.
+        This requires `threadpoolctl`.
+    '''
+
+    def __init__(self, weights=params.NUMPY_MODEL_PARAMS, rank=None,
+                 postprocess=False, intra_op_threads=None):
+        self.postprocess = postprocess
+        self.intra_op_threads = intra_op_threads
+        self.weights = load_weights(weights)
+        if rank is not None:
+            from .lowrank import factorize_weights
+            self.weights = factorize_weights(self.weights, rank)
+
+    def _embed(self, examples):
+        if self.intra_op_threads is None:
+            return vggish(examples, self.weights)
+
+        from threadpoolctl import threadpool_limits
+        with threadpool_limits(limits=self.intra_op_threads,
+                               user_api='blas'):
+            return vggish(examples, self.weights)
@@ -18,7 +18,6 @@
 See vggish_slim.py for more information.
 """
 import os
-import pkg_resources
 from ..util import md5_file
 
 # Architectural constants.
@@ -26,6 +25,17 @@ NUM_FRAMES = 96  # Frames in input mel-spectrogram patch.
 NUM_BANDS = 64  # Frequency bands in input mel-spectrogram patch.
 EMBEDDING_SIZE = 128  # Size of embedding layer.
 
+# Layers of the model, in order, as (type, scope) pairs.
+# These match the variable scopes created by `slim.define_vggish_slim`.
+LAYERS = [('conv', 'conv1'), ('pool', 'pool1'),
+          ('conv', 'conv2'), ('pool', 'pool2'),
+          ('conv', 'conv3/conv3_1'), ('conv', 'conv3/conv3_2'),
+          ('pool', 'pool3'),
+          ('conv', 'conv4/conv4_1'), ('conv', 'conv4/conv4_2'),
+          ('pool', 'pool4'),
+          ('fc', 'fc1/fc1_1'), ('fc', 'fc1/fc1_2'),
+          ('fc', 'fc2')]
+
 # Hyperparameters used in feature and example generation.
 SAMPLE_RATE = 16000
 STFT_WINDOW_LENGTH_SECONDS = 0.025
@@ -53,6 +63,8 @@ INPUT_OP_NAME = 'vggish/input_features'
 INPUT_TENSOR_NAME = INPUT_OP_NAME + ':0'
 OUTPUT_OP_NAME = 'vggish/embedding'
 OUTPUT_TENSOR_NAME = OUTPUT_OP_NAME + ':0'
+POSTPROCESS_OP_NAME = 'vggish/postprocessed'
+POSTPROCESS_TENSOR_NAME = POSTPROCESS_OP_NAME + ':0'
 AUDIO_EMBEDDING_FEATURE_NAME = 'audio_embedding'
 
 START_TIME = 'start_time_seconds'
@@ -65,22 +77,146 @@ MD5_CHECKSUMS = {
     'vggish_pca_params.npz': 'c80cae691033abe7c7ecd11ea39fc834'
 }
 
-MODEL_PARAMS = pkg_resources.resource_filename(
-    __name__, '_model/vggish_model.ckpt')
-PCA_PARAMS = pkg_resources.resource_filename(
-    __name__, '_model/vggish_pca_params.npz')
-
-for fname in MODEL_PARAMS, PCA_PARAMS:
-    if not os.path.exists(fname):
-        raise RuntimeError('### VGGish model not found ###\n'
-                           '\t >>> {}\n'
-                           'Did you forget to run `./scripts/download-deps.sh`?\n'
-                           .format(fname))
-
-    fbase = os.path.basename(fname)
-    if md5_file(fname) != MD5_CHECKSUMS[fbase]:
-        raise RuntimeError(
-            '### VGGish model checksums do not match! ###\n\n'
-            'Re-run `./scripts/download-deps.sh`, and open an issue at \n'
-            'https://github.com/cosmir/openmic-2018/issues/new if that \n'
-            'doesn\'t resolve the problem.\n')
+# Resolved relative to this file, rather than with `pkg_resources`, which
+# is slow to import.
+MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '_model')
+
+MODEL_PARAMS = os.path.join(MODEL_DIR, 'vggish_model.ckpt')
+PCA_PARAMS = os.path.join(MODEL_DIR, 'vggish_pca_params.npz')
+
+# Optional: the model weights converted by `numpy_model.convert_checkpoint`.
+NUMPY_MODEL_PARAMS = os.path.join(MODEL_DIR, 'vggish_model.npz')
+
+# Optional: the int8 model produced by `quantize.quantize_model`.
+QUANTIZED_MODEL_PARAMS = os.path.join(MODEL_DIR, 'vggish_model_int8.tflite')
+
+
+def params_hash(**settings):
+    """Hash the parameters which determine the features computed for audio.
+
+    This covers the package version, the example generation parameters and
+    the checksums of the model and PCA files.
+
+    Args:
+        settings: Any other settings to include, e.g., the backend.
+
+    Returns:
+        The md5 hex digest of the parameters.
+    """
+    import hashlib
+    import json
+    from ..version import version
+
+    state = dict(version=version, checksums=MD5_CHECKSUMS,
+                 inputs=[SAMPLE_RATE, STFT_WINDOW_LENGTH_SECONDS,
+                         STFT_HOP_LENGTH_SECONDS, NUM_MEL_BINS, MEL_MIN_HZ,
+                         MEL_MAX_HZ, LOG_OFFSET, EXAMPLE_WINDOW_SECONDS,
+                         EXAMPLE_HOP_SECONDS, QUANTIZE_MIN_VAL,
+                         QUANTIZE_MAX_VAL],
+                 settings=settings)
+    return hashlib.md5(json.dumps(state, sort_keys=True)
+                       .encode('utf-8')).hexdigest()
+
+
+# Record of the files which have passed `verify_model`.
+# Resolved lazily, as `$XDG_CACHE_HOME/openmic/vggish_checksums.json`.
+CHECKSUM_STAMP_FILE = None
+
+__VERIFIED__ = set()
+
+
+def verify_model(fnames=None, checksums=None, stamp_file=None, force=False):
+    """Check that the VGGish model files exist and are intact.
+
+    Hashing the checkpoint means reading all ~280 MB of it, so the result is
+    recorded in a stamp file, keyed by the path, size and modification time
+    of each file. Files which match their stamp are not hashed again, by
+    this or any other process, until they change.
+
+    This is called when the model is first loaded, rather than on import.
+
+    Args:
+        fnames: Paths of the files to check; by default, MODEL_PARAMS and
+            PCA_PARAMS.
+        checksums: Expected md5 checksums, keyed by file name; by default,
+            MD5_CHECKSUMS.
+        stamp_file: Path to the stamp file; by default, CHECKSUM_STAMP_FILE.
+        force: If True, hash the files even if they match their stamp.
+
+    Raises:
+        RuntimeError: if a file is missing, or its checksum does not match.
+    """
+    if fnames is None:
+        fnames = [MODEL_PARAMS, PCA_PARAMS]
+    if checksums is None:
+        checksums = MD5_CHECKSUMS
+    if stamp_file is None:
+        stamp_file = _stamp_file()
+
+    stamps = None
+    for fname in fnames:
+        if not os.path.exists(fname):
+            raise RuntimeError('### VGGish model not found ###\n'
+                               '\t >>> {}\n'
+                               'Did you forget to run '
+                               '`./scripts/download-deps.sh`?\n'
+                               .format(fname))
+
+        expected = checksums[os.path.basename(fname)]
+        stat = os.stat(fname)
+        key = os.path.abspath(fname)
+        stamp = dict(size=stat.st_size, mtime=stat.st_mtime_ns, md5=expected)
+        if not force and (key, expected, stat.st_size,
+                          stat.st_mtime_ns) in __VERIFIED__:
+            continue
+
+        if stamps is None:
+            stamps = _read_stamps(stamp_file)
+
+        if force or stamps.get(key) != stamp:
+            if md5_file(fname) != expected:
+                raise RuntimeError(
+                    '### VGGish model checksums do not match! ###\n\n'
+                    'Re-run `./scripts/download-deps.sh`, and open an issue '
+                    'at \nhttps://github.com/cosmir/openmic-2018/issues/new '
+                    'if that \ndoesn\'t resolve the problem.\n')
+            stamps[key] = stamp
+            _write_stamps(stamp_file, stamps)
+
+        __VERIFIED__.add((key, expected, stat.st_size, stat.st_mtime_ns))
+
+
+def _stamp_file():
+    if CHECKSUM_STAMP_FILE is not None:
+        return CHECKSUM_STAMP_FILE
+    cache_dir = os.environ.get('XDG_CACHE_HOME',
+                               os.path.join(os.path.expanduser('~'), '.cache'))
+    return os.path.join(cache_dir, 'openmic', 'vggish_checksums.json')
+
+
+def _read_stamps(stamp_file):
+    import json
+
+    try:
+        with open(stamp_file) as fdesc:
+            return json.load(fdesc)
+    except (IOError, ValueError):
+        return dict()
+
+
+def _write_stamps(stamp_file, stamps):
+    """Write the stamps atomically; failing that, they are just not cached."""
+    import json
+    import tempfile
+
+    try:
+        dirname = os.path.dirname(stamp_file)
+        if dirname and not os.path.exists(dirname):
+            os.makedirs(dirname)
+        fdesc, tmpname = tempfile.mkstemp(dir=dirname or None,
+                                          suffix='.tmp')
+        with os.fdopen(fdesc, 'w') as fdesc:
+            json.dump(stamps, fdesc, indent=2, sort_keys=True)
+        os.replace(tmpname, stamp_file)
+    except (IOError, OSError):
+        pass
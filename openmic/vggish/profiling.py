@@ -0,0 +1,244 @@
+#!/usr/bin/env python
+# coding: utf8
+'''Opt-in timing and memory instrumentation of feature extraction.
+
+The stages of feature extraction (reading, resampling, the mel spectrogram,
+the model and postprocessing) are wrapped in `stage` blocks. These do
+nothing unless a `Profiler` has been enabled, in which case the wall time,
+CPU time and peak allocation of each stage are recorded.
+
+Example
+-------
+>>> profiler = profiling.enable()
+>>> for fname in filenames:
+...     with profiling.stage('file', item=fname):
+...         features = extractor.extract(soundfile_to_examples(fname))
+>>> profiling.disable()
+>>> profiler.summary()['resample']['wall']['p90']
+>>> profiler.save('profile.csv')
+
+CPU time is that of the whole process, so it includes the threads of the
+tensorflow runtime. Peak allocation is measured with `tracemalloc`, which
+sees memory allocated by python and numpy, but not by tensorflow. As the
+peak of `tracemalloc` is process-wide, it is only measured for stages of the
+main thread, and includes allocations by other threads meanwhile.
+'''
+
+import csv
+import json
+import numpy as np
+import threading
+import time
+import tracemalloc
+
+# The active profiler, if any
+__PROFILER__ = None
+
+
+class _NullStage(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage(object):
+    def __init__(self, profiler, name, item):
+        self.profiler = profiler
+        self.name = name
+        self.item = item
+        self.peak = 0
+
+    def __enter__(self):
+        stack = self.profiler._stack()
+        if self.item is None and stack:
+            self.item = stack[-1].item
+
+        # Resetting the peak from other threads would corrupt the peaks of
+        # the main thread's stages
+        self.memory = (self.profiler.memory and
+                       threading.current_thread() is threading.main_thread())
+        if self.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            if stack:
+                # Keep the enclosing stage's peak before resetting it
+                stack[-1].peak = max(stack[-1].peak, peak)
+            tracemalloc.reset_peak()
+            self.start_memory = current
+        stack.append(self)
+
+        self.start_cpu = time.process_time()
+        self.start_wall = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        wall = time.perf_counter() - self.start_wall
+        cpu = time.process_time() - self.start_cpu
+
+        stack = self.profiler._stack()
+        stack.pop()
+        peak = None
+        if self.memory:
+            self.peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+            peak = self.peak - self.start_memory
+            if stack:
+                stack[-1].peak = max(stack[-1].peak, self.peak)
+
+        self.profiler.record(self.name, wall, cpu, peak, item=self.item)
+
+
+class Profiler(object):
+    '''Records of the time and memory used by each stage.
+
+    Parameters
+    ----------
+    memory : bool
+        If True, peak allocations are traced, which slows down python code
+        that allocates many small objects.
+
+    Attributes
+    ----------
+    records : list of dict
+        One record per completed stage, with its `stage` name, the `item`
+        (e.g., file) being processed, if known, `wall` and `cpu` time in
+        seconds, and `peak` allocation in bytes above that at the start of
+        the stage. The `peak` of stages outside of the main thread is None.
+    '''
+
+    def __init__(self, memory=True):
+        self.memory = memory
+        self.records = []
+        self._tracing = False
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _stack(self):
+        try:
+            return self._local.stack
+        except AttributeError:
+            self._local.stack = []
+            return self._local.stack
+
+    def stage(self, name, item=None):
+        '''Measure a block of code as a stage; see `profiling.stage`.'''
+        return _Stage(self, name, item)
+
+    def record(self, stage, wall, cpu, peak=None, item=None):
+        '''Add a record for a stage.'''
+        with self._lock:
+            self.records.append(dict(stage=stage, item=item, wall=wall,
+                                     cpu=cpu, peak=peak))
+
+    def extend(self, records):
+        '''Add records, e.g., from another process; see `drain`.'''
+        with self._lock:
+            self.records.extend(records)
+
+    def drain(self):
+        '''Remove and return the records so far.'''
+        with self._lock:
+            records, self.records = self.records, []
+        return records
+
+    def summary(self, percentiles=(50, 90, 99)):
+        '''Aggregate the records of each stage.
+
+        Returns
+        -------
+        summary : dict
+            For each stage, the number of records (`count`), and the
+            `total`, `mean`, `max` and percentiles (`p50`, ...) of its
+            `wall` and `cpu` times. If memory was traced, the same
+            statistics of its `peak` allocation.
+        '''
+        with self._lock:
+            records = list(self.records)
+
+        stages = dict()
+        for record in records:
+            stages.setdefault(record['stage'], []).append(record)
+
+        summary = dict()
+        for name, records in stages.items():
+            summary[name] = dict(count=len(records))
+            for key in ('wall', 'cpu', 'peak'):
+                values = np.asarray([record[key] for record in records
+                                     if record[key] is not None], dtype=float)
+                if not len(values):
+                    continue
+                stats = dict(total=float(values.sum()),
+                             mean=float(values.mean()),
+                             max=float(values.max()))
+                for q in percentiles:
+                    stats['p{}'.format(q)] = float(np.percentile(values, q))
+                summary[name][key] = stats
+        return summary
+
+    def save(self, path):
+        '''Save a report.
+
+        If `path` ends with `.csv`, each record is written as a row.
+        Otherwise, the `summary` and the records are written as JSON.
+        '''
+        with self._lock:
+            records = list(self.records)
+
+        if path.endswith('.csv'):
+            with open(path, 'w', newline='') as fdesc:
+                writer = csv.DictWriter(fdesc, ['stage', 'item', 'wall',
+                                                'cpu', 'peak'])
+                writer.writeheader()
+                writer.writerows(records)
+        else:
+            with open(path, 'w') as fdesc:
+                json.dump(dict(summary=self.summary(), records=records),
+                          fdesc, indent=2, default=str)
+
+
+def enable(memory=True):
+    '''Start recording stages in a new `Profiler`, which is returned.'''
+    global __PROFILER__
+    disable()
+    profiler = Profiler(memory=memory)
+    # Tracing which was started elsewhere is left running by `disable`
+    profiler._tracing = memory and not tracemalloc.is_tracing()
+    if profiler._tracing:
+        tracemalloc.start()
+    __PROFILER__ = profiler
+    return profiler
+
+
+def disable():
+    '''Stop recording stages, and return the profiler which was active.'''
+    global __PROFILER__
+    profiler, __PROFILER__ = __PROFILER__, None
+    if profiler is not None and profiler._tracing:
+        tracemalloc.stop()
+    return profiler
+
+
+def get_profiler():
+    '''The active `Profiler`, or None.'''
+    return __PROFILER__
+
+
+def stage(name, item=None):
+    '''A context manager which measures a stage, if profiling is enabled.
+
+    Parameters
+    ----------
+    name : str
+        Name of the stage, e.g., 'resample'.
+
+    item : str, list of str or None
+        What is being processed, e.g., an input file, or the list of files
+        in a batch. Stages nested within this one are attributed to the
+        same item.
+    '''
+    if __PROFILER__ is None:
+        return _NULL_STAGE
+    return __PROFILER__.stage(name, item)
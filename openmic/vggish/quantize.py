@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+# coding: utf8
+'''Post-training int8 quantization of VGGish.
+
+The fully-connected `fc1` layers and the `conv4` block account for most of
+the model's weights and arithmetic. Here, the whole model is converted to a
+TensorFlow Lite flatbuffer with int8 weights (per output channel for the
+convolutions) and int8 activations. The activation ranges are calibrated on
+a set of example audio files, ideally drawn from the OpenMIC collection.
+
+The quantized model is used through `QuantizedExtractor`, or
+`get_extractor('quantized')`, and `model.accuracy_report` measures how far
+its output drifts from the float32 model.
+'''
+
+import numpy as np
+
+from . import params
+from .inputs import soundfile_to_examples
+from .model import BaseExtractor
+
+
+def calibration_examples(filenames, max_examples=None):
+    '''Generate single-patch calibration inputs from audio files.
+
+    Parameters
+    ----------
+    filenames : iterable of str
+        Audio files to draw examples from.
+
+    max_examples : int > 0 or None
+        Maximum number of patches to generate.
+
+    Yields
+    ------
+    example : np.ndarray, shape=(1, 96, 64), dtype=np.float32
+    '''
+    count = 0
+    for fname in filenames:
+        for example in soundfile_to_examples(fname):
+            if max_examples is not None and count >= max_examples:
+                return
+            yield example[np.newaxis].astype(np.float32)
+            count += 1
+
+
+def quantize_model(output_path, calibration_files, max_examples=1000,
+                   checkpoint=params.MODEL_PARAMS):
+    '''Convert VGGish to a quantized TensorFlow Lite model.
+
+    Parameters
+    ----------
+    output_path : str
+        Path to write the `.tflite` model.
+
+    calibration_files : iterable of str
+        Audio files used to calibrate the range of each activation.
+
+    max_examples : int > 0 or None
+        Maximum number of patches to calibrate with.
+
+    checkpoint : str
+        Path to a VGGish model checkpoint.
+    '''
+    import tensorflow as tf
+    from .tf2 import VGGish, load_checkpoint_weights
+
+    vggish = VGGish(load_checkpoint_weights(checkpoint))
+
+    converter = tf.lite.TFLiteConverter.from_concrete_functions(
+        [vggish.embed.get_concrete_function()], vggish)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.target_spec.supported_ops = [
+        tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    converter.representative_dataset = lambda: (
+        [example] for example in calibration_examples(calibration_files,
+                                                      max_examples))
+
+    with open(output_path, 'wb') as fdesc:
+        fdesc.write(converter.convert())
+
+
+def _interpreter(model_path, num_threads):
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+    except ImportError:
+        import tensorflow as tf
+        Interpreter = tf.lite.Interpreter
+
+    return Interpreter(model_path=model_path, num_threads=num_threads)
+
+
+class QuantizedExtractor(BaseExtractor):
+    '''A VGGish feature extractor using an int8 quantized model.
+
+    The model's input and output remain float32, so this is a drop-in
+    replacement for the other extractors.
+
+    Parameters
+    ----------
+    model_path : str
+        Path to a model written by `quantize_model`.
+
+    intra_op_threads : int > 0 or None
+        Number of threads used by the interpreter.
+
+    postprocess : bool
+        If True, `extract` also returns the postprocessed features.
+    '''
+
+    def __init__(self, model_path=params.QUANTIZED_MODEL_PARAMS,
+                 intra_op_threads=None, postprocess=False):
+        self.postprocess = postprocess
+        self.interpreter = _interpreter(model_path, intra_op_threads)
+        self._input = self.interpreter.get_input_details()[0]['index']
+        self._output = self.interpreter.get_output_details()[0]['index']
+        self._batch_size = None
+
+    def _embed(self, examples):
+        examples = np.asarray(examples, dtype=np.float32)
+
+        if len(examples) != self._batch_size:
+            self.interpreter.resize_tensor_input(self._input, examples.shape)
+            self.interpreter.allocate_tensors()
+            self._batch_size = len(examples)
+
+        self.interpreter.set_tensor(self._input, examples)
+        self.interpreter.invoke()
+        return self.interpreter.get_tensor(self._output).copy()
@@ -0,0 +1,229 @@
+#!/usr/bin/env python
+# coding: utf8
+'''A local HTTP service for computing VGGish features.
+
+The model is loaded once, and the examples of concurrent requests are
+pooled into batches for the model: the first request to arrive opens a
+window of (at most) `max_latency` seconds, during which further requests
+are added to the same batch, up to `max_batch` examples.
+See `openmic.vggish.model.CoalescingExtractor`.
+
+Example
+-------
+$ python -m openmic.vggish.service --port 8000 --max-latency 0.02
+
+Audio files, in any format readable by soundfile, are posted as-is:
+
+$ curl --data-binary @/some/audio/file.ogg http://localhost:8000/features
+
+Waveforms are posted as `.npy` data, with their sample rate:
+
+$ curl --data-binary @waveform.npy -H 'Content-Type: application/x-npy' \
+    'http://localhost:8000/features?sample_rate=44100'
+
+Both return a JSON object with `time_points`, `features` and `features_z`.
+Throughput and latency counters are available from:
+
+$ curl http://localhost:8000/stats
+'''
+
+import argparse
+import collections
+import http.server
+import io
+import json
+import numpy as np
+import sys
+import threading
+import time
+import urllib.parse
+
+from . import model
+from .inputs import soundfile_to_examples, waveform_to_examples
+
+
+class Stats(object):
+    '''Thread-safe request counters.
+
+    Parameters
+    ----------
+    window : int > 0
+        Number of recent requests over which latency percentiles are
+        computed.
+    '''
+
+    def __init__(self, window=1000):
+        self.start_time = time.time()
+        self.num_requests = 0
+        self.num_errors = 0
+        self.latencies = collections.deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, latency, error=False):
+        with self._lock:
+            self.num_requests += 1
+            self.num_errors += int(error)
+            if not error:
+                self.latencies.append(latency)
+
+    def report(self, extractor):
+        with self._lock:
+            latencies = np.asarray(self.latencies)
+            num_requests, num_errors = self.num_requests, self.num_errors
+
+        uptime = time.time() - self.start_time
+        report = dict(uptime=uptime,
+                      requests=num_requests,
+                      errors=num_errors,
+                      batches=extractor.num_batches,
+                      examples=extractor.num_examples,
+                      requests_per_second=num_requests / uptime,
+                      examples_per_second=extractor.num_examples / uptime,
+                      mean_batch_size=(extractor.num_examples /
+                                       max(extractor.num_batches, 1)))
+        if len(latencies):
+            report['latency'] = dict(
+                mean=float(latencies.mean()),
+                **{'p{}'.format(q): float(np.percentile(latencies, q))
+                   for q in (50, 90, 99)})
+        return report
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    '''Request handler for `Server`.'''
+
+    def do_GET(self):
+        if urllib.parse.urlparse(self.path).path != '/stats':
+            self.send_error(404)
+            return
+        self._send_json(self.server.stats.report(self.server.extractor))
+
+    def do_POST(self):
+        url = urllib.parse.urlparse(self.path)
+        if url.path != '/features':
+            self.send_error(404)
+            return
+
+        start = time.time()
+        try:
+            examples = self._read_examples(urllib.parse.parse_qs(url.query))
+        except (ValueError, RuntimeError, KeyError) as exc:
+            self.server.stats.record(time.time() - start, error=True)
+            self.send_error(400, explain=str(exc))
+            return
+
+        try:
+            time_points, features, features_z = \
+                self.server.extractor.submit(examples).result()
+        except Exception as exc:
+            self.server.stats.record(time.time() - start, error=True)
+            self.send_error(500, explain=str(exc))
+            return
+
+        self.server.stats.record(time.time() - start)
+        self._send_json(dict(time_points=time_points.tolist(),
+                             features=features.tolist(),
+                             features_z=features_z.tolist()))
+
+    def _read_examples(self, query):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.headers.get('Content-Type') == 'application/x-npy':
+            data = np.load(io.BytesIO(body), allow_pickle=False)
+            return waveform_to_examples(data, float(query['sample_rate'][0]))
+
+        return soundfile_to_examples(io.BytesIO(body))
+
+    def _send_json(self, obj):
+        body = json.dumps(obj).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class Server(http.server.ThreadingHTTPServer):
+    '''An HTTP server for VGGish features.
+
+    Each request is handled in its own thread, while the model itself is run
+    by a single `CoalescingExtractor`.
+
+    Parameters
+    ----------
+    address : tuple of (str, int)
+        Host and port to listen on.
+
+    extractor : BaseExtractor
+        An extractor created with `postprocess=True`. It is closed along with
+        the server.
+
+    max_batch, max_latency
+        See `CoalescingExtractor`.
+    '''
+
+    daemon_threads = True
+
+    def __init__(self, address, extractor, max_batch=256, max_latency=0.01):
+        super(Server, self).__init__(address, Handler)
+        self.extractor = model.CoalescingExtractor(
+            extractor, max_batch=max_batch, max_latency=max_latency)
+        self.stats = Stats()
+
+    def server_close(self):
+        super(Server, self).server_close()
+        self.extractor.close()
+
+
+def process_args(args):
+
+    parser = argparse.ArgumentParser(description='VGGish feature service')
+
+    parser.add_argument('--host', default='localhost', type=str,
+                        help='Address to listen on.')
+    parser.add_argument('--port', default=8000, type=int,
+                        help='Port to listen on.')
+
+    parser.add_argument('--max-batch', dest='max_batch', default=256,
+                        type=int,
+                        help='Maximum number of patches per model batch.')
+    parser.add_argument('--max-latency', dest='max_latency', default=0.01,
+                        type=float,
+                        help='Time in seconds to wait for further requests '
+                             'to add to a batch.')
+
+    parser.add_argument('--backend', default='session',
+                        choices=model.BACKENDS,
+                        help='Implementation of the VGGish model to use.')
+    parser.add_argument('--intra-op-threads', dest='intra_op_threads',
+                        default=None, type=int,
+                        help='Number of threads used within each model op.')
+    parser.add_argument('--inter-op-threads', dest='inter_op_threads',
+                        default=None, type=int,
+                        help='Number of threads used across model ops.')
+    return parser.parse_args(args)
+
+
+def main(args):
+    args = process_args(args)
+
+    options = dict(intra_op_threads=args.intra_op_threads,
+                   inter_op_threads=args.inter_op_threads)
+    options = {key: value for key, value in options.items()
+               if value is not None}
+    extractor = model.get_extractor(args.backend, postprocess=True, **options)
+
+    server = Server((args.host, args.port), extractor,
+                    max_batch=args.max_batch, max_latency=args.max_latency)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -30,6 +30,7 @@ For comparison, here is TF-Slim's VGG definition:
 https://github.com/tensorflow/models/blob/master/slim/nets/vgg.py
 """
 
+import numpy as np
 import tensorflow as tf
 import tf_slim
 from . import params
@@ -102,6 +103,39 @@ def define_vggish_slim(training=False):
         return tf.identity(net, name='embedding')
 
 
+def define_vggish_postprocess(embeddings, pca_params_npz_path):
+    """Appends PCA, clipping and 8-bit quantization ops to the VGGish model.
+
+    These ops reproduce `Postprocessor.postprocess` exactly: the computation
+    is carried out in float64, as it is in NumPy, before being cast to uint8.
+
+    Args:
+      embeddings: The 'vggish/embedding' tensor, as returned by
+        define_vggish_slim().
+      pca_params_npz_path: Path to a NumPy-format .npz file that contains
+        the PCA parameters used in postprocessing.
+
+    Returns:
+      The uint8 op 'vggish/postprocessed'.
+    """
+    with np.load(pca_params_npz_path) as data:
+        pca_matrix = data[params.PCA_EIGEN_VECTORS_NAME]
+        pca_means = data[params.PCA_MEANS_NAME].reshape(1, -1)
+
+    # Re-enter the existing 'vggish/' name scope, rather than 'vggish_1/'.
+    with tf.compat.v1.name_scope('vggish/'):
+        net = tf.cast(embeddings, tf.float64) - tf.constant(
+            pca_means, dtype=tf.float64, name='pca_means')
+        net = tf.matmul(net, tf.constant(pca_matrix, dtype=tf.float64,
+                                         name='pca_eigen_vectors'),
+                        transpose_b=True)
+        net = tf.clip_by_value(net, params.QUANTIZE_MIN_VAL,
+                               params.QUANTIZE_MAX_VAL)
+        net = (net - params.QUANTIZE_MIN_VAL) * (
+            255.0 / (params.QUANTIZE_MAX_VAL - params.QUANTIZE_MIN_VAL))
+        return tf.cast(net, tf.uint8, name='postprocessed')
+
+
 def load_vggish_slim_checkpoint(session, checkpoint_path):
     """Loads a pre-trained VGGish-compatible checkpoint.
 
@@ -116,6 +150,9 @@ def load_vggish_slim_checkpoint(session, checkpoint_path):
       checkpoint_path: path to a file containing a checkpoint that is
         compatible with the VGGish model definition.
     """
+    if checkpoint_path == params.MODEL_PARAMS:
+        params.verify_model()
+
     # Get the list of names of all VGGish variables that exist in
     # the checkpoint (i.e., all inference-mode VGGish variables).
     with tf.Graph().as_default():
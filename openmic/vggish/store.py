@@ -0,0 +1,365 @@
+#!/usr/bin/env python
+# coding: utf8
+'''A consolidated store of VGGish features for many clips.
+
+Rather than one file per clip, the features of all clips are appended to a
+few large shard files, and an index maps each sample key to its shard and
+rows. Readers memory-map the shards, so fetching a clip costs no more than
+a dictionary lookup and a slice.
+
+A store is a directory with the layout:
+
+    store.json             Fields stored for each example, and their dtypes
+    index.jsonl            One line per clip: key, shard, offset, length
+    shard-00000.time       Raw arrays, one file per field and shard
+    shard-00000.features
+    shard-00000.features_z
+    ...
+
+Features can be stored at reduced precision (see `PRECISIONS`), and time
+points, which follow from the number of examples, can be left out. The same
+encodings apply to single NPZ files, through `save_features` and
+`load_features`. Readers upcast to the usual dtypes, so downstream code is
+unchanged.
+
+Example
+-------
+>>> with FeatureStoreWriter('features', precision='float16') as writer:
+...     writer.add('000046_3840', time_points, features, features_z)
+>>> store = FeatureStore('features')
+>>> time_points, features, features_z = store['000046_3840']
+'''
+
+import json
+import numpy as np
+import os
+import threading
+
+from . import params
+
+META_NAME = 'store.json'
+INDEX_NAME = 'index.jsonl'
+
+# Name, dtype and per-example shape of each field
+FIELDS = [('time', 'float64', ()),
+          ('features', 'float32', (params.EMBEDDING_SIZE,)),
+          ('features_z', 'uint8', (params.EMBEDDING_SIZE,))]
+
+# Stored dtype of the features, by precision:
+#  - float32: as computed
+#  - float16: raw features at half precision, about 1e-3 relative error
+#  - uint8: only the PCA'ed and quantized features
+PRECISIONS = {'float32': dict(features='float32', features_z='uint8'),
+              'float16': dict(features='float16', features_z='uint8'),
+              'uint8': dict(features_z='uint8')}
+
+
+def fields(precision='float32', derive_time=False):
+    '''The fields stored for a given precision.
+
+    Parameters
+    ----------
+    precision : str
+        One of `PRECISIONS`.
+
+    derive_time : bool
+        If True, time points are not stored, but derived from the number
+        of examples when read.
+
+    Returns
+    -------
+    fields : list of (name, dtype, shape)
+        See `FIELDS`.
+    '''
+    if precision not in PRECISIONS:
+        raise ValueError('Unknown precision: {}'.format(precision))
+
+    dtypes = dict(PRECISIONS[precision])
+    if not derive_time:
+        dtypes['time'] = 'float64'
+    return [(name, dtypes[name], shape) for name, _, shape in FIELDS
+            if name in dtypes]
+
+
+def encode(results, fields):
+    '''Select and cast the arrays of `results` to be stored as `fields`.
+
+    Returns
+    -------
+    data : dict of str -> np.ndarray
+    '''
+    results = dict(zip([name for name, _, _ in FIELDS], results))
+    return {name: np.ascontiguousarray(results[name], dtype=dtype)
+            for name, dtype, _ in fields}
+
+
+def decode(data, length=None):
+    '''Restore stored arrays to the output of `BaseExtractor.extract`.
+
+    Features are upcast to their usual dtype, and missing time points are
+    derived from the number of examples.
+
+    Parameters
+    ----------
+    data : mapping of str -> np.ndarray
+        Stored fields, by name, e.g., an `np.load`ed NPZ file.
+
+    length : int or None
+        Number of examples; by default, the length of the stored arrays.
+
+    Returns
+    -------
+    time_points, features, features_z
+        `features` is None if only quantized features were stored.
+    '''
+    if length is None:
+        length = len(data['features_z'])
+
+    if 'time' in data:
+        time_points = data['time']
+    else:
+        time_points = np.arange(length) * params.EXAMPLE_HOP_SECONDS
+
+    features = None
+    if 'features' in data:
+        features = data['features'].astype(np.float32, copy=False)
+    return time_points, features, data['features_z']
+
+
+def save_features(file_out, results, precision='float32', derive_time=False,
+                  compressed=False):
+    '''Save features to an NPZ file.
+
+    Parameters
+    ----------
+    file_out : str or file-like
+        Where to save the features.
+
+    results : tuple of (time_points, features, features_z)
+        See `BaseExtractor.extract`.
+
+    precision, derive_time
+        See `fields`.
+
+    compressed : bool
+        If True, the arrays are zip-compressed.
+    '''
+    data = encode(results, fields(precision, derive_time))
+    if compressed:
+        np.savez_compressed(file_out, **data)
+    else:
+        np.savez(file_out, **data)
+
+
+def load_features(file_in):
+    '''Load features saved by `save_features`, or by `np.savez`.
+
+    Returns
+    -------
+    time_points, features, features_z
+        See `decode`.
+    '''
+    with np.load(file_in) as data:
+        return decode({name: data[name] for name in data.files})
+
+
+def _shard_file(path, shard, name):
+    return os.path.join(path, 'shard-{:05d}.{}'.format(shard, name))
+
+
+def _read_index(path):
+    '''Read the index of a store, as a dict of key -> (shard, offset, length).
+
+    A partly written last line, as left by an interrupted writer, is
+    ignored. Later entries for a key replace earlier ones.
+    '''
+    index = dict()
+    index_file = os.path.join(path, INDEX_NAME)
+    if not os.path.exists(index_file):
+        return index
+
+    with open(index_file) as fdesc:
+        for line in fdesc:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            index[entry['key']] = (entry['shard'], entry['offset'],
+                                   entry['length'])
+    return index
+
+
+class FeatureStoreWriter(object):
+    '''Append the features of clips to a feature store.
+
+    An existing store is extended. Data which was written by an interrupted
+    writer, but not indexed, is discarded. Calls to `add` are thread-safe.
+
+    Parameters
+    ----------
+    path : str
+        Directory of the store, which is created if needed.
+
+    shard_size : int > 0
+        Number of examples after which a new shard is started. A clip is
+        never split across shards.
+
+    precision, derive_time
+        Encoding of the store; see `fields`. These must match the encoding
+        of an existing store.
+
+    Raises
+    ------
+    ValueError
+        If the store exists with another encoding.
+    '''
+
+    def __init__(self, path, shard_size=2 ** 18, precision='float32',
+                 derive_time=False):
+        self.path = path
+        self.shard_size = shard_size
+        self.index = _read_index(path)
+        self._lock = threading.Lock()
+
+        if not os.path.exists(path):
+            os.makedirs(path)
+
+        self.fields = fields(precision, derive_time)
+        meta_file = os.path.join(path, META_NAME)
+        if os.path.exists(meta_file):
+            with open(meta_file) as fdesc:
+                stored = [(name, dtype, tuple(shape)) for name, dtype,
+                          shape in json.load(fdesc)['fields']]
+            if stored != self.fields:
+                raise ValueError('The store at {} has fields {}, not {}'
+                                 .format(path, stored, self.fields))
+        else:
+            with open(meta_file, 'w') as fdesc:
+                json.dump(dict(fields=self.fields), fdesc, indent=2)
+
+        # Resume from the end of the last indexed shard
+        self.shard, self.rows = 0, 0
+        for shard, offset, length in self.index.values():
+            if (shard, offset + length) > (self.shard, self.rows):
+                self.shard, self.rows = shard, offset + length
+        self._open()
+
+    def _open(self):
+        self._files = []
+        for name, dtype, shape in self.fields:
+            fname = _shard_file(self.path, self.shard, name)
+            fobj = open(fname, 'ab')
+            # Drop anything past the indexed rows
+            fobj.truncate(self.rows * np.dtype(dtype).itemsize *
+                          int(np.prod(shape)))
+            self._files.append(fobj)
+        self._index_file = open(os.path.join(self.path, INDEX_NAME), 'a')
+
+    def _close(self):
+        for fobj in self._files:
+            fobj.close()
+        self._index_file.close()
+
+    def add(self, key, *arrays):
+        '''Append the features of a clip.
+
+        Parameters
+        ----------
+        key : str
+            Sample key of the clip. If the key is already in the store, the
+            new features take its place.
+
+        arrays
+            `time_points, features, features_z`, as returned by
+            `BaseExtractor.extract`. Only the fields of the store are kept.
+        '''
+        length = len(arrays[0])
+        data = encode(arrays, self.fields)
+        data = [data[name].tobytes() for name, _, _ in self.fields]
+
+        with self._lock:
+            if self.rows and self.rows + length > self.shard_size:
+                self._close()
+                self.shard, self.rows = self.shard + 1, 0
+                self._open()
+
+            for fobj, chunk in zip(self._files, data):
+                fobj.write(chunk)
+                fobj.flush()
+
+            entry = dict(key=key, shard=self.shard, offset=self.rows,
+                         length=length)
+            self._index_file.write(json.dumps(entry) + '\n')
+            self._index_file.flush()
+
+            self.index[key] = (self.shard, self.rows, length)
+            self.rows += length
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class FeatureStore(object):
+    '''Read a feature store.
+
+    Shards are memory-mapped when first used. Each clip is returned as
+    `time_points, features, features_z` (see `decode`): fields stored at
+    their usual dtype are read-only views of the shards.
+
+    Parameters
+    ----------
+    path : str
+        Directory of the store.
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, META_NAME)) as fdesc:
+            self.fields = [(name, dtype, tuple(shape)) for name, dtype, shape
+                           in json.load(fdesc)['fields']]
+        self.index = _read_index(path)
+        self._shards = dict()
+
+    def _shard(self, shard):
+        if shard not in self._shards:
+            arrays = []
+            for name, dtype, shape in self.fields:
+                fname = _shard_file(self.path, shard, name)
+                row_size = np.dtype(dtype).itemsize * int(np.prod(shape))
+                rows = os.path.getsize(fname) // row_size
+                if rows:
+                    arrays.append(np.memmap(fname, dtype=dtype, mode='r',
+                                            shape=(rows,) + shape))
+                else:
+                    arrays.append(np.zeros((0,) + shape, dtype=dtype))
+            self._shards[shard] = arrays
+        return self._shards[shard]
+
+    def __getitem__(self, key):
+        shard, offset, length = self.index[key]
+        return decode({name: array[offset:offset + length]
+                       for (name, _, _), array in zip(self.fields,
+                                                      self._shard(shard))},
+                      length)
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def keys(self):
+        return self.index.keys()
@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+# coding: utf8
+'''A tensorflow-2 native implementation of VGGish.
+
+Unlike `slim.define_vggish_slim`, this does not need a `tf.Graph` or
+`tf.compat.v1.Session` to be managed by the caller: the model is a
+`tf.Module` whose forward pass is a `tf.function` with a fixed input
+signature, optionally compiled with XLA.
+
+The weights are read directly from the original `vggish_model.ckpt`.
+'''
+
+import tensorflow as tf
+import warnings
+
+from . import params
+from .model import BaseExtractor
+
+
+def load_checkpoint_weights(checkpoint=params.MODEL_PARAMS):
+    '''Read the VGGish weights from a checkpoint.
+
+    Parameters
+    ----------
+    checkpoint : str
+        Path to a VGGish model checkpoint.
+
+    Returns
+    -------
+    weights : dict of np.ndarray
+        The weights and biases of each layer, keyed by variable name,
+        e.g., `vggish/conv1/weights`.
+    '''
+    if checkpoint == params.MODEL_PARAMS:
+        params.verify_model()
+
+    reader = tf.train.load_checkpoint(checkpoint)
+
+    weights = dict()
+    for kind, scope in params.LAYERS:
+        if kind == 'pool':
+            continue
+        for var in ['weights', 'biases']:
+            name = 'vggish/{}/{}'.format(scope, var)
+            weights[name] = reader.get_tensor(name)
+
+    return weights
+
+
+def set_threads(intra_op_threads=None, inter_op_threads=None):
+    '''Set the number of threads used by tensorflow in this process.
+
+    If tensorflow has already been initialized, this has no effect, and a
+    warning is raised.
+    '''
+    threading = tf.config.threading
+    try:
+        if intra_op_threads is not None:
+            threading.set_intra_op_parallelism_threads(intra_op_threads)
+        if inter_op_threads is not None:
+            threading.set_inter_op_parallelism_threads(inter_op_threads)
+    except RuntimeError as exc:
+        warnings.warn('Unable to set tensorflow threads: {}'.format(exc))
+
+
+class VGGish(tf.Module):
+    '''The VGGish model, up to and including the embedding layer.
+
+    Parameters
+    ----------
+    weights : dict of np.ndarray
+        Model weights, as returned by `load_checkpoint_weights`, and
+        optionally factorized by `lowrank.factorize_weights`.
+
+    jit_compile : bool
+        If True, compile the forward pass with XLA.
+
+    Examples
+    --------
+    >>> model = VGGish(load_checkpoint_weights())
+    >>> embeddings = model(examples).numpy()
+    '''
+
+    def __init__(self, weights, jit_compile=False, name='vggish'):
+        super(VGGish, self).__init__(name=name)
+
+        self._layers = []
+        with self.name_scope:
+            for kind, scope in params.LAYERS:
+                if kind == 'pool':
+                    names = []
+                elif 'vggish/{}/weights_u'.format(scope) in weights:
+                    # A low-rank factorized layer; see `lowrank`
+                    names = ['weights_u', 'weights_v', 'biases']
+                else:
+                    names = ['weights', 'biases']
+
+                variables = [
+                    tf.Variable(weights['vggish/{}/{}'.format(scope, var)],
+                                trainable=False,
+                                name='{}/{}'.format(scope, var))
+                    for var in names]
+                self._layers.append((kind, variables))
+
+        self.embed = tf.function(
+            self._embed, jit_compile=jit_compile,
+            input_signature=[tf.TensorSpec(
+                shape=(None, params.NUM_FRAMES, params.NUM_BANDS),
+                dtype=tf.float32, name='input_features')])
+
+    def __call__(self, examples):
+        return self.embed(examples)
+
+    def _embed(self, examples):
+        # Same layer definitions as `slim.define_vggish_slim`.
+        net = tf.reshape(examples,
+                         [-1, params.NUM_FRAMES, params.NUM_BANDS, 1])
+
+        for kind, variables in self._layers:
+            if kind == 'conv':
+                weights, biases = variables
+                net = tf.nn.conv2d(net, weights, strides=1, padding='SAME')
+                net = tf.nn.relu(tf.nn.bias_add(net, biases))
+            elif kind == 'pool':
+                net = tf.nn.max_pool2d(net, ksize=2, strides=2,
+                                       padding='SAME')
+            else:
+                weights, biases = variables[:-1], variables[-1]
+                # Flatten before entering fully-connected layers
+                if net.shape.rank > 2:
+                    net = tf.reshape(net, [tf.shape(net)[0], -1])
+                for layer_w in weights:
+                    net = tf.matmul(net, layer_w)
+                net = tf.nn.relu(tf.nn.bias_add(net, biases))
+
+        return tf.identity(net, name='embedding')
+
+
+class FunctionExtractor(BaseExtractor):
+    '''A VGGish feature extractor built on `VGGish`.
+
+    This is a drop-in alternative to `model.VGGishExtractor`, which does not
+    require a graph or session.
+
+    Parameters
+    ----------
+    checkpoint : str
+        Path to a VGGish model checkpoint.
+
+    jit_compile : bool
+        If True, compile the model with XLA. Note that this compiles once
+        for each distinct batch size, so is best combined with a fixed
+        `batch_size` in `extract_many`.
+
+    rank : int > 0 or None
+        If given, the `fc1` layers are replaced by a low-rank factorization
+        of this rank. See `lowrank.factorize_weights`.
+
+    postprocess : bool
+        If True, `extract` also returns the postprocessed features.
+
+    intra_op_threads, inter_op_threads : int > 0 or None
+        Number of threads used within and across tensorflow ops.
+        Note that these apply to the whole process, and can only be set
+        before tensorflow has executed anything.
+    '''
+
+    def __init__(self, checkpoint=params.MODEL_PARAMS, jit_compile=False,
+                 rank=None, postprocess=False, intra_op_threads=None,
+                 inter_op_threads=None):
+        set_threads(intra_op_threads, inter_op_threads)
+
+        self.postprocess = postprocess
+        weights = load_checkpoint_weights(checkpoint)
+        if rank is not None:
+            from .lowrank import factorize_weights
+            weights = factorize_weights(weights, rank)
+
+        self.model = VGGish(weights, jit_compile=jit_compile)
+
+    def _embed(self, examples):
+        examples = tf.convert_to_tensor(examples, dtype=tf.float32)
+        return self.model(examples).numpy()
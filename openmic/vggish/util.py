@@ -3,10 +3,7 @@
 '''Convenience utilities for interfacing with the VGGish implementation.
 '''
 
-from joblib import Parallel, delayed
 import numpy as np
-import pandas as pd
-import tensorflow as tf
 
 from .params import AUDIO_EMBEDDING_FEATURE_NAME, LABELS
 from .params import START_TIME, TIME, VIDEO_ID
@@ -28,6 +25,9 @@ def bytestring_to_record(example):
     meta : pd.DataFrame, len=n
         Corresponding labels and metadata for these features.
     """
+    import pandas as pd
+    import tensorflow as tf
+
     rec = tf.train.SequenceExample.FromString(example)
     start_time = rec.context.feature[START_TIME].float_list.value[0]
     vid_id = rec.context.feature[VIDEO_ID].bytes_list.value[0].decode('utf-8')
@@ -68,6 +68,10 @@ def load_tfrecord(fname, n_jobs=1, verbose=0):
     meta : pd.DataFrame
         Table of metadata aligned to the features, indexed by `filebase.idx`
     """
+    from joblib import Parallel, delayed
+    import pandas as pd
+    import tensorflow as tf
+
     dfx = delayed(bytestring_to_record)
     pool = Parallel(n_jobs=n_jobs, verbose=verbose)
     results = pool(dfx(x) for x in tf.compat.v1.python_io.tf_record_iterator(fname))
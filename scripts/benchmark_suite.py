@@ -0,0 +1,408 @@
+#!/usr/bin/env python
+# coding: utf8
+'''Benchmark the hot paths of the openmic package on synthetic data.
+
+Each benchmark generates its own inputs, in a temporary directory, with a
+size proportional to `--scale`. Timings are written as JSON, which can be
+compared against a baseline from an earlier run, e.g., before and after
+upgrading a dependency.
+
+See `benchmark_vggish.py` for a comparison of the model implementations.
+
+Example
+-------
+$ cd {repo_root}
+$ ./scripts/benchmark_suite.py run --output baseline.json
+$ pip install --upgrade numpy
+$ ./scripts/benchmark_suite.py run --output current.json
+$ ./scripts/benchmark_suite.py compare baseline.json current.json
+
+Selected benchmarks can be run at a larger scale:
+
+$ ./scripts/benchmark_suite.py run --scale 10 --repeats 3 \
+    --benchmarks log_mel_spectrogram postprocess --output large.json
+
+`compare` exits with a non-zero status if any benchmark is slower than the
+baseline by more than `--tolerance` (20% by default).
+'''
+
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import openmic.vggish
+from openmic.vggish import inputs, mel_features, params
+
+
+def bench_log_mel_spectrogram(scale, workdir, rng):
+    '''Log mel spectrogram of 10 * scale seconds of audio.'''
+    data = rng.uniform(-1, 1, size=10 * scale * params.SAMPLE_RATE)
+
+    def run():
+        mel_features.log_mel_spectrogram(
+            data, audio_sample_rate=params.SAMPLE_RATE,
+            log_offset=params.LOG_OFFSET,
+            window_length_secs=params.STFT_WINDOW_LENGTH_SECONDS,
+            hop_length_secs=params.STFT_HOP_LENGTH_SECONDS,
+            num_mel_bins=params.NUM_MEL_BINS,
+            lower_edge_hertz=params.MEL_MIN_HZ,
+            upper_edge_hertz=params.MEL_MAX_HZ)
+    return run, len(data)
+
+
+def bench_waveform_to_examples(scale, workdir, rng):
+    '''Examples from 10 * scale seconds of stereo, 44.1kHz audio, including
+    resampling.'''
+    sample_rate = 44100
+    data = rng.uniform(-1, 1, size=(10 * scale * sample_rate, 2))
+
+    def run():
+        inputs.waveform_to_examples(data, sample_rate)
+    return run, len(data)
+
+
+def _examples(scale, rng):
+    return rng.randn(10 * scale, params.NUM_FRAMES,
+                     params.NUM_BANDS).astype(np.float32)
+
+
+def bench_transform_cold(scale, workdir, rng):
+    '''`model.transform` of 10 * scale examples in a new session, including
+    building the graph and restoring the checkpoint.'''
+    import tensorflow as tf
+    examples = _examples(scale, rng)
+
+    def run():
+        with tf.Graph().as_default(), tf.compat.v1.Session() as sess:
+            openmic.vggish.transform(examples, sess)
+    return run, len(examples)
+
+
+def bench_transform_warm(scale, workdir, rng):
+    '''`model.transform` of 10 * scale examples in a session which already
+    holds the model.'''
+    import tensorflow as tf
+    examples = _examples(scale, rng)
+
+    graph = tf.Graph()
+    with graph.as_default():
+        sess = tf.compat.v1.Session()
+        openmic.vggish.transform(examples[:1], sess)
+
+    def run():
+        with graph.as_default():
+            openmic.vggish.transform(examples, sess)
+    return run, len(examples), sess.close
+
+
+def bench_postprocess(scale, workdir, rng):
+    '''PCA and quantization of 1000 * scale embeddings.'''
+    from openmic.vggish.postprocessor import Postprocessor
+
+    params.verify_model([params.PCA_PARAMS])
+    pproc = Postprocessor(params.PCA_PARAMS)
+    embeddings = rng.randn(1000 * scale,
+                           params.EMBEDDING_SIZE).astype(np.float32)
+
+    def run():
+        pproc.postprocess(embeddings)
+    return run, len(embeddings)
+
+
+def bench_load_tfrecord(scale, workdir, rng):
+    '''`util.load_tfrecord` of 100 * scale records of 10 frames each.'''
+    import tensorflow as tf
+    from openmic.vggish.util import load_tfrecord
+
+    fname = os.path.join(workdir, 'features.tfrecord')
+    with tf.io.TFRecordWriter(fname) as writer:
+        for idx in range(100 * scale):
+            example = tf.train.SequenceExample()
+            context = example.context.feature
+            context[params.VIDEO_ID].bytes_list.value.append(
+                '{:011d}'.format(idx).encode('utf-8'))
+            context[params.START_TIME].float_list.value.append(30.0)
+            context[params.LABELS].int64_list.value.extend([0, idx % 527])
+            frames = example.feature_lists.feature_list[
+                params.AUDIO_EMBEDDING_FEATURE_NAME]
+            for frame in rng.randint(0, 256, size=(10, 128)).astype(np.uint8):
+                frames.feature.add().bytes_list.value.append(frame.tobytes())
+            writer.write(example.SerializeToString())
+
+    def run():
+        load_tfrecord(fname)
+    return run, 100 * scale
+
+
+def _sample_keys(num_keys):
+    return ['{:06d}_{}'.format(idx, 3840 * (idx % 4))
+            for idx in range(num_keys)]
+
+
+def bench_helper_numpy(scale, workdir, rng):
+    '''`helper_numpy.main` over 100 * scale clips, with 5 labels each.'''
+    import pandas as pd
+    import helper_numpy
+
+    sample_keys = _sample_keys(100 * scale)
+    instruments = ['accordion', 'banjo', 'cello', 'drums', 'flute',
+                   'guitar', 'piano', 'voice']
+    vggish_path = os.path.join(workdir, 'vggish')
+    rows = []
+    for sample_key in sample_keys:
+        path = os.path.join(vggish_path, sample_key[:3])
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, sample_key + '.json'), 'w') as fdesc:
+            json.dump(dict(features=rng.randint(0, 256,
+                                                size=(10, 128)).tolist()),
+                      fdesc)
+        for instrument in rng.choice(instruments, 5, replace=False):
+            rows.append(dict(sample_key=sample_key, instrument=instrument,
+                             relevance=rng.uniform()))
+
+    csv_file = os.path.join(workdir, 'labels.csv')
+    pd.DataFrame.from_records(rows).to_csv(csv_file, index=False)
+    outfile = os.path.join(workdir, 'openmic.npz')
+
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            helper_numpy.main(csv_file, vggish_path, outfile)
+    return run, len(sample_keys)
+
+
+def bench_make_partitions(scale, workdir, rng):
+    '''`openmic_split.make_partitions` of 200 * scale clips by 50 * scale
+    artists into one split.'''
+    import pandas as pd
+    import openmic_split
+
+    sample_keys = _sample_keys(200 * scale)
+    artists = rng.randint(0, 50 * scale, size=len(sample_keys))
+    metadata = os.path.join(workdir, 'metadata.csv')
+    pd.DataFrame(dict(sample_key=sample_keys, artist_id=artists)).to_csv(
+        metadata, index=False)
+
+    rows = [dict(sample_key=sample_key, instrument=instrument,
+                 relevance=rng.uniform(-1, 1))
+            for sample_key in sample_keys
+            for instrument in ['cello', 'drums', 'guitar']]
+    labels = os.path.join(workdir, 'labels.csv')
+    pd.DataFrame.from_records(rows).to_csv(labels, index=False)
+
+    def run():
+        # Splits are written to the working directory
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            with contextlib.redirect_stderr(io.StringIO()):
+                openmic_split.make_partitions(metadata, labels, seed=20180903,
+                                              num_splits=1, ratio=0.75,
+                                              prob_ratio=0.5)
+        finally:
+            os.chdir(cwd)
+    return run, len(sample_keys)
+
+
+def bench_verify_dataset_hash(scale, workdir, rng):
+    '''`verify_dataset.hash_collection` of 20 * scale files of 1MB.'''
+    import verify_dataset
+
+    filepaths = []
+    for idx in range(20 * scale):
+        fname = os.path.join(workdir, '{:06d}.ogg'.format(idx))
+        with open(fname, 'wb') as fdesc:
+            fdesc.write(rng.bytes(2 ** 20))
+        filepaths.append(fname)
+
+    def run():
+        verify_dataset.hash_collection(filepaths, n_jobs=1, verbose=0)
+    return run, len(filepaths) * 2 ** 20
+
+
+# Name -> function(scale, workdir, rng) which prepares the inputs, and
+# returns the function to time and the size of its input, optionally
+# followed by a function which releases its resources, e.g., a session.
+BENCHMARKS = {
+    'log_mel_spectrogram': bench_log_mel_spectrogram,
+    'waveform_to_examples': bench_waveform_to_examples,
+    'transform_cold': bench_transform_cold,
+    'transform_warm': bench_transform_warm,
+    'postprocess': bench_postprocess,
+    'load_tfrecord': bench_load_tfrecord,
+    'helper_numpy': bench_helper_numpy,
+    'make_partitions': bench_make_partitions,
+    'verify_dataset_hash': bench_verify_dataset_hash,
+}
+
+
+def benchmark(name, scale=1, repeats=5, seed=20180903):
+    '''Run one benchmark.
+
+    One untimed run comes first, so that lazy imports, compilation and
+    caches do not count towards the first repeat.
+
+    Returns
+    -------
+    result : dict
+        The `size` of the input, the `times` of each repeat in seconds,
+        their `min` and `median`, and the `throughput` in units of input
+        per second, at the median.
+    '''
+    rng = np.random.RandomState(seed)
+    workdir = tempfile.mkdtemp(prefix='openmic-benchmark-')
+    close = []
+    try:
+        run, size, *close = BENCHMARKS[name](scale, workdir, rng)
+        run()
+        times = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            run()
+            times.append(time.perf_counter() - start)
+    finally:
+        # Release the resources of the benchmark before the next one
+        for func in close:
+            func()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    median = float(np.median(times))
+    return dict(size=size, times=times, min=min(times), median=median,
+                throughput=size / median)
+
+
+def run(names=None, scale=1, repeats=5, output=None):
+    '''Run benchmarks, and optionally save the results to a JSON file.
+
+    Parameters
+    ----------
+    names : list of str or None
+        Benchmarks to run; by default, all of `BENCHMARKS`.
+
+    scale : int > 0
+        Size of the synthetic inputs, relative to the defaults.
+
+    repeats : int > 0
+        Number of timed runs of each benchmark.
+
+    output : str or None
+        Path to save the results to.
+
+    Returns
+    -------
+    report : dict
+        The settings and environment of the run, and the `results` of each
+        benchmark; see `benchmark`.
+    '''
+    import tensorflow as tf
+
+    report = dict(date=datetime.datetime.now().isoformat(),
+                  scale=scale, repeats=repeats,
+                  python=platform.python_version(),
+                  platform=platform.platform(),
+                  versions=dict(numpy=np.__version__,
+                                tensorflow=tf.__version__),
+                  results=dict())
+
+    for name in names or BENCHMARKS:
+        result = benchmark(name, scale=scale, repeats=repeats)
+        report['results'][name] = result
+        print('{:>24s}: median={median:.4f}s  min={min:.4f}s'.format(
+            name, **result))
+
+    if output is not None:
+        with open(output, 'w') as fdesc:
+            json.dump(report, fdesc, indent=2)
+    return report
+
+
+def compare(baseline, current, tolerance=0.2):
+    '''Compare the median times of two runs.
+
+    Parameters
+    ----------
+    baseline, current : str or dict
+        Reports returned by `run`, or paths to their JSON files.
+
+    tolerance : float >= 0
+        Relative slowdown beyond which a benchmark counts as a regression.
+
+    Returns
+    -------
+    regressions : list of str
+        The benchmarks which are slower in `current`.
+    '''
+    reports = []
+    for report in (baseline, current):
+        if not isinstance(report, dict):
+            with open(report) as fdesc:
+                report = json.load(fdesc)
+        reports.append(report)
+    baseline, current = reports
+
+    if baseline['scale'] != current['scale']:
+        raise ValueError('Cannot compare runs at scales {} and {}'.format(
+            baseline['scale'], current['scale']))
+
+    regressions = []
+    for name, result in current['results'].items():
+        if name not in baseline['results']:
+            continue
+        ratio = result['median'] / baseline['results'][name]['median']
+        status = 'ok'
+        if ratio > 1 + tolerance:
+            status = 'REGRESSION'
+            regressions.append(name)
+        print('{:>24s}: {:.4f}s -> {:.4f}s  ({:+.1%})  {}'.format(
+            name, baseline['results'][name]['median'], result['median'],
+            ratio - 1, status))
+    return regressions
+
+
+def process_args(args):
+
+    parser = argparse.ArgumentParser(description='openmic benchmark suite')
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    parser_run = commands.add_parser('run', help='Run benchmarks.')
+    parser_run.add_argument('--benchmarks', nargs='+', default=None,
+                            choices=sorted(BENCHMARKS),
+                            help='Benchmarks to run; by default, all.')
+    parser_run.add_argument('--scale', default=1, type=int,
+                            help='Size of the synthetic inputs.')
+    parser_run.add_argument('--repeats', default=5, type=int,
+                            help='Number of timed runs per benchmark.')
+    parser_run.add_argument('--output', default=None, type=str,
+                            help='Path to save the results to, as JSON.')
+
+    parser_compare = commands.add_parser(
+        'compare', help='Compare results against a baseline.')
+    parser_compare.add_argument('baseline', type=str,
+                                help='Results of the baseline run.')
+    parser_compare.add_argument('current', type=str,
+                                help='Results of the run to check.')
+    parser_compare.add_argument('--tolerance', default=0.2, type=float,
+                                help='Relative slowdown to tolerate.')
+    return parser.parse_args(args)
+
+
+if __name__ == '__main__':
+    args = process_args(sys.argv[1:])
+
+    if args.command == 'run':
+        run(args.benchmarks, scale=args.scale, repeats=args.repeats,
+            output=args.output)
+    else:
+        regressions = compare(args.baseline, args.current,
+                              tolerance=args.tolerance)
+        sys.exit(1 if regressions else 0)
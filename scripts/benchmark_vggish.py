@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# coding: utf8
+'''Benchmark the VGGish model implementations against each other.
+
+Reports the start-up time of each implementation, and the throughput (in
+patches per second) of the forward pass on random input.
+
+The `numpy` and `quantized` backends require converted weights; see
+`export_vggish.py` and `quantize_vggish.py`, respectively.
+
+Example
+-------
+$ cd {repo_root}
+$ ./scripts/benchmark_vggish.py --num-patches 640 --batch-size 64
+
+To find the best threads-per-process for a machine, compare e.g.
+`--intra-op-threads 1`, `2`, `4`, ... : the number of processes to run is
+then the number of cores divided by the number of threads.
+'''
+
+import argparse
+import sys
+import time
+
+import numpy as np
+
+import openmic.vggish
+
+
+BACKENDS = {
+    'session': dict(backend='session'),
+    'function': dict(backend='function'),
+    'function-xla': dict(backend='function', jit_compile=True),
+    'numpy': dict(backend='numpy'),
+    'quantized': dict(backend='quantized'),
+}
+
+
+def benchmark(backend, examples, batch_size, repeats, **kwargs):
+    '''Time the construction and forward pass of one backend.
+
+    Returns
+    -------
+    result : dict
+        `startup` time and `warmup` time (for the first pass) in seconds,
+        and steady-state `throughput` in patches per second.
+    '''
+    start = time.perf_counter()
+    extractor = openmic.vggish.get_extractor(**dict(BACKENDS[backend],
+                                                    **kwargs))
+    startup = time.perf_counter() - start
+
+    start = time.perf_counter()
+    extractor.extract_many([examples], batch_size)
+    warmup = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        extractor.extract_many([examples], batch_size)
+    elapsed = time.perf_counter() - start
+
+    extractor.close()
+    return dict(startup=startup, warmup=warmup,
+                throughput=repeats * len(examples) / elapsed)
+
+
+def main(backends, num_patches, batch_size, repeats, seed=20180903,
+         **kwargs):
+    rng = np.random.RandomState(seed)
+    examples = rng.randn(num_patches, openmic.vggish.NUM_FRAMES,
+                         openmic.vggish.NUM_BANDS).astype(np.float32)
+
+    results = dict()
+    for backend in backends:
+        results[backend] = benchmark(backend, examples, batch_size, repeats,
+                                     **kwargs)
+        print('{:>16s}: startup={startup:.3f}s  warmup={warmup:.3f}s  '
+              'throughput={throughput:.1f} patches/s'
+              .format(backend, **results[backend]))
+
+    return results
+
+
+def process_args(args):
+
+    parser = argparse.ArgumentParser(description='VGGish benchmarks')
+
+    parser.add_argument('--backends', nargs='+',
+                        default=['session', 'function'],
+                        choices=sorted(BACKENDS),
+                        help='Model implementations to benchmark.')
+    parser.add_argument('--num-patches', dest='num_patches', default=256,
+                        type=int, help='Number of input patches per pass.')
+    parser.add_argument('--batch-size', dest='batch_size', default=64,
+                        type=int, help='Number of patches per batch.')
+    parser.add_argument('--repeats', default=5, type=int,
+                        help='Number of timed passes per backend.')
+    parser.add_argument('--intra-op-threads', dest='intra_op_threads',
+                        default=None, type=int,
+                        help='Number of threads used within each model op.')
+    return parser.parse_args(args)
+
+
+if __name__ == '__main__':
+    args = process_args(sys.argv[1:])
+
+    options = dict()
+    if args.intra_op_threads is not None:
+        options['intra_op_threads'] = args.intra_op_threads
+
+    main(args.backends, args.num_patches, args.batch_size, args.repeats,
+         **options)
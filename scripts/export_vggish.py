@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# coding: utf8
+'''Export the VGGish model in a format which is fast to load.
+
+Restoring the VGGish checkpoint dominates the start-up time of short-lived
+jobs. This only needs to be run once; the output can then be passed to
+`openmic.vggish.VGGishExtractor(saved_model=...)`.
+
+The weights can also be converted for the tensorflow-free NumPy backend,
+which loads them from `openmic.vggish.NUMPY_MODEL_PARAMS` by default.
+
+Example
+-------
+$ cd {repo_root}
+$ ./scripts/export_vggish.py --postprocess ./vggish_model
+OR
+$ ./scripts/export_vggish.py --format numpy openmic/vggish/_model/vggish_model.npz
+'''
+
+import argparse
+import os
+import sys
+
+import openmic.vggish
+import openmic.vggish.numpy_model
+
+
+def main(output_path, postprocess=False, fmt='saved_model'):
+    if fmt == 'numpy':
+        openmic.vggish.numpy_model.convert_checkpoint(output_path)
+    else:
+        pca_params = openmic.vggish.PCA_PARAMS if postprocess else None
+        openmic.vggish.export_saved_model(output_path, pca_params=pca_params)
+    return os.path.exists(output_path)
+
+
+def process_args(args):
+
+    parser = argparse.ArgumentParser(description='VGGish graph exporter')
+
+    parser.add_argument('--format', dest='fmt', default='saved_model',
+                        choices=['saved_model', 'numpy'],
+                        help='Output format.')
+    parser.add_argument('--postprocess', action='store_true',
+                        help='Include PCA and quantization in the graph '
+                             '(saved_model only).')
+
+    parser.add_argument(dest='output_path', type=str, action='store',
+                        help='Path to write the exported model')
+    return parser.parse_args(args)
+
+
+if __name__ == '__main__':
+    args = process_args(sys.argv[1:])
+
+    success = main(args.output_path, postprocess=args.postprocess,
+                   fmt=args.fmt)
+    sys.exit(0 if success else 1)
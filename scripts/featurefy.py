@@ -13,44 +13,726 @@ OR
 $ ls /path/to/audio/*wav > file_list.txt
 $ ./scripts/featurefy.py --input_list file_list.txt ./output_dir
 
+Throughput can be improved by pooling patches from many files into larger
+batches for the model:
+
+$ ./scripts/featurefy.py --input_list file_list.txt --batch-size 256 ./output_dir
+
+Large collections can be sharded across several worker processes, each
+with its own copy of the model. Limit the threads used by each, e.g., on a
+32-core machine:
+
+$ ./scripts/featurefy.py --input_list file_list.txt --workers 8 \
+    --intra-op-threads 4 --inter-op-threads 1 --retries 2 ./output_dir
+
+Decoding and writing can also run alongside the model, in separate
+processes and threads respectively:
+
+$ ./scripts/featurefy.py --input_list file_list.txt --batch-size 256 \
+    --decode-workers 6 --write-workers 2 ./output_dir
+
 Each jams file must contain at least one annotation in the `tag_openmic25`
 namespace.
 '''
 
 import argparse
-import numpy as np
+import collections
+import contextlib
+import json
+import logging
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import as_completed
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
 import os
 import pandas as pd
 import sys
-import tensorflow as tf
 from tqdm import tqdm
+import warnings
 
-from openmic.util import filebase
+from openmic.util import filebase, open_temporary
 import openmic.vggish
+from openmic.vggish.cache import FeatureCache
+from openmic.vggish import profiling, store
 
+MANIFEST_NAME = 'featurefy-manifest.jsonl'
 
-def main(files_in, outpath):
+LOGGER = logging.getLogger(__name__)
 
-    success = []
-    with tf.Graph().as_default(), tf.compat.v1.Session() as sess:
 
-        for file_in in tqdm(files_in):
-            file_out = os.path.join(
-                outpath,
-                os.path.extsep.join([filebase(file_in), 'npz']))
+def output_file(file_in, outpath):
+    return os.path.join(outpath,
+                        os.path.extsep.join([filebase(file_in), 'npz']))
+
+
+def decode(file_in):
+    '''Convert an audio file to examples.'''
+    with profiling.stage('decode', item=file_in):
+        return openmic.vggish.soundfile_to_examples(file_in)
 
-            try:
-                examples = openmic.vggish.soundfile_to_examples(file_in)
 
-                time_points, features = openmic.vggish.transform(examples, sess)
-                features_z = openmic.vggish.postprocess(features)
+def decode_worker(file_in, profile=False):
+    '''Convert an audio file to examples, in a worker process.
 
-                np.savez(file_out, time=time_points,
-                         features=features, features_z=features_z)
+    If `profile`, the worker's profiling records are returned along with
+    the examples, to be added to those of the parent process.
+    '''
+    if profile and profiling.get_profiler() is None:
+        profiling.enable()
+    examples = decode(file_in)
+
+    profiler = profiling.get_profiler()
+    return examples, (profiler.drain() if profiler is not None else [])
+
+
+def load_examples(files_in, pool=None, max_pending=None):
+    '''Generate (index, examples) pairs for each input file.
+
+    Files which cannot be converted to examples produce `None`.
+
+    If a process `pool` is given, up to `max_pending` files are decoded in
+    parallel, ahead of the consumer. The results are still generated in
+    order.
+    '''
+    if pool is None:
+        for idx, file_in in enumerate(files_in):
+            try:
+                yield idx, decode(file_in)
             except ValueError as derp:
+                yield idx, None
+        return
+
+    profiler = profiling.get_profiler()
+
+    def result(idx, future):
+        try:
+            examples, records = future.result()
+        except ValueError as derp:
+            return idx, None
+        if profiler is not None:
+            profiler.extend(records)
+        return idx, examples
+
+    pending = collections.deque()
+    for idx, file_in in enumerate(files_in):
+        pending.append((idx, pool.submit(decode_worker, file_in,
+                                         profiler is not None)))
+        if len(pending) >= (max_pending or 1):
+            yield result(*pending.popleft())
+
+    while pending:
+        yield result(*pending.popleft())
+
+
+def save_features(file_out, time_points, features, features_z, **kwargs):
+    '''Save features to an NPZ file, and return whether it exists.
+
+    The data is written to a temporary file which is then renamed, so an
+    interrupted run never leaves a partial file at `file_out`. Keyword
+    arguments set the encoding; see `openmic.vggish.store.save_features`.
+    '''
+    fobj, tmpname = open_temporary(file_out)
+    try:
+        with fobj:
+            store.save_features(fobj, (time_points, features, features_z),
+                                **kwargs)
+        os.replace(tmpname, file_out)
+    except BaseException:
+        os.remove(tmpname)
+        raise
+    return os.path.exists(file_out)
+
+
+class Manifest(object):
+    '''A log of the files processed by featurefy runs.
+
+    Each line of the manifest is a JSON object, recording the path, size and
+    modification time of an input file, the hash of the settings used (see
+    `openmic.vggish.params_hash`), the output, and whether it was produced.
+    Lines are appended as files complete, so the manifest survives a crash;
+    a partly written last line is ignored.
+
+    Parameters
+    ----------
+    path : str
+        Path to the manifest file, which is created if needed.
+
+    params : str
+        Hash of the settings of the current run.
+    '''
+
+    def __init__(self, path, params):
+        self.path = path
+        self.params = params
+        self.entries = dict()
+
+        if os.path.exists(path):
+            with open(path) as fdesc:
+                for line in fdesc:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    self.entries[entry['input']] = entry
+
+        self._fdesc = open(path, 'a')
+
+    def completed(self, file_in, file_out, exists=os.path.exists):
+        '''Whether `file_in`, as it is now, was successfully processed into
+        `file_out` with the current settings, and `exists(file_out)`.'''
+        entry = self.entries.get(os.path.abspath(file_in))
+        if entry is None or entry['status'] != 'done':
+            return False
+
+        try:
+            stat = os.stat(file_in)
+        except OSError:
+            return False
+
+        return (entry['size'] == stat.st_size and
+                entry['mtime'] == stat.st_mtime_ns and
+                entry['params'] == self.params and
+                entry['output'] == os.path.abspath(file_out) and
+                exists(file_out))
+
+    def record(self, file_in, file_out, success):
+        '''Append the outcome for an input file.'''
+        try:
+            stat = os.stat(file_in)
+            size, mtime = stat.st_size, stat.st_mtime_ns
+        except OSError:
+            size, mtime = None, None
+
+        entry = dict(input=os.path.abspath(file_in),
+                     output=os.path.abspath(file_out),
+                     size=size, mtime=mtime, params=self.params,
+                     status='done' if success else 'failed')
+        self.entries[entry['input']] = entry
+        self._fdesc.write(json.dumps(entry) + '\n')
+        self._fdesc.flush()
+
+    def close(self):
+        self._fdesc.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# The extractor of each worker process; see `process_file`.
+__EXTRACTOR__ = None
+
+# The queue on which workers announce the files they start; see `init_worker`.
+__STARTED__ = None
+
+
+def init_worker(backend, options, profile=False, started=None):
+    '''Load the model in a worker process, and optionally start
+    profiling. The index of each file is put on the `started` queue, if
+    given, as its processing starts.'''
+    global __EXTRACTOR__, __STARTED__
+    __STARTED__ = started
+    if profile:
+        profiling.enable()
+    __EXTRACTOR__ = openmic.vggish.get_extractor(backend, postprocess=True,
+                                                 **options)
+
+
+def process_file(idx, file_in, batch_size=None, retries=0):
+    '''Compute the features of one file, in a worker process.
+
+    Errors other than unreadable audio are retried up to `retries` times.
+
+    Returns
+    -------
+    idx : int
+        The index of the file, as given.
+
+    results : tuple of (time_points, features, features_z), or None
+        The features of the file, or None if they could not be computed.
+
+    records : list of dict
+        Profiling records of the file, if profiling; see `init_worker`.
+    '''
+    if __STARTED__ is not None:
+        __STARTED__.put(idx)
+
+    results = None
+    for attempt in range(retries + 1):
+        try:
+            examples = decode(file_in)
+            with profiling.stage('model', item=file_in):
+                results = __EXTRACTOR__.extract(examples,
+                                                max_batch=batch_size)
+            break
+        except ValueError as derp:
+            break
+        except Exception as derp:
+            warnings.warn('Attempt {} of {} failed for {}: {!r}'.format(
+                attempt + 1, retries + 1, file_in, derp))
+
+    profiler = profiling.get_profiler()
+    return idx, results, (profiler.drain() if profiler is not None else [])
+
+
+def file_keys(cache, files_in):
+    '''Compute the cache keys of files, or None for missing files.
+
+    Files are hashed in a pool of threads, since hashing releases the GIL.
+    '''
+    def file_key(file_in):
+        try:
+            return cache.file_key(file_in)
+        except (IOError, OSError):
+            return None
+
+    with ThreadPoolExecutor() as pool:
+        return list(tqdm(pool.map(file_key, files_in), total=len(files_in),
+                         desc='Hashing'))
+
+
+def schedule(files_in):
+    '''Order file indices by decreasing file size, as a proxy for duration,
+    so that the longest files do not hold up the end of a run.'''
+    def size(idx):
+        try:
+            return os.path.getsize(files_in[idx])
+        except OSError:
+            return 0
+
+    return sorted(range(len(files_in)), key=size, reverse=True)
+
+
+@contextlib.contextmanager
+def profiled(path):
+    '''Profile the enclosed block, if `path` is given, then print a summary
+    and save the report to `path`.'''
+    if path is None:
+        yield
+        return
+
+    profiler = profiling.enable()
+    try:
+        yield
+    finally:
+        profiling.disable()
+        profiler.save(path)
+        print_profile(profiler.summary())
+
+
+def print_profile(summary):
+    '''Print a table of a `Profiler.summary` to stderr.'''
+    print('{:>12s} {:>7s} {:>10s} {:>9s} {:>9s} {:>9s} {:>10s} {:>9s}'.format(
+        'stage', 'count', 'wall (s)', 'p50', 'p90', 'p99', 'cpu (s)',
+        'peak (MB)'), file=sys.stderr)
+    for name, stats in sorted(summary.items(),
+                              key=lambda item: -item[1]['wall']['total']):
+        peak = stats.get('peak', dict(max=float('nan')))['max'] / 2 ** 20
+        print('{:>12s} {:>7d} {:>10.3f} {:>9.4f} {:>9.4f} {:>9.4f} {:>10.3f} '
+              '{:>9.1f}'.format(name, stats['count'], stats['wall']['total'],
+                                stats['wall']['p50'], stats['wall']['p90'],
+                                stats['wall']['p99'], stats['cpu']['total'],
+                                peak),
+              file=sys.stderr)
+
+
+def main_sharded(files_in, save, workers, batch_size=None,
+                 backend='session', options=None, retries=0, callback=None):
+    '''Process files across several worker processes.
+
+    Each worker loads its own model, and takes the largest remaining file
+    whenever it is free. The features are returned to this process, where
+    `save(idx, results)` stores them and returns whether it succeeded. See
+    `main` for the other parameters; `callback(idx, success)` is called as
+    each file completes.
+
+    If a worker dies, e.g., by a segfault or the OOM killer, the pool is
+    restarted. The files which were in flight are then run one at a time,
+    so that a crash only counts against the `retries` of the file which
+    caused it.
+    '''
+    success = [False] * len(files_in)
+
+    profiler = profiling.get_profiler()
+    # Workers are spawned rather than forked: a tensorflow runtime cannot be
+    # shared with a forked child, so each one loads its own model.
+    context = multiprocessing.get_context('spawn')
+    started = context.SimpleQueue()
+    progress = tqdm(total=len(files_in))
+
+    def finish(idx, results=None, records=()):
+        if profiler is not None:
+            profiler.extend(records)
+        if results is not None:
+            success[idx] = save(idx, results)
+        if callback is not None:
+            callback(idx, success[idx])
+        progress.update()
+
+    todo, suspects = schedule(files_in), []
+    done, in_flight = set(), set()
+    crashes = collections.Counter()
+    while todo or suspects:
+        pool = ProcessPoolExecutor(
+            workers, mp_context=context, initializer=init_worker,
+            initargs=(backend, options or dict(), profiler is not None,
+                      started))
+        try:
+            while suspects:
+                idx = suspects[0]
+                finish(*pool.submit(process_file, idx, files_in[idx],
+                                    batch_size, retries).result())
+                suspects.pop(0)
+
+            futures = [pool.submit(process_file, idx, files_in[idx],
+                                   batch_size, retries)
+                       for idx in todo]
+            for future in as_completed(futures):
+                result = future.result()
+                done.add(result[0])
+                finish(*result)
+                # Keep the queue from filling up
+                while not started.empty():
+                    in_flight.add(started.get())
+            todo = []
+        except BrokenProcessPool:
+            if suspects:
+                idx = suspects[0]
+                crashes[idx] += 1
+                warnings.warn('Attempt {} of {} crashed a worker for {}'
+                              .format(crashes[idx], retries + 1,
+                                      files_in[idx]))
+                if crashes[idx] > retries:
+                    finish(suspects.pop(0))
+            else:
+                while not started.empty():
+                    in_flight.add(started.get())
+                todo = [idx for idx in todo if idx not in done]
+                # If no file had started, e.g., as the model failed to
+                # load, every file is suspect
+                suspects = [idx for idx in todo if idx in in_flight] or todo
+                todo = [idx for idx in todo if idx not in suspects]
+        finally:
+            pool.shutdown(cancel_futures=True)
+
+    progress.close()
+    return success
+
+
+def main(files_in, outpath, batch_size=None, backend='session',
+         intra_op_threads=None, inter_op_threads=None, config=None,
+         decode_workers=0, write_workers=0, max_pending=None,
+         workers=0, retries=0, saved_model=None, resume=False,
+         manifest=None, cache_dir=None, cache_size=None,
+         output_format='npz', shard_size=2 ** 18, precision='float32',
+         derive_time=False, compressed=False, profile=None,
+         trace_dir=None, trace_batches=1):
+    '''Compute and save VGGish features for a collection of audio files.
+
+    The work is split in three stages, connected by bounded queues: audio
+    is decoded and converted to examples (optionally by a pool of
+    processes), the model is run on batches of examples (in this process),
+    and the features are written out (optionally by a pool of threads).
+
+    Parameters
+    ----------
+    files_in : list of str
+        Audio files to process.
+
+    outpath : str
+        Directory to store the output in; see `output_format`.
+
+    batch_size : int > 0 or None
+        If given, patches from consecutive files are stacked together and
+        processed in batches of this many patches. Otherwise, each file is
+        processed on its own.
+
+    backend : str
+        Which implementation of the model to use.
+        See `openmic.vggish.get_extractor` for details.
+
+    intra_op_threads, inter_op_threads : int > 0 or None
+        Number of threads used by the model within and across ops.
+        See `openmic.vggish.session_config` for details.
+
+    config : tf.compat.v1.ConfigProto or None
+        Session configuration, for the `session` backend.
+
+    decode_workers : int >= 0
+        Number of processes used to decode audio files into examples.
+        If 0, files are decoded in this process, between model batches.
+
+    write_workers : int >= 0
+        Number of threads used to write output files.
+        If 0, files are written in this process, between model batches.
+
+    max_pending : int > 0 or None
+        Maximum number of files waiting in each of the decode and write
+        queues. Defaults to four per worker.
+
+    workers : int >= 0
+        If > 0, the files are instead sharded across this many processes,
+        each with its own model, largest files first. Each worker processes
+        one file at a time, and `decode_workers`, `write_workers` and
+        `max_pending` are ignored.
+
+    retries : int >= 0
+        Number of times to retry a file which fails for reasons other than
+        unreadable audio, or crashes its worker, when using `workers`.
+
+    saved_model : str or None
+        Path to a model exported by `openmic.vggish.export_saved_model`,
+        for the `session` backend, which is faster to load than the
+        checkpoint.
+
+    resume : bool
+        If True, skip the files which the manifest records as completed,
+        with the same settings, since they were last modified.
+
+    manifest : str or None
+        Path to the run manifest; see `Manifest`. Defaults to
+        `featurefy-manifest.jsonl` in `outpath`.
+
+    cache_dir : str or None
+        If given, features are looked up in, and added to, a
+        `openmic.vggish.cache.FeatureCache` in this directory, keyed by the
+        content of each file.
+
+    cache_size : int > 0 or None
+        Maximum size of the feature cache, in bytes.
+
+    output_format : str
+        - 'npz': one NPZ file per input file, named after it.
+        - 'store': a single `openmic.vggish.store.FeatureStore`, keyed by
+          the name of each input file.
+
+    shard_size : int > 0
+        Number of examples per shard, for the 'store' format.
+
+    precision : str
+        Precision of the stored features: 'float32', 'float16', or 'uint8'
+        to store only `features_z`. See `openmic.vggish.store.PRECISIONS`.
+
+    derive_time : bool
+        If True, time points are not stored. `openmic.vggish.store`
+        readers derive them from the number of examples.
+
+    compressed : bool
+        If True, NPZ files are zip-compressed.
+
+    profile : str or None
+        If given, the time and memory used by each stage (decoding, the
+        model, saving, ...) are recorded, summarized on stderr, and saved
+        to this path, as CSV if it ends in `.csv`, or else as JSON.
+        See `openmic.vggish.profiling`.
+
+    trace_dir : str or None
+        If given, op-level timelines of the first `trace_batches` model
+        batches (of each worker) are saved in this directory, for the
+        `session` backend. See `openmic.vggish.model.SessionTracer`.
+
+    trace_batches : int >= 0
+        Number of model batches to trace.
+
+    Returns
+    -------
+    success : list of bool
+        Whether an output was produced for each input file, by this run or,
+        when resuming, by a previous one.
+    '''
+    options = openmic.vggish.model.extractor_options(
+        backend, intra_op_threads=intra_op_threads,
+        inter_op_threads=inter_op_threads, config=config,
+        saved_model=saved_model)
+    if trace_dir is not None:
+        if backend != 'session':
+            raise ValueError('Tracing is only supported by the session '
+                             'backend, not {}'.format(backend))
+        options.update(trace_dir=trace_dir, trace_batches=trace_batches)
+    options = {key: value for key, value in options.items()
+               if value is not None}
+
+    success = [False] * len(files_in)
+    encoding = dict(precision=precision, derive_time=derive_time)
+    # Fail before any work is done
+    store.fields(**encoding)
+
+    if output_format == 'store':
+        if compressed:
+            raise ValueError('Feature stores cannot be compressed, since '
+                             'they are memory-mapped')
+        writer = store.FeatureStoreWriter(outpath, shard_size=shard_size,
+                                          **encoding)
+        # In the manifest, each clip is identified by its place in the store
+        files_out = [os.path.join(outpath, filebase(file_in))
+                     for file_in in files_in]
+
+        def exists(file_out):
+            return os.path.basename(file_out) in writer
+
+        def write(idx, results):
+            writer.add(filebase(files_in[idx]), *results)
+            return True
+    elif output_format == 'npz':
+        writer = None
+        files_out = [output_file(file_in, outpath) for file_in in files_in]
+        exists = os.path.exists
+
+        def write(idx, results):
+            return save_features(files_out[idx], *results,
+                                 compressed=compressed, **encoding)
+    else:
+        raise ValueError('Unknown output format: {}'.format(output_format))
+
+    if manifest is None:
+        manifest = os.path.join(outpath, MANIFEST_NAME)
+
+    cache = None
+    if cache_dir is not None:
+        cache = FeatureCache(cache_dir, max_size=cache_size, backend=backend,
+                             saved_model=saved_model)
+
+    params = openmic.vggish.params_hash(backend=backend,
+                                        saved_model=saved_model,
+                                        compressed=compressed, **encoding)
+    with profiled(profile), Manifest(manifest, params) as log:
+        todo = []
+        for idx, (file_in, file_out) in enumerate(zip(files_in, files_out)):
+            if resume and log.completed(file_in, file_out, exists):
+                success[idx] = True
+                continue
+            todo.append(idx)
+
+        keys = [None] * len(todo)
+        if cache is not None:
+            misses = []
+            keys = file_keys(cache, [files_in[idx] for idx in todo])
+            for idx, key in zip(todo, keys):
+                results = None if key is None else cache.get(key)
+                if results is None:
+                    misses.append((idx, key))
+                    continue
+
+                with profiling.stage('save', item=files_in[idx]):
+                    success[idx] = write(idx, results)
+                log.record(files_in[idx], files_out[idx], success[idx])
+            todo = [idx for idx, _ in misses]
+            keys = [key for _, key in misses]
+        files_todo = [files_in[idx] for idx in todo]
+
+        def save(idx, results):
+            with profiling.stage('save', item=files_todo[idx]):
+                if cache is not None and keys[idx] is not None:
+                    cache.put(keys[idx], results)
+                return write(todo[idx], results)
+
+        def callback(idx, result):
+            idx = todo[idx]
+            success[idx] = result
+            log.record(files_in[idx], files_out[idx], result)
+
+        try:
+            if not files_todo:
                 pass
+            elif workers:
+                main_sharded(files_todo, save, workers, batch_size=batch_size,
+                             backend=backend, options=options,
+                             retries=retries, callback=callback)
+            else:
+                main_pipelined(files_todo, save, batch_size=batch_size,
+                               backend=backend, options=options,
+                               decode_workers=decode_workers,
+                               write_workers=write_workers,
+                               max_pending=max_pending, callback=callback)
+        finally:
+            if writer is not None:
+                writer.close()
 
-            success.append(os.path.exists(file_out))
+    if cache is not None:
+        LOGGER.info('Feature cache: %s', json.dumps(cache.stats()))
+
+    return success
+
+
+def main_pipelined(files_in, save, batch_size=None, backend='session',
+                   options=None, decode_workers=0, write_workers=0,
+                   max_pending=None, callback=None):
+    '''Process files in a pipeline of decoding, inference and writing.
+
+    The stages are connected by bounded queues: audio is decoded and
+    converted to examples (optionally by a pool of processes), the model is
+    run on batches of examples (in this process), and the features are
+    written out by `save(idx, results)` (optionally in a pool of threads),
+    which returns whether it succeeded. See `main` for the other
+    parameters; `callback(idx, success)` is called as each file completes.
+    '''
+    success = [False] * len(files_in)
+    pending = []
+    writes = collections.deque()
+
+    decode_pool = None
+    if decode_workers:
+        # Workers must not inherit a running tensorflow runtime
+        decode_pool = ProcessPoolExecutor(
+            decode_workers, mp_context=multiprocessing.get_context('spawn'))
+    write_pool = None
+    if write_workers:
+        write_pool = ThreadPoolExecutor(write_workers)
+
+    def done(idx, result):
+        success[idx] = result
+        if callback is not None:
+            callback(idx, result)
+
+    def finish_write():
+        idx, future = writes.popleft()
+        done(idx, future.result())
+
+    def flush(extractor):
+        # A batch is attributed to all of its files
+        with profiling.stage('model',
+                             item=[files_in[idx] for idx, _ in pending]):
+            results = extractor.extract_many([x for _, x in pending],
+                                             batch_size)
+        for (idx, _), result in zip(pending, results):
+            if write_pool is None:
+                done(idx, save(idx, result))
+                continue
+
+            while len(writes) >= (max_pending or 4 * write_workers):
+                finish_write()
+            writes.append((idx, write_pool.submit(save, idx, result)))
+        del pending[:]
+
+    try:
+        with openmic.vggish.get_extractor(backend, postprocess=True,
+                                          **(options or dict())) as extractor:
+
+            examples_in = load_examples(
+                files_in, decode_pool,
+                max_pending=max_pending or 4 * decode_workers)
+            for idx, examples in tqdm(examples_in, total=len(files_in)):
+                if examples is None:
+                    done(idx, False)
+                    continue
+
+                pending.append((idx, examples))
+
+                if sum(len(x) for _, x in pending) >= (batch_size or 0):
+                    flush(extractor)
+
+            if pending:
+                flush(extractor)
+
+        while writes:
+            finish_write()
+    finally:
+        if decode_pool is not None:
+            decode_pool.shutdown()
+        if write_pool is not None:
+            write_pool.shutdown()
 
     return success
 
@@ -64,8 +746,94 @@ def process_args(args):
     parser.add_argument('--file', default='',
                         type=str, help='Path to an audio file to process.')
 
+    parser.add_argument('--batch-size', dest='batch_size', default=None,
+                        type=int,
+                        help='Number of patches to process together, '
+                             'pooled across consecutive files.')
+
+    parser.add_argument('--backend', default='session',
+                        choices=openmic.vggish.model.BACKENDS,
+                        help='Implementation of the VGGish model to use.')
+
+    parser.add_argument('--intra-op-threads', dest='intra_op_threads',
+                        default=None, type=int,
+                        help='Number of threads used within each model op.')
+    parser.add_argument('--inter-op-threads', dest='inter_op_threads',
+                        default=None, type=int,
+                        help='Number of threads used across model ops.')
+
+    parser.add_argument('--decode-workers', dest='decode_workers',
+                        default=0, type=int,
+                        help='Number of processes used to decode audio.')
+    parser.add_argument('--write-workers', dest='write_workers',
+                        default=0, type=int,
+                        help='Number of threads used to write outputs.')
+    parser.add_argument('--max-pending', dest='max_pending',
+                        default=None, type=int,
+                        help='Maximum number of files queued for decoding, '
+                             'or for writing.')
+
+    parser.add_argument('--workers', default=0, type=int,
+                        help='Number of processes to shard the files across, '
+                             'each with its own model.')
+    parser.add_argument('--retries', default=0, type=int,
+                        help='Number of times to retry a failed file, '
+                             'with --workers.')
+    parser.add_argument('--saved-model', dest='saved_model', default=None,
+                        type=str,
+                        help='Path to an exported VGGish model to load, '
+                             'for the session backend.')
+
+    parser.add_argument('--resume', action='store_true',
+                        help='Skip files which were completed by a previous '
+                             'run, according to the manifest.')
+    parser.add_argument('--manifest', default=None, type=str,
+                        help='Path to the run manifest; by default, {} in '
+                             'the output directory.'.format(MANIFEST_NAME))
+
+    parser.add_argument('--cache-dir', dest='cache_dir', default=None,
+                        type=str,
+                        help='Directory of a feature cache, keyed by the '
+                             'content of each audio file.')
+    parser.add_argument('--cache-size', dest='cache_size', default=None,
+                        type=int,
+                        help='Maximum size of the feature cache, in bytes.')
+
+    parser.add_argument('--output-format', dest='output_format',
+                        default='npz', choices=['npz', 'store'],
+                        help='Write one NPZ file per input, or a single '
+                             'sharded feature store.')
+    parser.add_argument('--shard-size', dest='shard_size', default=2 ** 18,
+                        type=int,
+                        help='Number of patches per shard of the feature '
+                             'store.')
+
+    parser.add_argument('--precision', default='float32',
+                        choices=sorted(store.PRECISIONS),
+                        help='Precision of the stored features; uint8 '
+                             'stores only the PCA\'ed features.')
+    parser.add_argument('--derive-time', dest='derive_time',
+                        action='store_true',
+                        help='Do not store time points, which follow from '
+                             'the number of patches.')
+    parser.add_argument('--compressed', action='store_true',
+                        help='Compress NPZ outputs.')
+
+    parser.add_argument('--profile', default=None, type=str,
+                        help='Record the time and memory used by each stage, '
+                             'and save a report to this path (.json or .csv).')
+
+    parser.add_argument('--trace-dir', dest='trace_dir', default=None,
+                        type=str,
+                        help='Save tensorflow timelines of the first model '
+                             'batches in this directory (session backend).')
+    parser.add_argument('--trace-batches', dest='trace_batches', default=1,
+                        type=int,
+                        help='Number of model batches to trace, with '
+                             '--trace-dir.')
+
     parser.add_argument(dest='output_path', type=str, action='store',
-                        help='Path to store output files in NPZ format')
+                        help='Directory to store the output in')
     return parser.parse_args(args)
 
 
@@ -77,6 +845,7 @@ def load_files_in(input_list):
 
 if __name__ == '__main__':
     args = process_args(sys.argv[1:])
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
 
     if not args.input_list and not args.file:
         raise ValueError("One of `--file` or `--input_list` must be given.")
@@ -88,5 +857,27 @@ if __name__ == '__main__':
     else:
         files_in = load_files_in(args.input_list)
 
-    success = all(main(files_in, args.output_path))
+    success = all(main(files_in, args.output_path,
+                       batch_size=args.batch_size,
+                       backend=args.backend,
+                       intra_op_threads=args.intra_op_threads,
+                       inter_op_threads=args.inter_op_threads,
+                       decode_workers=args.decode_workers,
+                       write_workers=args.write_workers,
+                       max_pending=args.max_pending,
+                       workers=args.workers,
+                       retries=args.retries,
+                       saved_model=args.saved_model,
+                       resume=args.resume,
+                       manifest=args.manifest,
+                       cache_dir=args.cache_dir,
+                       cache_size=args.cache_size,
+                       output_format=args.output_format,
+                       shard_size=args.shard_size,
+                       precision=args.precision,
+                       derive_time=args.derive_time,
+                       compressed=args.compressed,
+                       profile=args.profile,
+                       trace_dir=args.trace_dir,
+                       trace_batches=args.trace_batches))
     sys.exit(0 if success else 1)
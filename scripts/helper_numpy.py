@@ -56,8 +56,8 @@ def main(csvfile, vggishpath, outfile):
     Y_mask = np.zeros([songs_num, inst_num], dtype=bool)
 
     for _, row in df.iterrows():
-        x_pos = int(np.arange(songs_num)[sample_key == row.sample_key])
-        y_pos = int(np.arange(inst_num)[instruments == row.instrument])
+        x_pos = int(np.arange(songs_num)[sample_key == row.sample_key][0])
+        y_pos = int(np.arange(inst_num)[instruments == row.instrument][0])
         Y_true[x_pos, y_pos] = row.relevance
         Y_mask[x_pos, y_pos] = 1
 
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# coding: utf8
+'''Report the error / speed tradeoff of low-rank factorized VGGish models.
+
+For each rank, the `fc1` layers of VGGish are replaced by a truncated SVD
+(see `openmic.vggish.lowrank`), and the resulting model is compared to the
+full model on a set of audio files: throughput, raw embedding error, and
+the drift in the PCA'ed `features_z`.
+
+Example
+-------
+$ cd {repo_root}
+$ ./scripts/lowrank_vggish.py --input_list file_list.txt \
+    --ranks 128 256 512 1024 --report lowrank.json
+'''
+
+import argparse
+import json
+import pandas as pd
+import sys
+import time
+
+import openmic.vggish
+import openmic.vggish.lowrank
+
+
+def timed_extract(extractor, examples_list, batch_size):
+    start = time.perf_counter()
+    extractor.extract_many(examples_list, batch_size)
+    elapsed = time.perf_counter() - start
+    return sum(len(x) for x in examples_list) / elapsed
+
+
+def main(files_in, ranks, backend='numpy', batch_size=64):
+    examples_list = [openmic.vggish.soundfile_to_examples(fname)
+                     for fname in files_in]
+
+    reference = openmic.vggish.get_extractor(backend)
+    # Warm up, so the first timing is not penalized
+    reference.extract_many(examples_list[:1], batch_size)
+
+    results = [dict(rank=None,
+                    throughput=timed_extract(reference, examples_list,
+                                             batch_size))]
+
+    for rank in ranks:
+        candidate = openmic.vggish.get_extractor(backend, rank=rank)
+        candidate.extract_many(examples_list[:1], batch_size)
+
+        result = dict(rank=rank,
+                      throughput=timed_extract(candidate, examples_list,
+                                               batch_size))
+        result.update(openmic.vggish.model.accuracy_report(
+            reference, candidate, examples_list, batch_size))
+        results.append(result)
+        candidate.close()
+
+    reference.close()
+
+    for result in results:
+        print('rank={!s:>6}  throughput={:8.1f} patches/s  '
+              'relative_error={:.4f}  features_z equal={:.3f}'
+              .format(result['rank'] or 'full', result['throughput'],
+                      result.get('relative_error', 0.0),
+                      result.get('postprocess_equal', 1.0)))
+
+    return results
+
+
+def process_args(args):
+
+    parser = argparse.ArgumentParser(
+        description='VGGish low-rank error / speed report')
+
+    parser.add_argument('--input_list', default='', type=str,
+                        help='Path to a newline separated list of filepaths.')
+    parser.add_argument('--ranks', nargs='+', type=int,
+                        default=[128, 256, 512, 1024],
+                        help='Ranks of the factorization to evaluate.')
+    parser.add_argument('--backend', default='numpy',
+                        choices=['numpy', 'function'],
+                        help='Implementation of the VGGish model to use.')
+    parser.add_argument('--batch-size', dest='batch_size', default=64,
+                        type=int, help='Number of patches per batch.')
+    parser.add_argument('--report', dest='report_file', default=None,
+                        type=str, help='Path to write the report as JSON.')
+    return parser.parse_args(args)
+
+
+def load_files_in(input_list):
+
+    files_in = pd.read_table(input_list, header=None)
+    return list(files_in[0])
+
+
+if __name__ == '__main__':
+    args = process_args(sys.argv[1:])
+
+    if not args.input_list:
+        raise ValueError("`--input_list` must be given.")
+
+    results = main(load_files_in(args.input_list), args.ranks,
+                   backend=args.backend, batch_size=args.batch_size)
+
+    if args.report_file:
+        with open(args.report_file, 'w') as fdesc:
+            json.dump(results, fdesc, indent=2)
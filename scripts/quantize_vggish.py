@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# coding: utf8
+'''Create an int8 quantized VGGish model, and report on its accuracy.
+
+The activations are calibrated on a list of audio files, and the quantized
+model is then compared to the float32 model on a (preferably disjoint) list
+of evaluation files.
+
+Example
+-------
+$ cd {repo_root}
+$ ./scripts/quantize_vggish.py \
+    --calibration_list calibration_files.txt \
+    --eval_list eval_files.txt \
+    --report report.json \
+    openmic/vggish/_model/vggish_model_int8.tflite
+
+The output path above is the default location used by
+`openmic.vggish.get_extractor('quantized')`.
+'''
+
+import argparse
+import json
+import os
+import pandas as pd
+import sys
+
+import openmic.vggish
+import openmic.vggish.model
+import openmic.vggish.quantize
+
+
+def main(calibration_files, eval_files, output_path, max_examples=1000,
+         report_file=None):
+
+    openmic.vggish.quantize.quantize_model(output_path, calibration_files,
+                                           max_examples=max_examples)
+
+    examples_list = [openmic.vggish.soundfile_to_examples(fname)
+                     for fname in eval_files]
+
+    with openmic.vggish.get_extractor('session') as reference, \
+            openmic.vggish.get_extractor('quantized',
+                                         model_path=output_path) as candidate:
+        report = openmic.vggish.model.accuracy_report(
+            reference, candidate, examples_list)
+
+    print(json.dumps(report, indent=2))
+    if report_file:
+        with open(report_file, 'w') as fdesc:
+            json.dump(report, fdesc, indent=2)
+
+    return os.path.exists(output_path)
+
+
+def process_args(args):
+
+    parser = argparse.ArgumentParser(description='VGGish int8 quantization')
+
+    parser.add_argument('--calibration_list', default='', type=str,
+                        help='Path to a newline separated list of audio '
+                             'files to calibrate the model on.')
+    parser.add_argument('--eval_list', default='', type=str,
+                        help='Path to a newline separated list of audio '
+                             'files to evaluate on. Defaults to the '
+                             'calibration files.')
+    parser.add_argument('--max-examples', dest='max_examples', default=1000,
+                        type=int,
+                        help='Maximum number of patches to calibrate with.')
+    parser.add_argument('--report', dest='report_file', default=None,
+                        type=str,
+                        help='Path to write the accuracy report as JSON.')
+
+    parser.add_argument(dest='output_path', type=str, action='store',
+                        help='Path to write the quantized model')
+    return parser.parse_args(args)
+
+
+def load_files_in(input_list):
+
+    files_in = pd.read_table(input_list, header=None)
+    return list(files_in[0])
+
+
+if __name__ == '__main__':
+    args = process_args(sys.argv[1:])
+
+    if not args.calibration_list:
+        raise ValueError("`--calibration_list` must be given.")
+
+    calibration_files = load_files_in(args.calibration_list)
+    eval_files = calibration_files
+    if args.eval_list:
+        eval_files = load_files_in(args.eval_list)
+
+    success = main(calibration_files, eval_files, args.output_path,
+                   max_examples=args.max_examples,
+                   report_file=args.report_file)
+    sys.exit(0 if success else 1)
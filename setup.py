@@ -42,7 +42,8 @@ setup(
         'tqdm',
         'resampy',
         'soundfile>=0.9',
-        'joblib'
+        'joblib',
+        'threadpoolctl'
     ],
     extras_require={},
     scripts=['scripts/featurefy.py']
@@ -1,5 +1,6 @@
 import pytest
 
+import hashlib
 import os
 
 import openmic.util as util
@@ -16,3 +17,31 @@ def test_safe_makedirs(tmpdir):
     util.safe_makedirs(os.path.join(str(tmpdir), 'foo'))
     util.safe_makedirs(os.path.join(str(tmpdir), 'foo'))
     util.safe_makedirs('')
+
+
+def test_md5_file(tmpdir):
+    fname = str(tmpdir.join('data.bin'))
+    data = os.urandom(3000)
+    with open(fname, 'wb') as fdesc:
+        fdesc.write(data)
+
+    expected = hashlib.md5(data).hexdigest()
+    assert util.md5_file(fname) == expected
+    assert util.md5_file(fname, chunk_size=1000) == expected
+    assert util.md5_file(fname, chunk_size=7) == expected
+
+
+def test_open_temporary(tmpdir):
+    fname = str(tmpdir.join('data.npz'))
+    umask = os.umask(0o022)
+    try:
+        fobj, tmpname = util.open_temporary(fname)
+        with fobj:
+            fobj.write(b'data')
+    finally:
+        os.umask(umask)
+
+    assert os.path.dirname(tmpname) == str(tmpdir)
+    assert tmpname != util.open_temporary(fname)[1]
+    # Permissions follow the umask, unlike those of tempfile.mkstemp
+    assert os.stat(tmpname).st_mode & 0o777 == 0o644
@@ -0,0 +1,44 @@
+import pytest
+
+import asyncio
+import numpy as np
+import soundfile as sf
+
+import openmic.vggish
+import openmic.vggish.model as model
+from openmic.vggish.aio import AsyncExtractor
+
+
+def test_async_extractor(ogg_file):
+    data, rate = sf.read(ogg_file)
+    examples = openmic.vggish.soundfile_to_examples(ogg_file)
+
+    with model.VGGishExtractor(postprocess=True) as extractor:
+        _, features, features_z = extractor.extract(examples)
+
+    async def run():
+        async with AsyncExtractor(processes=2, max_pending=2) as extractor:
+            files = [extractor.soundfile_to_features(ogg_file)
+                     for _ in range(6)]
+            waveform = extractor.waveform_to_features(data, rate,
+                                                      compress=False)
+            return await asyncio.gather(waveform, *files)
+
+    results = asyncio.run(run())
+
+    time_points, raw = results[0]
+    assert np.allclose(time_points, np.arange(len(features)) * 0.96)
+    assert raw.shape == features.shape
+    for time_points, features_i in results[1:]:
+        assert features_i.dtype == np.uint8
+        assert np.abs(features_i.astype(int) - features_z).max() <= 1
+
+
+def test_async_extractor_bad_file(empty_audio_file):
+
+    async def run():
+        async with AsyncExtractor(processes=1) as extractor:
+            return await extractor.soundfile_to_features(empty_audio_file)
+
+    with pytest.raises(ValueError):
+        asyncio.run(run())
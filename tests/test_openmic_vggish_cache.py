@@ -0,0 +1,122 @@
+import pytest
+
+import numpy as np
+import os
+import soundfile as sf
+
+import openmic.vggish.model as model
+from openmic.vggish.cache import FeatureCache
+
+
+class CountingExtractor(model.BaseExtractor):
+    '''A stand-in for the model, which counts the examples it embeds.'''
+
+    postprocess = True
+
+    def __init__(self):
+        self.num_examples = 0
+
+    def _embed(self, examples):
+        self.num_examples += len(examples)
+        return examples.mean(axis=1)[:, :1].repeat(128, axis=1)
+
+
+def test_feature_cache(ogg_file, tmpdir):
+    cache = FeatureCache(str(tmpdir), backend='session')
+    extractor = CountingExtractor()
+
+    expected = cache.soundfile_to_features(ogg_file, extractor)
+    num_examples = extractor.num_examples
+    assert cache.stats()['misses'] == 1
+
+    results = cache.soundfile_to_features(ogg_file, extractor)
+    assert extractor.num_examples == num_examples
+    assert cache.stats()['hits'] == 1
+    for result, expect in zip(results, expected):
+        assert np.array_equal(result, expect)
+
+    # The cache is shared with other instances of the same settings...
+    assert FeatureCache(str(tmpdir), backend='session').get(
+        cache.file_key(ogg_file)) is not None
+    # ...but not with other settings
+    other = FeatureCache(str(tmpdir), backend='numpy')
+    assert other.get(other.file_key(ogg_file)) is None
+
+
+def test_feature_cache_waveform(ogg_file, tmpdir):
+    cache = FeatureCache(str(tmpdir))
+    extractor = CountingExtractor()
+    data, rate = sf.read(ogg_file)
+
+    cache.waveform_to_features(data, rate, extractor)
+    cache.waveform_to_features(data.copy(), rate, extractor)
+    cache.waveform_to_features(data, rate // 2, extractor)
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses']) == (1, 2)
+
+
+def test_feature_cache_eviction(tmpdir):
+    cache = FeatureCache(str(tmpdir))
+    results = (np.arange(10) * 0.96, np.zeros((10, 128), dtype=np.float32),
+               np.zeros((10, 128), dtype=np.uint8))
+
+    keys = ['{:032x}'.format(n) for n in range(4)]
+    for n, key in enumerate(keys):
+        cache.put(key, results)
+        os.utime(cache._path(key), (n, n))
+    entry_size = cache.stats()['size'] // 4
+
+    # The first entry is used, so the second is the least recently used
+    assert cache.get(keys[0]) is not None
+    # Evicting down to 90% of 3.5 entries leaves 3
+    cache.max_size = 7 * entry_size // 2
+    cache.evict()
+
+    assert cache.stats()['evictions'] == 1
+    assert cache.stats()['size'] <= cache.max_size
+    assert cache.get(keys[1]) is None
+    assert all(cache.get(key) is not None for key in keys[2:] + keys[:1])
+
+
+def test_feature_cache_put(tmpdir):
+    cache = FeatureCache(str(tmpdir))
+    results = (np.arange(10) * 0.96, np.zeros((10, 128), dtype=np.float32),
+               np.zeros((10, 128), dtype=np.uint8))
+    key = '{:032x}'.format(0)
+
+    umask = os.umask(0o022)
+    try:
+        cache.put(key, results)
+    finally:
+        os.umask(umask)
+    size = cache.stats()['size']
+    assert size == os.path.getsize(cache._path(key))
+    assert os.stat(cache._path(key)).st_mode & 0o777 == 0o644
+
+    # Replacing an entry does not count it twice
+    cache.put(key, results)
+    assert cache.stats()['size'] == size
+
+
+def test_feature_cache_low_water(tmpdir, monkeypatch):
+    results = (np.arange(10) * 0.96, np.zeros((10, 128), dtype=np.float32),
+               np.zeros((10, 128), dtype=np.uint8))
+    cache = FeatureCache(str(tmpdir))
+    cache.put('{:032x}'.format(0), results)
+    entry_size = cache.stats()['size']
+    cache.max_size = 10 * entry_size
+    cache.low_water = 0.5
+
+    scans = []
+    entries = cache._entries
+    monkeypatch.setattr(cache, '_entries',
+                        lambda: scans.append(1) or entries())
+
+    for n in range(1, 16):
+        cache.put('{:032x}'.format(n), results)
+
+    # Going over the limit evicts down to the low water mark, which
+    # leaves room for the following entries without another scan
+    assert len(scans) == 1
+    assert cache.stats()['evictions'] == 6
+    assert cache.stats()['size'] == 10 * entry_size
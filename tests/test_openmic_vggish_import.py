@@ -0,0 +1,41 @@
+import pytest
+
+import json
+import subprocess
+import sys
+
+# Time allowed for `import openmic.vggish`, once numpy is loaded
+IMPORT_BUDGET = 0.5
+
+HEAVY_MODULES = ['tensorflow', 'tf_slim', 'pandas', 'joblib', 'resampy',
+                 'scipy', 'sklearn']
+
+
+def imported_modules(statement):
+    code = '\n'.join([
+        'import json, sys, time',
+        'import numpy',
+        'start = time.perf_counter()',
+        statement,
+        'elapsed = time.perf_counter() - start',
+        'print(json.dumps(dict(elapsed=elapsed,',
+        '                      modules=list(sys.modules))))'])
+    output = subprocess.check_output([sys.executable, '-c', code])
+    return json.loads(output.decode('utf-8').splitlines()[-1])
+
+
+@pytest.mark.parametrize('statement', [
+    'import openmic.vggish',
+    'import openmic.vggish.util',
+    'from openmic.vggish import mel_features, Postprocessor, '
+    'waveform_to_examples'])
+def test_import_is_lazy(statement):
+    result = imported_modules(statement)
+    assert not set(HEAVY_MODULES) & set(result['modules'])
+
+
+def test_import_time():
+    # Best of a few runs, to reduce the noise from a busy machine
+    elapsed = min(imported_modules('import openmic.vggish')['elapsed']
+                  for _ in range(3))
+    assert elapsed < IMPORT_BUDGET
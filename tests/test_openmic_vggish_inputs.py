@@ -1,5 +1,8 @@
 import pytest
 
+import numpy as np
+import soundfile as sf
+
 import openmic.vggish.inputs as inputs
 
 
@@ -17,3 +20,44 @@ def test_soundfile_to_examples_bad_format(mp3_file):
 def test_soundfile_to_examples_empty_file(empty_audio_file):
     with pytest.raises(ValueError):
         inputs.soundfile_to_examples(empty_audio_file)
+
+
+@pytest.mark.parametrize('max_batch', [1, 3, 10, 100])
+def test_waveform_to_example_batches(ogg_file, max_batch):
+    data, rate = sf.read(ogg_file)
+    expected = inputs.waveform_to_examples(data, rate)
+
+    batches = list(inputs.waveform_to_example_batches(data, rate, max_batch))
+    assert all(len(batch) <= max_batch for batch in batches)
+    assert np.allclose(np.concatenate(batches), expected)
+
+
+def test_waveform_to_example_batches_short():
+    batches = list(inputs.waveform_to_example_batches(np.zeros(8000), 16000,
+                                                      max_batch=2))
+    assert len(batches) == 1
+    assert batches[0].shape == (0, 96, 64)
+
+
+@pytest.mark.parametrize('block_size', [1000, 44100, 10 ** 6])
+def test_example_stream(ogg_file, block_size):
+    data, rate = sf.read(ogg_file)
+    expected = inputs.waveform_to_examples(data, rate)
+
+    stream = inputs.ExampleStream(rate)
+    examples = [stream.push(data[i:i + block_size])
+                for i in range(0, len(data), block_size)]
+    examples.append(stream.flush())
+
+    assert np.allclose(np.concatenate(examples), expected)
+
+
+def test_example_stream_native_rate():
+    data = np.random.RandomState(0).randn(3 * 16000)
+    expected = inputs.waveform_to_examples(data, 16000)
+
+    stream = inputs.ExampleStream(16000)
+    examples = [stream.push(block) for block in np.array_split(data, 7)]
+    examples.append(stream.flush())
+
+    assert np.allclose(np.concatenate(examples), expected)
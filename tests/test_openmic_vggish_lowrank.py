@@ -0,0 +1,59 @@
+import pytest
+
+import numpy as np
+import tensorflow as tf
+
+import openmic.vggish
+import openmic.vggish.lowrank as lowrank
+import openmic.vggish.numpy_model as numpy_model
+import openmic.vggish.tf2 as tf2
+
+
+@pytest.fixture(scope='module')
+def weights():
+    return tf2.load_checkpoint_weights()
+
+
+def test_factorize_weights_exact():
+    rng = np.random.RandomState(0)
+    layer_w = rng.randn(12, 4).astype(np.float32)
+    weights = {'vggish/fc/weights': layer_w, 'vggish/fc/biases': np.zeros(4)}
+
+    factorized = lowrank.factorize_weights(weights, 4, layers=['fc'])
+    assert 'vggish/fc/weights' not in factorized
+    assert 'vggish/fc/weights' in weights
+    assert factorized['vggish/fc/weights_u'].shape == (12, 4)
+    assert factorized['vggish/fc/weights_v'].shape == (4, 4)
+    assert np.allclose(np.dot(factorized['vggish/fc/weights_u'],
+                              factorized['vggish/fc/weights_v']),
+                       layer_w, atol=1e-5)
+
+
+def test_lowrank_models(ogg_file, weights):
+    examples = openmic.vggish.soundfile_to_examples(ogg_file)
+    factorized = lowrank.factorize_weights(weights, 64)
+    assert (lowrank.num_parameters(factorized) <
+            lowrank.num_parameters(weights))
+
+    expected = numpy_model.vggish(examples, weights)
+    features = numpy_model.vggish(examples, factorized)
+    tf_features = tf2.VGGish(factorized)(
+        tf.constant(examples, dtype=tf.float32)).numpy()
+
+    assert features.shape == expected.shape
+    assert np.allclose(features, tf_features, atol=1e-4)
+    assert not np.allclose(features, expected, atol=1e-4)
+
+
+def test_lowrank_accuracy_report(ogg_file):
+    examples = openmic.vggish.soundfile_to_examples(ogg_file)
+
+    with openmic.vggish.get_extractor('function') as reference, \
+            openmic.vggish.get_extractor('function', rank=16) as low, \
+            openmic.vggish.get_extractor('function', rank=1024) as high:
+        report_low = openmic.vggish.model.accuracy_report(
+            reference, low, [examples])
+        report_high = openmic.vggish.model.accuracy_report(
+            reference, high, [examples])
+
+    assert report_high['relative_error'] < report_low['relative_error']
@@ -1,9 +1,13 @@
 import pytest
 
+from concurrent.futures import ThreadPoolExecutor
+import json
 import numpy as np
+import os
 import soundfile as sf
 import tensorflow as tf
 
+import openmic.vggish
 import openmic.vggish.inputs
 import openmic.vggish.model as model
 from openmic.vggish import waveform_to_features
@@ -29,3 +33,262 @@ def test_wf_to_features(ogg_file):
     assert np.allclose(time_points, time_points_z)
 
     assert np.allclose(features_z, openmic.vggish.postprocess(features))
+
+
+def test_model_transform_reuses_graph(ogg_file):
+    examples = openmic.vggish.inputs.soundfile_to_examples(ogg_file)
+    with tf.Graph().as_default(), tf.compat.v1.Session() as sess:
+        _, features = model.transform(examples, sess)
+        num_ops = len(sess.graph.get_operations())
+        _, features2 = model.transform(examples, sess)
+        assert len(sess.graph.get_operations()) == num_ops
+
+    assert np.allclose(features, features2)
+
+
+def test_extractor(ogg_file):
+    examples = openmic.vggish.inputs.soundfile_to_examples(ogg_file)
+    with tf.Graph().as_default(), tf.compat.v1.Session() as sess:
+        exp_time_points, exp_features = model.transform(examples, sess)
+
+    with model.VGGishExtractor() as extractor:
+        for _ in range(2):
+            time_points, features = extractor.extract(examples)
+            assert np.allclose(time_points, exp_time_points)
+            assert np.allclose(features, exp_features, atol=1e-5)
+
+
+def test_extractor_extract_many(ogg_file):
+    examples = openmic.vggish.inputs.soundfile_to_examples(ogg_file)
+    examples_list = [examples, examples[:3], examples[1:]]
+
+    with model.VGGishExtractor() as extractor:
+        expected = [extractor.extract(x) for x in examples_list]
+        for batch_size in [None, 1, 4, 64]:
+            results = extractor.extract_many(examples_list, batch_size)
+            assert len(results) == len(expected)
+            for (t, f), (t_exp, f_exp) in zip(results, expected):
+                assert np.allclose(t, t_exp)
+                assert np.allclose(f, f_exp, atol=1e-4)
+
+
+def test_saved_model(ogg_file, tmpdir):
+    examples = openmic.vggish.inputs.soundfile_to_examples(ogg_file)
+    export_dir = os.path.join(str(tmpdir), 'vggish')
+    model.export_saved_model(export_dir, pca_params=openmic.vggish.PCA_PARAMS)
+
+    with model.VGGishExtractor() as extractor:
+        exp_time_points, exp_features = extractor.extract(examples)
+
+    with model.VGGishExtractor(saved_model=export_dir) as extractor:
+        extractor.graph.get_tensor_by_name(
+            openmic.vggish.params.POSTPROCESS_TENSOR_NAME)
+        time_points, features = extractor.extract(examples)
+
+    assert np.allclose(time_points, exp_time_points)
+    assert np.allclose(features, exp_features, atol=1e-4)
+
+
+def test_extractor_postprocess(ogg_file, tmpdir):
+    examples = openmic.vggish.inputs.soundfile_to_examples(ogg_file)
+
+    with model.VGGishExtractor(postprocess=True) as extractor:
+        time_points, features, features_z = extractor.extract(examples)
+        results = extractor.extract_many([examples, examples[:3]], 4)
+
+    assert features_z.dtype == np.uint8
+    assert np.array_equal(features_z, openmic.vggish.postprocess(features))
+    assert np.array_equal(results[0][2], features_z)
+    assert np.array_equal(results[1][2],
+                          openmic.vggish.postprocess(results[1][1]))
+
+    # Exported models which already include the postprocessing
+    export_dir = os.path.join(str(tmpdir), 'vggish')
+    model.export_saved_model(export_dir, pca_params=openmic.vggish.PCA_PARAMS)
+    with model.VGGishExtractor(saved_model=export_dir,
+                               postprocess=True) as extractor:
+        _, features2, features_z2 = extractor.extract(examples)
+
+    assert np.array_equal(features_z2, openmic.vggish.postprocess(features2))
+
+
+def test_session_config():
+    config = model.session_config(intra_op_threads=2)
+    assert config.intra_op_parallelism_threads == 2
+    assert config.inter_op_parallelism_threads == 0
+
+    config2 = model.session_config(inter_op_threads=1, config=config)
+    assert config2.intra_op_parallelism_threads == 2
+    assert config2.inter_op_parallelism_threads == 1
+    assert config.inter_op_parallelism_threads == 0
+
+
+def test_extractor_threads(ogg_file):
+    examples = openmic.vggish.inputs.soundfile_to_examples(ogg_file)
+    with model.VGGishExtractor(intra_op_threads=1,
+                               inter_op_threads=1) as extractor:
+        _, features = extractor.extract(examples)
+
+    assert features.shape == (len(examples), 128)
+
+
+def test_max_batch(ogg_file):
+    examples = openmic.vggish.inputs.soundfile_to_examples(ogg_file)
+
+    with tf.Graph().as_default(), tf.compat.v1.Session() as sess:
+        time_points, features = model.transform(examples, sess)
+        time_points3, features3 = model.transform(examples, sess,
+                                                  max_batch=3)
+
+    assert np.allclose(time_points, time_points3)
+    assert np.allclose(features, features3, atol=1e-4)
+
+    with model.VGGishExtractor(postprocess=True) as extractor:
+        time_points3, features3, features_z3 = extractor.extract(examples,
+                                                                 max_batch=3)
+
+    assert np.allclose(time_points, time_points3)
+    assert np.allclose(features, features3, atol=1e-4)
+    assert features_z3.dtype == np.uint8
+
+
+def test_wf_to_features_max_batch(ogg_file):
+    data, rate = sf.read(ogg_file)
+
+    time_points, features = waveform_to_features(data, rate, compress=False)
+    time_points3, features3 = waveform_to_features(data, rate, compress=False,
+                                                   max_batch=3)
+    assert np.allclose(time_points, time_points3)
+    assert np.allclose(features, features3, atol=1e-4)
+
+
+def test_stream_features(ogg_file):
+    data, rate = sf.read(ogg_file)
+    time_points, features = waveform_to_features(data, rate, compress=False)
+
+    chunks = (data[i:i + 22050] for i in range(0, len(data), 22050))
+    results = list(openmic.vggish.stream_features(chunks, rate,
+                                                  compress=False))
+    assert len(results) == len(features)
+    assert np.allclose([t for t, _ in results], time_points)
+    assert np.allclose([f for _, f in results], features, atol=1e-4)
+
+
+def test_coalescing_extractor(ogg_file):
+    examples = openmic.vggish.inputs.soundfile_to_examples(ogg_file)
+
+    with model.VGGishExtractor(postprocess=True) as extractor:
+        expected = extractor.extract(examples)
+
+    extractor = model.CoalescingExtractor(
+        model.VGGishExtractor(postprocess=True), max_batch=16,
+        max_latency=0.1)
+    with extractor:
+        assert extractor.postprocess
+        futures = [extractor.submit(examples[:n]) for n in (1, 5, 10)]
+        results = [future.result() for future in futures]
+
+    # All three requests fit in one batch
+    assert extractor.num_batches == 1
+    assert extractor.num_examples == 16
+    for n, (time_points, features, features_z) in zip((1, 5, 10), results):
+        assert len(time_points) == n
+        assert np.allclose(features, expected[1][:n], atol=1e-4)
+        assert features_z.dtype == np.uint8
+
+
+class StubExtractor(model.BaseExtractor):
+    '''A stand-in for the model, which fails on NaN examples and records
+    the size of each forward pass.'''
+
+    def __init__(self):
+        self.batches = []
+
+    def _embed(self, examples):
+        if np.isnan(examples).any():
+            raise ValueError('NaN examples')
+        self.batches.append(len(examples))
+        return np.zeros((len(examples), 128), dtype=np.float32)
+
+
+def test_coalescing_extractor_requests():
+    stub = StubExtractor()
+    examples = np.zeros((10, 96, 64), dtype=np.float32)
+    bad = np.full((2, 96, 64), np.nan, dtype=np.float32)
+
+    with model.CoalescingExtractor(stub, max_batch=16,
+                                   max_latency=0.1) as extractor:
+        futures = [extractor.submit(examples, max_batch=4),
+                   extractor.submit(bad), extractor.submit(examples[:3])]
+        results = [future.result() for future in futures[::2]]
+        with pytest.raises(ValueError):
+            futures[1].result()
+
+    # The first request is split in forward passes of its own max_batch,
+    # and only the bad request fails
+    assert stub.batches == [4, 4, 2, 3]
+    assert [len(result[1]) for result in results] == [10, 3]
+
+
+def test_wf_to_features_threads(ogg_file):
+    data, rate = sf.read(ogg_file)
+    time_points, features = waveform_to_features(data, rate)
+
+    extractor = model.get_shared_extractor()
+    assert model.get_shared_extractor() is extractor
+
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(lambda _: waveform_to_features(data, rate),
+                                range(8)))
+
+    assert model.get_shared_extractor() is extractor
+    for time_points_i, features_i in results:
+        assert np.allclose(time_points_i, time_points)
+        assert np.abs(features_i.astype(int) - features).max() <= 1
+
+
+def test_extractor_trace(ogg_file, tmpdir):
+    examples = openmic.vggish.inputs.soundfile_to_examples(ogg_file)
+    trace_dir = str(tmpdir.join('traces'))
+    with model.VGGishExtractor(postprocess=True, trace_dir=trace_dir,
+                               trace_batches=2) as extractor:
+        traced = extractor.extract(examples, max_batch=4)
+    with model.VGGishExtractor(postprocess=True) as extractor:
+        expected = extractor.extract(examples, max_batch=4)
+
+    # Tracing does not change the features
+    assert np.allclose(traced[1], expected[1], atol=1e-4)
+
+    # Only the first batches are traced
+    traces = sorted(os.listdir(trace_dir))
+    assert len(traces) == 2
+    with open(os.path.join(trace_dir, traces[0])) as fdesc:
+        events = json.load(fdesc)['traceEvents']
+    # The ops of the model are in the timeline, possibly fused
+    assert any('Conv2D' in event['name'] for event in events
+               if event['ph'] == 'X')
+
+
+def test_model_transform_trace(ogg_file, tmpdir):
+    examples = openmic.vggish.inputs.soundfile_to_examples(ogg_file)
+    with tf.Graph().as_default(), tf.compat.v1.Session() as sess:
+        model.transform(examples, sess, trace_dir=str(tmpdir))
+        # Each call traces its own first batch, to a file of its own
+        model.transform(examples, sess, trace_dir=str(tmpdir))
+    assert len(os.listdir(str(tmpdir))) == 2
+
+
+def test_extractor_options():
+    options = model.extractor_options('numpy', intra_op_threads=2,
+                                      inter_op_threads=None, config=None)
+    assert options == dict(intra_op_threads=2)
+
+    assert model.extractor_options('function', inter_op_threads=1) == \
+        dict(inter_op_threads=1)
+
+    with pytest.raises(ValueError):
+        model.extractor_options('quantized', inter_op_threads=1)
+    with pytest.raises(ValueError):
+        model.get_extractor('numpy', config=tf.compat.v1.ConfigProto())
+    with pytest.raises(ValueError):
+        model.extractor_options('nonsense')
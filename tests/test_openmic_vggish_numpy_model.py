@@ -0,0 +1,74 @@
+import pytest
+
+import numpy as np
+import os
+import subprocess
+import sys
+
+import openmic.vggish
+import openmic.vggish.inputs
+import openmic.vggish.numpy_model as numpy_model
+
+
+@pytest.fixture(scope='module')
+def weights_file(tmpdir_factory):
+    fname = str(tmpdir_factory.mktemp('weights').join('vggish_model.npz'))
+    numpy_model.convert_checkpoint(fname)
+    return fname
+
+
+def test_conv2d():
+    rng = np.random.RandomState(0)
+    data = rng.randn(2, 6, 4, 3).astype(np.float32)
+    weights = rng.randn(3, 3, 3, 5).astype(np.float32)
+    biases = rng.randn(5).astype(np.float32)
+
+    padded = np.pad(data, [(0, 0), (1, 1), (1, 1), (0, 0)], mode='constant')
+    expected = np.zeros((2, 6, 4, 5))
+    for y in range(6):
+        for x in range(4):
+            expected[:, y, x] = np.tensordot(padded[:, y:y + 3, x:x + 3],
+                                             weights, axes=3)
+    expected = np.maximum(expected + biases, 0)
+
+    assert np.allclose(numpy_model.conv2d(data, weights, biases), expected,
+                       atol=1e-5)
+
+
+def test_max_pool2d():
+    data = np.arange(16, dtype=np.float32).reshape(1, 4, 4, 1)
+    output = numpy_model.max_pool2d(data)
+    assert np.array_equal(output[0, :, :, 0], [[5, 7], [13, 15]])
+
+
+def test_numpy_extractor(ogg_file, weights_file):
+    examples = openmic.vggish.inputs.soundfile_to_examples(ogg_file)
+    with openmic.vggish.VGGishExtractor() as extractor:
+        exp_time_points, expected = extractor.extract(examples)
+
+    with openmic.vggish.get_extractor('numpy',
+                                      weights=weights_file) as extractor:
+        time_points, features = extractor.extract(examples)
+
+    assert features.dtype == np.float32
+    assert np.allclose(time_points, exp_time_points)
+    assert np.allclose(features, expected, atol=1e-4)
+
+
+def test_numpy_model_without_tensorflow(ogg_file, weights_file):
+    code = ('import sys; import openmic.vggish.numpy_model as nm; '
+            'import openmic.vggish.inputs as inputs; '
+            'nm.NumpyExtractor(sys.argv[1]).extract('
+            'inputs.soundfile_to_examples(sys.argv[2])); '
+            'assert "tensorflow" not in sys.modules')
+    subprocess.check_call([sys.executable, '-c', code, weights_file, ogg_file])
+
+
+def test_numpy_extractor_postprocess(ogg_file, weights_file):
+    examples = openmic.vggish.inputs.soundfile_to_examples(ogg_file)
+
+    with numpy_model.NumpyExtractor(weights_file,
+                                    postprocess=True) as extractor:
+        _, features, features_z = extractor.extract(examples)
+
+    assert np.array_equal(features_z, openmic.vggish.postprocess(features))
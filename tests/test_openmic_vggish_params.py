@@ -0,0 +1,55 @@
+import pytest
+
+import hashlib
+import os
+
+import openmic.vggish.params as params
+
+
+@pytest.fixture()
+def model_file(tmpdir):
+    fname = str(tmpdir.join('model.ckpt'))
+    with open(fname, 'wb') as fdesc:
+        fdesc.write(b'not really a model')
+    return fname
+
+
+@pytest.fixture()
+def checksums(model_file):
+    with open(model_file, 'rb') as fdesc:
+        return {'model.ckpt': hashlib.md5(fdesc.read()).hexdigest()}
+
+
+def test_verify_model(model_file, checksums, tmpdir, monkeypatch):
+    stamp_file = str(tmpdir.join('stamps', 'checksums.json'))
+    params.verify_model([model_file], checksums, stamp_file)
+    assert os.path.exists(stamp_file)
+
+    # Neither this process nor another one hashes the file again
+    def fail(fname):
+        raise AssertionError('{} was hashed'.format(fname))
+    monkeypatch.setattr(params, 'md5_file', fail)
+    params.verify_model([model_file], checksums, stamp_file)
+    monkeypatch.setattr(params, '__VERIFIED__', set())
+    params.verify_model([model_file], checksums, stamp_file)
+
+    with pytest.raises(AssertionError):
+        params.verify_model([model_file], checksums, stamp_file, force=True)
+
+
+def test_verify_model_changed(model_file, checksums, tmpdir):
+    stamp_file = str(tmpdir.join('checksums.json'))
+    params.verify_model([model_file], checksums, stamp_file)
+
+    with open(model_file, 'ab') as fdesc:
+        fdesc.write(b'!')
+
+    with pytest.raises(RuntimeError):
+        params.verify_model([model_file], checksums, stamp_file)
+
+
+def test_verify_model_missing(tmpdir):
+    with pytest.raises(RuntimeError):
+        params.verify_model([str(tmpdir.join('missing.ckpt'))],
+                            {'missing.ckpt': '0' * 32},
+                            str(tmpdir.join('checksums.json')))
@@ -0,0 +1,86 @@
+import pytest
+
+import csv
+import json
+import numpy as np
+import threading
+
+import openmic.vggish
+from openmic.vggish import profiling
+
+
+@pytest.fixture()
+def profiler():
+    yield profiling.enable()
+    profiling.disable()
+
+
+def test_stage_disabled():
+    assert profiling.get_profiler() is None
+    with profiling.stage('noop') as stage:
+        pass
+    assert stage is profiling.stage('other')
+
+
+def test_stage_nested(profiler):
+    with profiling.stage('outer', item='clip'):
+        with profiling.stage('inner'):
+            data = np.ones(2 ** 20)
+        del data
+
+    inner, outer = profiler.records
+    assert (inner['stage'], outer['stage']) == ('inner', 'outer')
+    # Nested stages belong to the same item
+    assert inner['item'] == outer['item'] == 'clip'
+    assert outer['wall'] >= inner['wall'] > 0
+    assert outer['peak'] >= inner['peak'] >= 8 * 2 ** 20
+
+
+def test_stage_threads(profiler):
+    def work():
+        with profiling.stage('worker'):
+            np.ones(2 ** 20)
+
+    with profiling.stage('main'):
+        data = np.ones(2 ** 20)
+        thread = threading.Thread(target=work)
+        thread.start()
+        thread.join()
+
+    worker, main = profiler.records
+    # Only the main thread measures its peaks, which others do not reset
+    assert worker['peak'] is None
+    assert main['peak'] >= 8 * 2 ** 20
+    del data
+
+
+def test_profile_extraction(profiler, ogg_file):
+    examples = openmic.vggish.soundfile_to_examples(ogg_file)
+    with openmic.vggish.get_extractor('function',
+                                      postprocess=True) as extractor:
+        extractor.extract(examples)
+
+    summary = profiler.summary()
+    for name in ['read', 'resample', 'mel', 'embed', 'postprocess']:
+        assert summary[name]['count'] >= 1
+        assert summary[name]['wall']['p50'] <= summary[name]['wall']['max']
+        assert 'peak' in summary[name]
+
+
+def test_profiler_save(profiler, tmpdir):
+    for _ in range(3):
+        with profiling.stage('stage', item='clip'):
+            pass
+
+    json_file = str(tmpdir.join('profile.json'))
+    profiler.save(json_file)
+    with open(json_file) as fdesc:
+        report = json.load(fdesc)
+    assert report['summary']['stage']['count'] == 3
+    assert len(report['records']) == 3
+
+    csv_file = str(tmpdir.join('profile.csv'))
+    profiler.save(csv_file)
+    with open(csv_file) as fdesc:
+        rows = list(csv.DictReader(fdesc))
+    assert [row['stage'] for row in rows] == ['stage'] * 3
@@ -0,0 +1,52 @@
+import pytest
+
+import numpy as np
+import os
+
+import openmic.vggish
+import openmic.vggish.quantize as quantize
+
+
+@pytest.fixture(scope='module')
+def quantized_model(tmpdir_factory):
+    audio_file = os.path.join(os.path.dirname(__file__),
+                              'data', 'audio', '000046_3840.ogg')
+    fname = str(tmpdir_factory.mktemp('quantized').join('vggish.tflite'))
+    quantize.quantize_model(fname, [audio_file], max_examples=8)
+    return fname
+
+
+def test_calibration_examples(ogg_file):
+    examples = list(quantize.calibration_examples([ogg_file, ogg_file],
+                                                  max_examples=12))
+    assert len(examples) == 12
+    assert all(ex.shape == (1, 96, 64) for ex in examples)
+    assert all(ex.dtype == np.float32 for ex in examples)
+
+
+def test_quantized_extractor(ogg_file, quantized_model):
+    examples = openmic.vggish.soundfile_to_examples(ogg_file)
+
+    with openmic.vggish.get_extractor(
+            'quantized', model_path=quantized_model) as extractor:
+        time_points, features = extractor.extract(examples)
+        # Changing the batch size re-allocates the interpreter
+        results = extractor.extract_many([examples, examples[:3]], 4)
+
+    assert features.shape == (len(examples), 128)
+    assert features.dtype == np.float32
+    assert np.allclose(results[0][1], features)
+    assert np.allclose(results[1][1], features[:3])
+
+
+def test_accuracy_report(ogg_file, quantized_model):
+    examples = openmic.vggish.soundfile_to_examples(ogg_file)
+
+    with openmic.vggish.get_extractor('session') as reference, \
+            quantize.QuantizedExtractor(quantized_model) as candidate:
+        report = openmic.vggish.model.accuracy_report(reference, candidate,
+                                                      [examples])
+
+    assert report['num_examples'] == len(examples)
+    assert report['cosine_min'] > 0.98
+    assert 0 <= report['postprocess_equal'] <= 1
@@ -0,0 +1,78 @@
+import pytest
+
+from concurrent.futures import ThreadPoolExecutor
+import io
+import json
+import numpy as np
+import soundfile as sf
+import threading
+import urllib.error
+import urllib.request
+
+import openmic.vggish
+import openmic.vggish.model as model
+import openmic.vggish.service as service
+
+
+@pytest.fixture(scope='module')
+def server():
+    extractor = model.VGGishExtractor(postprocess=True)
+    server = service.Server(('localhost', 0), extractor, max_latency=0.1)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    yield server
+    server.shutdown()
+    thread.join()
+    server.server_close()
+
+
+def request(server, path, data=None, headers={}):
+    url = 'http://localhost:{}{}'.format(server.server_address[1], path)
+    req = urllib.request.Request(url, data=data, headers=headers)
+    with urllib.request.urlopen(req) as response:
+        return json.loads(response.read().decode('utf-8'))
+
+
+def test_server_audio(server, ogg_file):
+    with open(ogg_file, 'rb') as fdesc:
+        data = fdesc.read()
+
+    examples = openmic.vggish.soundfile_to_examples(ogg_file)
+    _, features, features_z = server.extractor.extract(examples)
+
+    with ThreadPoolExecutor(4) as pool:
+        results = list(pool.map(
+            lambda _: request(server, '/features', data), range(4)))
+
+    for result in results:
+        assert np.allclose(result['features'], features, atol=1e-4)
+        assert np.asarray(result['features_z']).shape == features_z.shape
+        assert len(result['time_points']) == len(features)
+
+    stats = request(server, '/stats')
+    assert stats['requests'] >= 4
+    assert stats['batches'] < stats['requests']
+    assert set(stats['latency']) == {'mean', 'p50', 'p90', 'p99'}
+
+
+def test_server_waveform(server, ogg_file):
+    data, rate = sf.read(ogg_file)
+    buf = io.BytesIO()
+    np.save(buf, data)
+
+    result = request(server, '/features?sample_rate={}'.format(rate),
+                     buf.getvalue(), {'Content-Type': 'application/x-npy'})
+
+    examples = openmic.vggish.waveform_to_examples(data, rate)
+    _, features, _ = server.extractor.extract(examples)
+    assert np.allclose(result['features'], features, atol=1e-4)
+
+
+def test_server_bad_request(server):
+    with pytest.raises(urllib.error.HTTPError) as exc:
+        request(server, '/features', b'not audio')
+    assert exc.value.code == 400
+
+    with pytest.raises(urllib.error.HTTPError) as exc:
+        request(server, '/nothing')
+    assert exc.value.code == 404
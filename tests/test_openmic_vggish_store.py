@@ -0,0 +1,114 @@
+import pytest
+
+import numpy as np
+import os
+
+from openmic.vggish import store
+from openmic.vggish.store import FeatureStore, FeatureStoreWriter
+
+
+def make_features(length, seed):
+    rng = np.random.RandomState(seed)
+    return (np.arange(length) * 0.96,
+            rng.randn(length, 128).astype(np.float32),
+            rng.randint(0, 256, size=(length, 128)).astype(np.uint8))
+
+
+def test_feature_store(tmpdir):
+    path = str(tmpdir.join('store'))
+    clips = {'clip{}'.format(n): make_features(n + 3, n) for n in range(5)}
+    with FeatureStoreWriter(path, shard_size=8) as writer:
+        for key, results in clips.items():
+            writer.add(key, *results)
+        assert 'clip0' in writer
+
+    # Clips are never split across shards
+    assert writer.shard > 0
+    store = FeatureStore(path)
+    assert len(store) == len(clips)
+    assert set(store) == set(clips)
+    for key, expected in clips.items():
+        results = store[key]
+        assert isinstance(results[1], np.memmap)
+        for result, expect in zip(results, expected):
+            assert result.dtype == expect.dtype
+            assert np.array_equal(result, expect)
+
+
+def test_feature_store_resume(tmpdir):
+    path = str(tmpdir)
+    first, second = make_features(4, 0), make_features(6, 1)
+    with FeatureStoreWriter(path) as writer:
+        writer.add('first', *first)
+
+    # Data which was never indexed, e.g., after a crash, is discarded
+    with open(os.path.join(path, 'shard-00000.features'), 'ab') as fobj:
+        fobj.write(b'\0' * 100)
+
+    with FeatureStoreWriter(path) as writer:
+        assert 'first' in writer
+        writer.add('second', *second)
+        # A key which is added again is replaced
+        writer.add('first', *second)
+
+    store = FeatureStore(path)
+    assert len(store) == 2
+    assert np.array_equal(store['second'][1], second[1])
+    assert np.array_equal(store['first'][1], second[1])
+    assert store.index['second'][1] == len(first[0])
+
+    with pytest.raises(KeyError):
+        store['third']
+
+    # The encoding of an existing store cannot be changed
+    with pytest.raises(ValueError):
+        FeatureStoreWriter(path, precision='float16')
+    with pytest.raises(ValueError):
+        FeatureStoreWriter(path, derive_time=True)
+
+
+@pytest.mark.parametrize('precision', ['float32', 'float16', 'uint8'])
+@pytest.mark.parametrize('derive_time', [False, True])
+def test_feature_store_precision(tmpdir, precision, derive_time):
+    expected = make_features(5, 0)
+    with FeatureStoreWriter(str(tmpdir), precision=precision,
+                            derive_time=derive_time) as writer:
+        writer.add('clip', *expected)
+
+    time_points, features, features_z = FeatureStore(str(tmpdir))['clip']
+    assert np.allclose(time_points, expected[0])
+    assert np.array_equal(features_z, expected[2])
+    if precision == 'uint8':
+        assert features is None
+    else:
+        assert features.dtype == np.float32
+        assert np.allclose(features, expected[1], rtol=1e-3, atol=1e-3)
+
+
+@pytest.mark.parametrize('compressed', [False, True])
+def test_save_load_features(tmpdir, compressed):
+    expected = make_features(50, 0)
+    sizes = dict()
+    for precision in ['float32', 'float16', 'uint8']:
+        fname = str(tmpdir.join(precision + '.npz'))
+        store.save_features(fname, expected, precision=precision,
+                            derive_time=True, compressed=compressed)
+        sizes[precision] = os.path.getsize(fname)
+
+        time_points, features, features_z = store.load_features(fname)
+        assert np.allclose(time_points, expected[0])
+        assert np.array_equal(features_z, expected[2])
+        assert features is None or features.dtype == np.float32
+    assert sizes['float32'] > sizes['float16'] > sizes['uint8']
+
+    # Files written by np.savez are read as they are
+    fname = str(tmpdir.join('plain.npz'))
+    np.savez(fname, time=expected[0], features=expected[1],
+             features_z=expected[2])
+    for result, expect in zip(store.load_features(fname), expected):
+        assert np.array_equal(result, expect)
+
+
+def test_fields_bad_precision():
+    with pytest.raises(ValueError):
+        store.fields('float8')
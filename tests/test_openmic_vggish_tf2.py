@@ -0,0 +1,44 @@
+import pytest
+
+import numpy as np
+import tensorflow as tf
+
+import openmic.vggish.inputs
+import openmic.vggish.model as model
+import openmic.vggish.tf2 as tf2
+
+
+@pytest.fixture(scope='module')
+def weights():
+    return tf2.load_checkpoint_weights()
+
+
+def test_load_checkpoint_weights(weights):
+    assert len(weights) == 18
+    assert weights['vggish/conv1/weights'].shape == (3, 3, 1, 64)
+    assert weights['vggish/fc2/biases'].shape == (128,)
+
+
+@pytest.mark.parametrize('jit_compile', [False, True])
+def test_vggish_parity(ogg_file, weights, jit_compile):
+    examples = openmic.vggish.inputs.soundfile_to_examples(ogg_file)
+    with tf.Graph().as_default(), tf.compat.v1.Session() as sess:
+        _, expected = model.transform(examples, sess)
+
+    vggish = tf2.VGGish(weights, jit_compile=jit_compile)
+    features = vggish(tf.constant(examples, dtype=tf.float32)).numpy()
+
+    assert features.shape == expected.shape
+    assert np.allclose(features, expected, atol=1e-4)
+
+
+def test_function_extractor(ogg_file):
+    examples = openmic.vggish.inputs.soundfile_to_examples(ogg_file)
+    with model.VGGishExtractor() as extractor:
+        exp_time_points, expected = extractor.extract(examples)
+
+    with tf2.FunctionExtractor() as extractor:
+        time_points, features = extractor.extract(examples)
+
+    assert np.allclose(time_points, exp_time_points)
+    assert np.allclose(features, expected, atol=1e-4)
@@ -1,6 +1,18 @@
 import pytest
 
+import json
+import numpy as np
+import os
+import shutil
+
+import benchmark_suite
+import benchmark_vggish
+import export_vggish
 import featurefy
+import lowrank_vggish
+from openmic.util import filebase
+import openmic.vggish
+from openmic.vggish.store import FeatureStore, load_features
 
 
 def test_featurefy_main(ogg_file, tmpdir):
@@ -11,3 +23,283 @@ def test_featurefy_main(ogg_file, tmpdir):
 def test_featurefy_main_garbage_audio(empty_audio_file, tmpdir):
     success = featurefy.main([empty_audio_file], str(tmpdir))
     assert not all(success)
+
+
+def test_featurefy_main_batched(ogg_file, empty_audio_file, tmpdir):
+    files_in = [ogg_file, empty_audio_file, ogg_file]
+    success = featurefy.main(files_in, str(tmpdir), batch_size=4)
+    assert success == [True, False, True]
+
+
+def test_export_vggish_main(tmpdir):
+    assert export_vggish.main(os.path.join(str(tmpdir), 'vggish'))
+
+
+def test_benchmark_vggish_main():
+    results = benchmark_vggish.main(['session', 'function'], num_patches=4,
+                                    batch_size=2, repeats=1)
+    assert set(results) == {'session', 'function'}
+    assert all(res['throughput'] > 0 for res in results.values())
+
+
+def test_export_vggish_main_numpy(tmpdir):
+    assert export_vggish.main(os.path.join(str(tmpdir), 'vggish.npz'),
+                              fmt='numpy')
+
+
+def test_lowrank_vggish_main(ogg_file):
+    results = lowrank_vggish.main([ogg_file], [32], backend='function',
+                                  batch_size=4)
+    assert [res['rank'] for res in results] == [None, 32]
+    assert results[1]['relative_error'] > 0
+
+
+def test_featurefy_main_threads(ogg_file, tmpdir):
+    success = featurefy.main([ogg_file], str(tmpdir), intra_op_threads=1,
+                             inter_op_threads=1)
+    assert all(success)
+
+
+def test_featurefy_main_pipelined(ogg_file, empty_audio_file, tmpdir):
+    # Distinct inputs, so that the writers write distinct outputs
+    audio_files = []
+    for name in ['first.ogg', 'second.ogg', 'third.ogg']:
+        audio_files.append(str(tmpdir.join(name)))
+        shutil.copy(ogg_file, audio_files[-1])
+    outpath = str(tmpdir.mkdir('output'))
+
+    files_in = audio_files[:1] + [empty_audio_file] + audio_files[1:]
+    success = featurefy.main(files_in, outpath, batch_size=16,
+                             decode_workers=2, write_workers=2,
+                             max_pending=1)
+    assert success == [True, False, True, True]
+
+    serial = str(tmpdir.mkdir('serial'))
+    assert all(featurefy.main([ogg_file], serial))
+    expected = np.load(featurefy.output_file(ogg_file, serial))
+    for file_in in audio_files:
+        outputs = np.load(featurefy.output_file(file_in, outpath))
+        assert np.array_equal(outputs['time'], expected['time'])
+        assert np.allclose(outputs['features'], expected['features'],
+                           atol=1e-4)
+
+
+def test_featurefy_schedule(ogg_file, empty_audio_file, mp3_file):
+    files_in = [empty_audio_file, ogg_file, 'missing.ogg', mp3_file]
+    assert featurefy.schedule(files_in) == [3, 1, 0, 2]
+
+
+def test_featurefy_main_workers(ogg_file, empty_audio_file, tmpdir):
+    # Distinct inputs, so that the workers write distinct outputs
+    other_file = str(tmpdir.join('other.ogg'))
+    shutil.copy(ogg_file, other_file)
+    outpath = str(tmpdir.mkdir('output'))
+
+    files_in = [ogg_file, empty_audio_file, other_file]
+    success = featurefy.main(files_in, outpath, batch_size=4, workers=2,
+                             retries=1, intra_op_threads=1)
+    assert success == [True, False, True]
+
+    for file_in in [ogg_file, other_file]:
+        outputs = np.load(featurefy.output_file(file_in, outpath))
+        assert outputs['features_z'].shape == (len(outputs['time']), 128)
+
+
+def crashing_process_file(idx, file_in, *args):
+    '''`featurefy.process_file`, but the worker dies on `crash.ogg`.'''
+    if os.path.basename(file_in) == 'crash.ogg':
+        os._exit(1)
+    return featurefy.process_file(idx, file_in, *args)
+
+
+def test_featurefy_main_workers_crash(ogg_file, tmpdir, monkeypatch):
+    files_in = []
+    for name in ['first.ogg', 'crash.ogg', 'second.ogg', 'third.ogg']:
+        files_in.append(str(tmpdir.join(name)))
+        shutil.copy(ogg_file, files_in[-1])
+    monkeypatch.setattr(featurefy, 'process_file', crashing_process_file)
+
+    completed = []
+    success = featurefy.main_sharded(
+        files_in, lambda idx, results: True, workers=2, retries=1,
+        options=dict(intra_op_threads=1),
+        callback=lambda idx, success: completed.append(idx))
+
+    # Only the file which crashed its worker fails, and only once
+    assert success == [True, False, True, True]
+    assert sorted(completed) == [0, 1, 2, 3]
+
+
+def test_featurefy_main_resume(ogg_file, empty_audio_file, tmpdir,
+                               monkeypatch):
+    audio_file = str(tmpdir.join('audio.ogg'))
+    shutil.copy(ogg_file, audio_file)
+    outpath = str(tmpdir.mkdir('output'))
+    files_in = [audio_file, empty_audio_file]
+
+    umask = os.umask(0o022)
+    os.umask(umask)
+    assert featurefy.main(files_in, outpath) == [True, False]
+    manifest = os.path.join(outpath, featurefy.MANIFEST_NAME)
+    with open(manifest) as fdesc:
+        entries = [json.loads(line) for line in fdesc]
+    assert [entry['status'] for entry in entries] == ['done', 'failed']
+    # No temporary files are left behind
+    assert sorted(os.listdir(outpath)) == ['audio.npz',
+                                           featurefy.MANIFEST_NAME]
+    # Outputs are readable by others, as set by the umask
+    mode = os.stat(os.path.join(outpath, 'audio.npz')).st_mode & 0o777
+    assert mode == 0o666 & ~umask
+
+    # Completed files are skipped, without loading the model
+    def fail(*args, **kwargs):
+        raise AssertionError('The model was loaded')
+    monkeypatch.setattr(openmic.vggish, 'get_extractor', fail)
+    assert featurefy.main([audio_file], outpath, resume=True) == [True]
+
+    # ...unless the settings, or the input, have changed
+    with pytest.raises(AssertionError):
+        featurefy.main([audio_file], outpath, resume=True, backend='numpy')
+
+    stat = os.stat(audio_file)
+    os.utime(audio_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    with pytest.raises(AssertionError):
+        featurefy.main([audio_file], outpath, resume=True)
+
+
+def test_featurefy_main_cache(ogg_file, tmpdir, monkeypatch):
+    cache_dir = str(tmpdir.join('cache'))
+    assert featurefy.main([ogg_file], str(tmpdir.mkdir('first')),
+                          cache_dir=cache_dir) == [True]
+
+    # A second run, with another output, only reads from the cache
+    def fail(*args, **kwargs):
+        raise AssertionError('The model was loaded')
+    monkeypatch.setattr(openmic.vggish, 'get_extractor', fail)
+    outpath = str(tmpdir.mkdir('second'))
+    assert featurefy.main([ogg_file], outpath, cache_dir=cache_dir) == [True]
+    assert os.path.exists(featurefy.output_file(ogg_file, outpath))
+
+
+def test_featurefy_main_store(ogg_file, empty_audio_file, tmpdir,
+                              monkeypatch):
+    outpath = str(tmpdir.join('store'))
+    files_in = [ogg_file, empty_audio_file]
+    assert featurefy.main(files_in, outpath, output_format='store',
+                          shard_size=16) == [True, False]
+
+    store = FeatureStore(outpath)
+    time_points, features, features_z = store[filebase(ogg_file)]
+    assert features_z.shape == (len(time_points), 128)
+
+    # The same features as in the NPZ format
+    npz_path = str(tmpdir.mkdir('npz'))
+    assert featurefy.main([ogg_file], npz_path) == [True]
+    expected = np.load(featurefy.output_file(ogg_file, npz_path))
+    assert np.array_equal(features_z, expected['features_z'])
+
+    # Clips in the store count as completed when resuming
+    def fail(*args, **kwargs):
+        raise AssertionError('The model was loaded')
+    monkeypatch.setattr(openmic.vggish, 'get_extractor', fail)
+    assert featurefy.main([ogg_file], outpath, output_format='store',
+                          resume=True) == [True]
+
+
+def test_featurefy_main_precision(ogg_file, tmpdir):
+    outpath = str(tmpdir)
+    assert featurefy.main([ogg_file], outpath, precision='float16',
+                          derive_time=True, compressed=True) == [True]
+
+    with np.load(featurefy.output_file(ogg_file, outpath)) as data:
+        assert sorted(data.files) == ['features', 'features_z']
+        assert data['features'].dtype == np.float16
+
+    time_points, features, features_z = load_features(
+        featurefy.output_file(ogg_file, outpath))
+    assert features.dtype == np.float32
+    assert time_points.shape == (len(features_z),)
+
+    with pytest.raises(ValueError):
+        featurefy.main([ogg_file], str(tmpdir.join('store')),
+                       output_format='store', compressed=True)
+
+
+def test_benchmark_suite(tmpdir):
+    output = str(tmpdir.join('baseline.json'))
+    names = ['log_mel_spectrogram', 'postprocess', 'verify_dataset_hash']
+    report = benchmark_suite.run(names, scale=1, repeats=2, output=output)
+    assert set(report['results']) == set(names)
+    assert all(len(result['times']) == 2 and result['throughput'] > 0
+               for result in report['results'].values())
+
+    assert benchmark_suite.compare(output, report) == []
+
+    slower = json.loads(json.dumps(report))
+    slower['results']['postprocess']['median'] *= 2
+    assert benchmark_suite.compare(output, slower) == ['postprocess']
+
+    slower['scale'] = 2
+    with pytest.raises(ValueError):
+        benchmark_suite.compare(report, slower)
+
+
+def test_benchmark_suite_close(monkeypatch):
+    closed = []
+
+    def bench_failing(scale, workdir, rng):
+        def run():
+            raise RuntimeError('failed')
+        return run, 1, lambda: closed.append(True)
+
+    monkeypatch.setitem(benchmark_suite.BENCHMARKS, 'failing', bench_failing)
+    with pytest.raises(RuntimeError):
+        benchmark_suite.benchmark('failing')
+    # Resources are released even if the benchmark fails
+    assert closed == [True]
+
+    result = benchmark_suite.benchmark('transform_warm', repeats=1)
+    assert result['throughput'] > 0
+
+
+@pytest.mark.parametrize('workers', [0, 2])
+def test_featurefy_main_profile(ogg_file, tmpdir, workers):
+    report = str(tmpdir.join('profile.json'))
+    assert featurefy.main([ogg_file, ogg_file], str(tmpdir), workers=workers,
+                          decode_workers=0 if workers else 1,
+                          profile=report) == [True, True]
+    assert openmic.vggish.profiling.get_profiler() is None
+
+    with open(report) as fdesc:
+        report = json.load(fdesc)
+    summary = report['summary']
+    # Stages in worker processes are included
+    assert summary['decode']['count'] == 2
+    assert summary['read']['count'] == 2
+    assert summary['save']['count'] == 2
+    assert summary['session_run']['count'] >= 1
+    # Batches of the model are attributed to their files
+    assert all(record['item'] for record in report['records']
+               if record['stage'] in ('model', 'session_run'))
+
+
+def test_featurefy_main_trace(ogg_file, tmpdir):
+    trace_dir = str(tmpdir.join('traces'))
+    assert featurefy.main([ogg_file, ogg_file], str(tmpdir), batch_size=2,
+                          trace_dir=trace_dir, trace_batches=3) == [True,
+                                                                    True]
+    assert len(os.listdir(trace_dir)) == 3
+
+    with pytest.raises(ValueError):
+        featurefy.main([ogg_file], str(tmpdir), backend='numpy',
+                       trace_dir=trace_dir)
+
+
+def test_featurefy_main_backend_options(ogg_file, tmpdir):
+    # Options which the backend does not support are rejected up front
+    with pytest.raises(ValueError):
+        featurefy.main([ogg_file], str(tmpdir), backend='numpy',
+                       inter_op_threads=1)
+    with pytest.raises(ValueError):
+        featurefy.main([ogg_file], str(tmpdir), backend='numpy',
+                       saved_model='exported')